@@ -3,25 +3,79 @@ Railway Track Inspection System - FastAPI Backend
 YOLOv5 Inference API
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import Depends, FastAPI, File, Form, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import torch
-import cv2
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 import numpy as np
-from PIL import Image
-import io
 from typing import List, Dict
 import os
 import sys
+import time
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import math
+import mimetypes
+import shutil
+from collections import deque
+from datetime import datetime
 import pathlib
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager, contextmanager
 
 # Fix for PosixPath error on Windows
 if sys.platform == "win32":
     pathlib.PosixPath = pathlib.WindowsPath
 
-app = FastAPI(title="Railway Track Inspection API", version="1.0.0")
+# Pastikan package utils bisa diimport baik dari folder backend maupun root repo
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.batching import make_batches
+from utils.scheduler import InferenceScheduler
+from utils.backends import create_backend, resolve_weights
+from utils.workerpool import WorkerPool
+from utils.cache import ResultCache
+from utils.tracking import IoUTracker, MotionGate
+from utils.jobs import FINISHED as JOB_FINISHED, JobContext, JobQueue, JobStore
+from utils.imageio import ImageTooLarge, decode_image as decode_upload, scale_predictions
+from utils.registry import ModelRegistry, Route
+from utils.packed import PACKED_MEDIA_TYPE, PackedEncoder, accepts_media, wants_packed
+from utils.postprocess import SEVERITY_COLORS, DetectionPostprocessor
+from utils.render import AnnotationRenderer, encode_jpeg
+from utils.spatial import DefectIndex, exif_location, parse_chainage
+from utils.telemetry import (REGISTRY, MetricsMiddleware, SlowRequestProfiler, gauge_lines,
+                             histogram_lines, observe_stage, stage)
+from utils.tiling import make_tiles, merge_tile_predictions
+from utils.videostream import (MJPEG_TYPES, DuplexStreamingResponse, iter_container_frames,
+                               iter_file_chunks, iter_mjpeg_frames, iter_video_file, video_frame_count)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup: mulai scheduler & load model di background (non-blocking)"""
+    scheduler.start()
+    loader = asyncio.get_running_loop().create_task(run_in_threadpool(load_model))
+    if job_queue is not None:
+        job_queue.start()
+    yield
+    if job_queue is not None:
+        await job_queue.stop()
+    await scheduler.stop()
+    registry.stop_all()
+    if not loader.done():
+        loader.cancel()
+
+app = FastAPI(title="Railway Track Inspection API", version="1.0.0", lifespan=lifespan)
+
+# Sampling profiler: request lebih lama dari PROFILE_SLOW_MS disimpan sebagai folded stack (0 = nonaktif)
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "uploads/profiles")
+profiler = SlowRequestProfiler(PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_DIR) if PROFILE_SLOW_MS > 0 else None
+
+# Request count, durasi & in-flight per route untuk /metrics
+app.add_middleware(MetricsMiddleware, profiler=profiler)
 
 # CORS middleware untuk akses dari frontend
 app.add_middleware(
@@ -33,9 +87,76 @@ app.add_middleware(
 )
 
 # Load YOLOv5 model
-MODEL_PATH = "models/best.pt"
-model = None
-model_error = None
+MODEL_PATH = os.getenv("MODEL_PATH", "models/best.pt")
+DEVICE = os.getenv("DEVICE", "cpu")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")  # torch | torchscript | onnx
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0"))
+MODEL_QUANTIZED = os.getenv("MODEL_QUANTIZED", "0") == "1"  # INT8 ONNX (utils.quantize)
+
+# Worker pool: >0 berarti inferensi dijalankan di K proses terpisah
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+WORKER_PIN_CPUS = os.getenv("WORKER_PIN_CPUS", "1") == "1"
+WORKER_TIMEOUT = float(os.getenv("WORKER_TIMEOUT", "120"))  # batas tunggu hasil satu batch dari worker
+
+# Model registry (/models): beberapa versi dimuat berdampingan, hot-swap & canary tanpa restart
+MODEL_NAME = os.getenv("MODEL_NAME", "") or pathlib.Path(MODEL_PATH).stem  # nama versi MODEL_PATH
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.dirname(MODEL_PATH) or ".")  # asal weights POST /models/{name}/load
+MODEL_DRAIN_SECONDS = float(os.getenv("MODEL_DRAIN_SECONDS", "60"))  # tunggu request in-flight saat unload
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # header X-Admin-Token untuk endpoint admin /models (kosong = terbuka)
+
+# Warm-up saat startup
+WARMUP_RUNS = int(os.getenv("WARMUP_RUNS", "1"))
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", "1"))
+
+# Batch inference settings
+INFERENCE_SIZE = int(os.getenv("INFERENCE_SIZE", "640"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "16"))
+
+# Micro-batching scheduler untuk /detect
+SCHEDULER_MAX_BATCH_SIZE = int(os.getenv("SCHEDULER_MAX_BATCH_SIZE", "8"))
+SCHEDULER_MAX_WAIT_MS = float(os.getenv("SCHEDULER_MAX_WAIT_MS", "5"))
+
+# Result cache: upload identik (retry, buka ulang laporan) tidak diinferensi ulang
+CONF_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.25"))
+IOU_THRESHOLD = float(os.getenv("IOU_THRESHOLD", "0.45"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))  # 0 = nonaktif
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "")  # file SQLite tier disk (kosong = nonaktif)
+RESULT_CACHE_DISK_MB = int(os.getenv("RESULT_CACHE_DISK_MB", "512"))
+
+result_cache = None
+if RESULT_CACHE_SIZE > 0 or RESULT_CACHE_PATH:
+    result_cache = ResultCache(max_entries=RESULT_CACHE_SIZE, ttl_seconds=RESULT_CACHE_TTL,
+                               disk_path=RESULT_CACHE_PATH or None,
+                               disk_max_bytes=RESULT_CACHE_DISK_MB * 1024 * 1024)
+
+# Decode upload: batas ukuran & decode JPEG skala kecil untuk gambar besar
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024)
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(8000 * 8000)))
+REDUCED_DECODE = os.getenv("REDUCED_DECODE", "1") == "1"
+
+# Tiled inference (/detect?tiled=true) untuk defect kecil di gambar resolusi tinggi
+TILE_SIZE = int(os.getenv("TILE_SIZE", str(INFERENCE_SIZE)))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+
+# Anotasi server-side (/detect?annotate=true): digambar di array hasil decode (preview)
+ANNOTATE_JPEG_QUALITY = int(os.getenv("ANNOTATE_JPEG_QUALITY", "80"))
+
+# Streaming video (/detect-video)
+VIDEO_MAX_INFLIGHT = int(os.getenv("VIDEO_MAX_INFLIGHT", "4"))  # frame yang sedang diinferensi
+VIDEO_MAX_BYTES = int(os.getenv("VIDEO_MAX_MB", "2048")) * 1024 * 1024  # batas spool container
+
+# Job queue (/jobs): batch & video besar diproses di background, persisten di SQLite
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))  # job yang diproses bersamaan (0 = nonaktif)
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "uploads/jobs.db")
+JOB_DIR = os.getenv("JOB_DIR", "uploads/jobs")  # input job selama belum selesai
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "8"))  # gambar per langkah (cek cancel & simpan progress)
+JOB_MAX_FILES = int(os.getenv("JOB_MAX_FILES", "5000"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "72"))  # hasil job selesai (0 = selamanya)
+
+# Index defect per lokasi (/ingest, /defects): merge deteksi yang sama dari banyak foto
+DEFECT_DB_PATH = os.getenv("DEFECT_DB_PATH", "uploads/defects.db")  # kosong = nonaktif
+DEFECT_MERGE_RADIUS_M = float(os.getenv("DEFECT_MERGE_RADIUS_M", "5"))
 
 # Kelas deteksi (WAJIB sesuai dataset)
 CLASS_NAMES = [
@@ -53,146 +174,229 @@ HIGH_RISK_CLASSES = ['track_crack', 'fishplate_boltmissing', 'track_boltmissing'
 MEDIUM_RISK_CLASSES = ['fishplate', 'track_bolt']
 LOW_RISK_CLASSES = ['fishplate_bolthead', 'fishplate_boltnut']
 
-def load_model():
-    """Load YOLOv5 model with Windows compatibility"""
-    global model, model_error
-    if model is None and model_error is None:
-        try:
-            print("[*] Loading model...")
-            
-            # Try to load custom trained model first
-            if os.path.exists(MODEL_PATH):
-                print(f"[*] Loading custom trained model from: {MODEL_PATH}")
-                try:
-                    model = torch.hub.load('ultralytics/yolov5', 'custom', 
-                                          path=MODEL_PATH, force_reload=False, trust_repo=True, verbose=False)
-                    print("[+] Custom trained model loaded successfully")
-                except Exception as e1:
-                    print(f"[!] Custom model load failed: {e1}")
-                    print("[*] Falling back to YOLOv5s pretrained...")
-                    model = torch.hub.load('ultralytics/yolov5', 'yolov5s', 
-                                          force_reload=False, trust_repo=True, verbose=False)
-                    print("[+] Pretrained YOLOv5s loaded successfully")
-            else:
-                print(f"[!] Custom model not found at {MODEL_PATH}")
-                print("[*] Loading YOLOv5s pretrained model...")
-                model = torch.hub.load('ultralytics/yolov5', 'yolov5s', 
-                                      force_reload=False, trust_repo=True, verbose=False)
-                print("[+] Pretrained model loaded successfully")
-            
-            if model is not None:
-                model.conf = 0.25  # Confidence threshold
-                model.iou = 0.45   # NMS IOU threshold
-                print("[+] Model configured: conf=0.25, iou=0.45")
-            
-        except Exception as e:
-            model_error = str(e)
-            print(f"[-] Error loading model: {e}")
-            import traceback
-            traceback.print_exc()
+# Metric Prometheus (/metrics); durasi per stage ada di railway_stage_duration_seconds
+DETECTIONS_TOTAL = REGISTRY.counter("railway_detections_total", "Jumlah deteksi per kelas & severity",
+                                    ("class", "severity"))
+IMAGES_TOTAL = REGISTRY.counter("railway_images_inspected_total", "Jumlah gambar yang diinferensi",
+                                ("status",))
+MODEL_LOAD_SECONDS = REGISTRY.gauge("railway_model_load_seconds", "Durasi load model + warm-up terakhir")
+
+def create_model(path: str):
+    """
+    Buat backend / worker pool untuk satu file weights lalu jalankan warm-up
     
+    Dipakai registry (blocking, di thread terpisah) untuk versi awal maupun
+    versi yang di-load lewat POST /models/{name}/load. Tidak ada akses
+    torch.hub / network: file yang tidak ada membuat versi menjadi failed.
+    """
+    print(f"[*] Loading model from: {path} (backend={INFERENCE_BACKEND}, device={DEVICE})")
+    if INFERENCE_WORKERS > 0:
+        # Setiap worker load model & warm-up sendiri
+        print(f"[*] Starting {INFERENCE_WORKERS} inference workers...")
+        model = WorkerPool(INFERENCE_WORKERS, INFERENCE_BACKEND, path, device=DEVICE,
+                           quantized=MODEL_QUANTIZED, imgsz=INFERENCE_SIZE,
+                           threads=INFERENCE_THREADS, conf_threshold=CONF_THRESHOLD,
+                           iou_threshold=IOU_THRESHOLD,
+                           warmup_runs=WARMUP_RUNS, pin_cpus=WORKER_PIN_CPUS).start()
+    else:
+        model = create_backend(INFERENCE_BACKEND, path, device=DEVICE,
+                               quantized=MODEL_QUANTIZED,
+                               conf_threshold=CONF_THRESHOLD, iou_threshold=IOU_THRESHOLD,
+                               imgsz=INFERENCE_SIZE, threads=INFERENCE_THREADS)
+        warmup_model(model)
+    print(f"[+] Model configured: {model.weights}, default conf={CONF_THRESHOLD}, iou={IOU_THRESHOLD}")
     return model
 
+registry = ModelRegistry(create_model, INFERENCE_BACKEND,
+                         resolve=lambda path: resolve_weights(path, INFERENCE_BACKEND, MODEL_QUANTIZED),
+                         model_dir=MODEL_DIR)
+
+def load_model():
+    """
+    Load MODEL_PATH sebagai versi awal (MODEL_NAME) dan jadikan versi aktif
+    
+    Dipanggil sekali saat startup (lifespan) di thread terpisah; jika gagal,
+    state menjadi failed dan versi lain masih bisa di-load lewat /models.
+    """
+    try:
+        version = registry.load(registry.register(MODEL_NAME, MODEL_PATH), activate=True)
+        MODEL_LOAD_SECONDS.set(version.load_seconds)
+        print(f"[+] Model {version.name} ({version.key}) ready in {version.load_seconds:.1f}s")
+        return version
+    except Exception as e:
+        print(f"[-] Error loading model: {e}")
+        import traceback
+        traceback.print_exc()
+
+def warmup_model(model):
+    """Jalankan beberapa forward pass dummy supaya request pertama tidak cold"""
+    if WARMUP_RUNS <= 0:
+        return
+    dummy = np.zeros((INFERENCE_SIZE, INFERENCE_SIZE, 3), dtype=np.uint8)
+    for i in range(WARMUP_RUNS):
+        t0 = time.perf_counter()
+        run_inference([dummy] * max(1, WARMUP_BATCH_SIZE), model)
+        print(f"[*] Warm-up {i + 1}/{WARMUP_RUNS}: {(time.perf_counter() - t0) * 1000:.0f} ms")
 
+def ensure_model_ready():
+    """Raise 503 jika belum ada versi model yang siap melayani request"""
+    state, error = registry.state()
+    if state != "ready":
+        detail = "Model tidak siap. Coba lagi dalam beberapa saat."
+        if state == "failed":
+            detail = f"Model gagal dimuat: {error}"
+        raise HTTPException(status_code=503, detail=detail)
 
+def validate_thresholds(conf: float = None, iou: float = None):
+    """Threshold per request (default CONFIDENCE_THRESHOLD / IOU_THRESHOLD)"""
+    conf = CONF_THRESHOLD if conf is None else conf
+    iou = IOU_THRESHOLD if iou is None else iou
+    if not 0 <= conf <= 1 or not 0 < iou <= 1:
+        raise HTTPException(status_code=400, detail="conf harus di antara 0 dan 1, iou di antara 0 (eksklusif) dan 1")
+    return conf, iou
 
-@app.get("/")
-async def root():
-    """Health check endpoint"""
-    return {
-        "status": "online",
-        "message": "Railway Track Inspection API",
-        "model": "YOLOv5",
-        "classes": len(CLASS_NAMES)
-    }
+@contextmanager
+def acquire_route(model: str = None, conf: float = None, iou: float = None):
+    """Pegang versi model (eksplisit, canary, atau aktif) + threshold selama satu request"""
+    ensure_model_ready()
+    conf, iou = validate_thresholds(conf, iou)
+    try:
+        version = registry.hold(model)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        yield Route(version, conf, iou)
+    finally:
+        version.release()
 
-@app.post("/detect")
-async def detect_faults(file: UploadFile = File(...)):
+def inference_route(model: str = None, conf: float = None, iou: float = None):
     """
-    Detect railway track faults from uploaded image
+    Dependency endpoint inferensi: query ?model=<versi>&conf=&iou=
     
-    Returns:
-        JSON with detections, severity analysis, and inspection status
+    Versi ditandai sedang dipakai sampai endpoint selesai, jadi unload versi
+    lama menunggu request ini (drain) alih-alih memutusnya.
     """
-    global model
+    with acquire_route(model, conf, iou) as route:
+        yield route
+
+def result_cache_key(contents: bytes, route: Route, *extra) -> str:
+    """Key cache: isi upload + versi model + threshold + ukuran inferensi (+ mode)"""
+    return ResultCache.make_key(contents, *route.cache_key, INFERENCE_SIZE, REDUCED_DECODE, *extra)
+
+def decode_image(contents: bytes, reduced: bool = True):
+    """
+    Decode bytes upload menjadi array RGB (utils.imageio)
+    
+    JPEG besar di-decode langsung pada skala kecil (>= INFERENCE_SIZE) jika
+    REDUCED_DECODE aktif; box hasil inferensi dikembalikan ke resolusi asli
+    dengan scale_predictions.
     
+    Returns:
+        (array RGB, (height, width) gambar asli)
+    """
+    target_size = INFERENCE_SIZE if reduced and REDUCED_DECODE else 0
+    timings = {}
+    decoded = decode_upload(contents, target_size=target_size, max_bytes=MAX_UPLOAD_BYTES,
+                            max_pixels=MAX_IMAGE_PIXELS, timings=timings)
+    for name, seconds in timings.items():
+        observe_stage(name, seconds)
+    return decoded
+
+async def read_and_decode(file: UploadFile, contents: bytes, reduced: bool = True):
+    """Decode di threadpool; error batas ukuran -> 413, gambar rusak -> 400"""
     try:
-        # Load model if not loaded yet
-        if model is None:
-            model = load_model()
-        
-        if model is None:
-            raise HTTPException(status_code=503, detail="Model tidak siap. Coba lagi dalam beberapa saat.")
-        
-        # Validasi file
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File harus berupa gambar")
-        
-        # Baca image
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        img_array = np.array(image)
-        
-        # Convert RGB jika perlu
-        if len(img_array.shape) == 2:
-            img_array = cv2.cvtColor(img_array, cv2.COLOR_GRAY2RGB)
-        elif img_array.shape[2] == 4:
-            img_array = cv2.cvtColor(img_array, cv2.COLOR_RGBA2RGB)
-        
-        # Inference
-        results = model(img_array)
-        
-        # Parse results
-        detections = []
-        class_counts = {name: 0 for name in CLASS_NAMES}
-        high_risk_count = 0
-        
-        # results is a Detections object, xyxy is a list of tensors (one per image)
-        if hasattr(results, 'xyxy') and len(results.xyxy) > 0:
-            # results.xyxy[0] contains detections for first image
-            pred_boxes = results.xyxy[0]
-            
-            # Iterate through each detection
-            for detection in pred_boxes:
-                if len(detection) >= 6:  # x1, y1, x2, y2, conf, cls
-                    x1, y1, x2, y2, conf, cls = detection[:6]
-                    class_id = int(cls)
-                    confidence = float(conf)
-                    bbox = [float(x1), float(y1), float(x2), float(y2)]
-                    
-                    if class_id < len(CLASS_NAMES):
-                        class_name = CLASS_NAMES[class_id]
-                        
-                        # Determine severity
-                        if class_name in HIGH_RISK_CLASSES:
-                            severity = "HIGH"
-                            color = "#ef4444"  # red
-                            high_risk_count += 1
-                        elif class_name in MEDIUM_RISK_CLASSES:
-                            severity = "MEDIUM"
-                            color = "#f59e0b"  # orange
-                        else:
-                            severity = "LOW"
-                            color = "#10b981"  # green
-                        
-                        detection_obj = {
-                            "class": class_name,
-                            "class_id": class_id,
-                            "confidence": round(confidence, 3),
-                            "bbox": bbox,
-                            "severity": severity,
-                            "color": color
-                        }
-                        
-                        detections.append(detection_obj)
-                        class_counts[class_name] += 1
+        return await run_in_threadpool(decode_image, contents, reduced)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{file.filename}: {e}")
+
+def run_inference(images: List[np.ndarray], model, conf: float = None, iou: float = None) -> List[np.ndarray]:
+    """
+    Jalankan inferensi untuk banyak gambar sekaligus
+    
+    Gambar dikelompokkan per bucket ukuran letterbox dan dipecah sesuai
+    MAX_BATCH_SIZE, lalu setiap batch diproses dengan satu panggilan model.
+    Pada mode worker pool semua batch dikirim sekaligus ke worker paling
+    senggang sehingga berjalan paralel di beberapa proses. conf / iou None
+    memakai threshold default model.
+    
+    Returns:
+        List array prediksi (x1, y1, x2, y2, conf, cls), urutan sama dengan input
+    """
+    predictions = [None] * len(images)
+    
+    # Backend dengan input shape statis: semua gambar masuk satu bucket
+    shapes = [img.shape for img in images] if model.dynamic_shape else [model.fixed_shape] * len(images)
+    batches = make_batches(shapes, MAX_BATCH_SIZE, size=INFERENCE_SIZE, stride=model.stride)
+    
+    options = {"size": INFERENCE_SIZE, "conf": conf, "iou": iou}
+    if isinstance(model, WorkerPool):
+        jobs = [(batch, model.submit([images[i] for i in batch], **options))
+                for batch in batches]
+        results = [(batch, job.result(timeout=WORKER_TIMEOUT)) for batch, job in jobs]
+    else:
+        results = [(batch, model.predict([images[i] for i in batch], **options))
+                   for batch in batches]
+    
+    for batch, preds in results:
+        for i, pred in zip(batch, preds):
+            predictions[i] = pred
+    
+    return predictions
+
+scheduler = InferenceScheduler(
+    run_inference,
+    max_batch_size=SCHEDULER_MAX_BATCH_SIZE,
+    max_wait_ms=SCHEDULER_MAX_WAIT_MS,
+    concurrency=max(1, INFERENCE_WORKERS)
+)
+
+postprocessor = DetectionPostprocessor(CLASS_NAMES, HIGH_RISK_CLASSES, MEDIUM_RISK_CLASSES,
+                                      colors=SEVERITY_COLORS)
+CLASS_SEVERITY = {name: postprocessor.severity_of(i) for i, name in enumerate(CLASS_NAMES)}
+packed_encoder = PackedEncoder(CLASS_NAMES, CLASS_SEVERITY, SEVERITY_COLORS)
+renderer = AnnotationRenderer(CLASS_NAMES, CLASS_SEVERITY, SEVERITY_COLORS)
+
+def render_annotated(image: np.ndarray, content: Dict, original_shape) -> bytes:
+    """
+    Gambar deteksi langsung di array hasil decode lalu encode JPEG
+    
+    Array decode (skala reduced decode, bukan resolusi asli) tidak dipakai
+    lagi setelah inferensi, jadi digambari in-place tanpa copy; bbox response
+    (koordinat gambar asli) diskalakan ke ukuran array tersebut.
+    """
+    scale = (image.shape[1] / original_shape[1], image.shape[0] / original_shape[0])
+    renderer.render(image, content["detections"], inplace=True, scale=scale)
+    return encode_jpeg(image, ANNOTATE_JPEG_QUALITY)
+
+def record_detection_metrics(parsed: Dict, status: str):
+    """Tambahkan hitungan per kelas & severity satu gambar ke counter /metrics"""
+    IMAGES_TOTAL.inc(status=status)
+    for name, count in parsed["class_counts"].items():
+        if count:
+            DETECTIONS_TOTAL.inc(count, **{"class": name, "severity": CLASS_SEVERITY[name]})
+
+def build_detection_responses(predictions: List[np.ndarray], img_shapes: List) -> List[Dict]:
+    """Susun response JSON untuk banyak gambar dalam satu pass vectorized"""
+    with stage("postprocess"):
+        return _build_detection_responses(predictions, img_shapes)
+
+def _build_detection_responses(predictions: List[np.ndarray], img_shapes: List) -> List[Dict]:
+    responses = []
+    for parsed, img_shape in zip(postprocessor.parse_batch(predictions), img_shapes):
+        severity_counts = parsed["severity_counts"]
+        high_risk_count = severity_counts["HIGH"]
+        total_detections = parsed["total"]
         
         # Determine inspection status
         if high_risk_count > 0:
             status = "BAHAYA"
             status_icon = "🚨"
             status_color = "#dc2626"
-        elif len(detections) > 5:
+        elif total_detections > 5:
             status = "PERLU PERBAIKAN"
             status_icon = "⚠️"
             status_color = "#f59e0b"
@@ -201,19 +405,18 @@ async def detect_faults(file: UploadFile = File(...)):
             status_icon = "✅"
             status_color = "#10b981"
         
-        # Statistics
-        total_detections = len(detections)
         critical_percentage = (high_risk_count / total_detections * 100) if total_detections > 0 else 0
+        record_detection_metrics(parsed, status)
         
-        response = {
+        responses.append({
             "success": True,
             "total_detections": total_detections,
-            "detections": detections,
-            "class_counts": class_counts,
+            "detections": parsed["detections"],
+            "class_counts": parsed["class_counts"],
             "statistics": {
                 "high_risk": high_risk_count,
-                "medium_risk": sum(1 for d in detections if d["severity"] == "MEDIUM"),
-                "low_risk": sum(1 for d in detections if d["severity"] == "LOW"),
+                "medium_risk": severity_counts["MEDIUM"],
+                "low_risk": severity_counts["LOW"],
                 "critical_percentage": round(critical_percentage, 1)
             },
             "inspection_status": {
@@ -222,12 +425,143 @@ async def detect_faults(file: UploadFile = File(...)):
                 "color": status_color
             },
             "image_size": {
-                "width": img_array.shape[1],
-                "height": img_array.shape[0]
+                "width": img_shape[1],
+                "height": img_shape[0]
             }
-        }
+        })
+    return responses
+
+def build_detection_response(pred_boxes, img_shape) -> Dict:
+    """Susun response JSON dari array prediksi satu gambar"""
+    return build_detection_responses([pred_boxes], [img_shape])[0]
+
+
+@app.get("/")
+async def root():
+    """
+    Health check endpoint
+    
+    Return 503 selama model masih loading / gagal dimuat, sehingga health
+    check orchestrator tidak mengirim traffic ke worker yang belum siap.
+    """
+    state, error = registry.state()
+    content = {
+        "status": "online",
+        "message": "Railway Track Inspection API",
+        "model": "YOLOv5",
+        "backend": INFERENCE_BACKEND,
+        "quantized": MODEL_QUANTIZED,
+        "model_state": state,
+        "classes": len(CLASS_NAMES)
+    }
+    if state == "failed":
+        content["model_error"] = error
+    active = registry.active_version()
+    if active is not None:
+        content["model_version"] = active.name
+        if active.load_seconds is not None:
+            content["model_load_seconds"] = round(active.load_seconds, 2)
+    
+    return JSONResponse(status_code=200 if state == "ready" else 503, content=content)
+
+async def detect_tiled(image: np.ndarray, route: Route) -> np.ndarray:
+    """Inferensi per tile overlap (satu batch) lalu NMS lintas tile"""
+    crops, windows = make_tiles(image, TILE_SIZE, TILE_OVERLAP)
+    preds = await scheduler.run_batch(crops, route.params)
+    return merge_tile_predictions(preds, windows, route.iou)
+
+@app.post("/detect")
+async def detect_faults(request: Request, file: UploadFile = File(...), tiled: bool = False,
+                        annotate: bool = False, route: Route = Depends(inference_route)):
+    """
+    Detect railway track faults from uploaded image
+    
+    Dengan ?tiled=true gambar dipecah menjadi tile TILE_SIZE (overlap
+    TILE_OVERLAP) supaya defect kecil tidak hilang saat downscale.
+    Upload dengan isi identik dilayani dari result cache (header X-Cache: HIT)
+    tanpa decode maupun inferensi. Dengan ?annotate=true server ikut
+    menggambar box & label: response JSON berisi annotated_image (data URL
+    JPEG), atau body JPEG langsung jika Accept: image/jpeg. ?model=<versi>
+    memilih versi model (default: versi aktif / canary), ?conf= & ?iou=
+    mengganti threshold untuk request ini; versi yang dipakai ada di header
+    X-Model-Version.
+    
+    Returns:
+        JSON with detections, severity analysis, and inspection status
+        (format packed biner jika Accept: application/x-railway-detections)
+    """
+    try:
+        accept = request.headers.get("accept")
+        version_header = {"X-Model-Version": route.version.name}
+        packed = wants_packed(accept) and not annotate
+        
+        # Validasi file
+        if not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File harus berupa gambar")
+        
+        # Baca image (maksimal MAX_UPLOAD_BYTES + 1 supaya upload raksasa tidak masuk memori)
+        with stage("read"):
+            contents = await file.read(MAX_UPLOAD_BYTES + 1)
+        
+        cache_key = None
+        content = None
+        json_body = None
+        if result_cache is not None:
+            with stage("cache_lookup"):
+                cache_key = result_cache_key(contents, route, *((TILE_SIZE, TILE_OVERLAP) if tiled else ()))
+                cached = await run_in_threadpool(result_cache.get, cache_key)
+            if cached is not None and annotate:
+                # Hasil deteksi dari cache, gambar tetap perlu di-decode untuk digambari
+                content = json.loads(cached)
+            elif cached is not None:
+                if packed:
+                    with stage("serialize"):
+                        body = packed_encoder.encode_single(json.loads(cached))
+                    return Response(content=body, media_type=PACKED_MEDIA_TYPE,
+                                    headers={"X-Cache": "HIT", "Vary": "Accept", **version_header})
+                return Response(content=cached, media_type="application/json",
+                                headers={"X-Cache": "HIT", "Vary": "Accept", **version_header})
         
-        return JSONResponse(content=response)
+        # Tiled butuh resolusi penuh (tujuannya justru menghindari downscale)
+        img_array, original_shape = await read_and_decode(file, contents, reduced=not tiled)
+        
+        if content is None:
+            # Inference (di-batch bersama request lain oleh scheduler), termasuk waktu antre
+            with stage("inference"):
+                if tiled:
+                    pred_boxes = await detect_tiled(img_array, route)
+                else:
+                    pred_boxes = await scheduler.submit(img_array, params=route.params)
+            pred_boxes = scale_predictions(pred_boxes, img_array.shape, original_shape)
+            content = build_detection_response(pred_boxes, original_shape)
+            
+            if cache_key is not None:
+                # Cache selalu menyimpan JSON tanpa gambar; format lain di-encode ulang saat HIT
+                with stage("serialize"):
+                    json_body = JSONResponse(content=content).body
+                with stage("cache_store"):
+                    await run_in_threadpool(result_cache.put, cache_key, json_body)
+        
+        headers = {"Vary": "Accept", **version_header}
+        if cache_key is not None:
+            headers["X-Cache"] = "HIT" if cached is not None else "MISS"
+        
+        if annotate:
+            with stage("annotate"):
+                jpeg = await run_in_threadpool(render_annotated, img_array, content, original_shape)
+            if accepts_media(accept, "image/jpeg"):
+                headers.update({"X-Total-Detections": str(content["total_detections"]),
+                                "X-Inspection-Status": content["inspection_status"]["status"]})
+                return Response(content=jpeg, media_type="image/jpeg", headers=headers)
+            content = {**content, "annotated_image": "data:image/jpeg;base64," + base64.b64encode(jpeg).decode("ascii")}
+        
+        with stage("serialize"):
+            if packed:
+                return Response(content=packed_encoder.encode_single(content), media_type=PACKED_MEDIA_TYPE,
+                                headers=headers)
+            if json_body is not None and not annotate:
+                return Response(content=json_body, media_type="application/json", headers=headers)
+            return JSONResponse(content=content, headers=headers)
         
     except HTTPException as he:
         raise he
@@ -238,24 +572,761 @@ async def detect_faults(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Error saat deteksi: {str(e)}")
 
 @app.post("/detect-batch")
-async def detect_batch(files: List[UploadFile] = File(...)):
-    """Batch detection untuk multiple images"""
-    results = []
+async def detect_batch(request: Request, files: List[UploadFile] = File(...),
+                       route: Route = Depends(inference_route)):
+    """
+    Batch detection untuk multiple images
+    
+    Semua upload di-decode terlebih dahulu, lalu diproses dalam batch
+    per bucket ukuran (maksimal MAX_BATCH_SIZE gambar per panggilan model).
+    Error pada satu file tidak mempengaruhi file lainnya. Dengan
+    Accept: application/x-railway-detections hasil dikirim dalam format
+    packed (tabel kelas / severity sekali untuk seluruh batch). Query
+    model / conf / iou sama dengan /detect, berlaku untuk seluruh batch.
+    """
+    results = [{"filename": file.filename} for file in files]
+    images = []
+    image_shapes = []
+    image_slots = []
+    cache_keys = {}
     
-    for file in files:
+    # Decode semua upload, error per file dicatat tanpa menghentikan batch
+    for slot, file in enumerate(files):
         try:
-            result = await detect_faults(file)
-            results.append({
-                "filename": file.filename,
-                "result": result
-            })
+            if not file.content_type or not file.content_type.startswith('image/'):
+                raise ValueError("File harus berupa gambar")
+            contents = await file.read(MAX_UPLOAD_BYTES + 1)
+            if result_cache is not None:
+                cache_keys[slot] = result_cache_key(contents, route)
+                cached = await run_in_threadpool(result_cache.get, cache_keys[slot])
+                if cached is not None:
+                    results[slot]["result"] = json.loads(cached)
+                    continue
+            img_array, original_shape = await run_in_threadpool(decode_image, contents)
+            images.append(img_array)
+            image_shapes.append(original_shape)
+            image_slots.append(slot)
         except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "error": str(e)
+            results[slot]["error"] = str(e)
+    
+    if images:
+        try:
+            predictions = await scheduler.run_batch(images, route.params)
+        except Exception as e:
+            # Batch gagal: ulangi per gambar supaya error tetap terisolasi
+            print(f"[!] Batch inference failed, retrying per image: {e}")
+            predictions = []
+            for img in images:
+                try:
+                    predictions.append((await scheduler.run_batch([img], route.params))[0])
+                except Exception as e1:
+                    predictions.append(e1)
+        
+        done = []
+        for slot, img, shape, pred in zip(image_slots, images, image_shapes, predictions):
+            if isinstance(pred, Exception):
+                results[slot]["error"] = str(pred)
+            else:
+                done.append((slot, shape, scale_predictions(pred, img.shape, shape)))
+        
+        # Post-processing semua gambar sukses dalam satu pass
+        try:
+            responses = build_detection_responses([p for _, _, p in done], [sh for _, sh, _ in done])
+        except Exception:
+            responses = []
+            for _, shape, pred in done:
+                try:
+                    responses.append(build_detection_response(pred, shape))
+                except Exception as e:
+                    responses.append(e)
+        
+        for (slot, _, _), response in zip(done, responses):
+            if isinstance(response, Exception):
+                results[slot]["error"] = str(response)
+                continue
+            results[slot]["result"] = response
+            if slot in cache_keys:
+                body = JSONResponse(content=response).body
+                await run_in_threadpool(result_cache.put, cache_keys[slot], body)
+    
+    headers = {"Vary": "Accept", "X-Model-Version": route.version.name}
+    with stage("serialize"):
+        if wants_packed(request.headers.get("accept")):
+            return Response(content=packed_encoder.encode_batch(results), media_type=PACKED_MEDIA_TYPE,
+                            headers=headers)
+        return JSONResponse(content={"results": results}, headers=headers)
+
+async def iter_video_detections(frames, route: Route, stride: int = 1, adaptive: bool = False,
+                                background: bool = False):
+    """
+    Hasil deteksi per frame (dict) selama video masih diterima
+    
+    Maksimal VIDEO_MAX_INFLIGHT frame diinferensi bersamaan (di-batch oleh
+    scheduler bersama request lain); frame berikutnya baru dibaca setelah
+    frame tertua selesai, sehingga memori konstan dan upload ikut tertahan
+    (backpressure) jika inferensi tertinggal. Mode adaptive hanya
+    menginferensi keyframe dan membawa deteksi ke frame lain dengan tracker.
+    Frame MJPEG yang gagal di-decode menjadi item {"frame", "error"} dan
+    dihitung di corrupt_frames. Item terakhir adalah ringkasan {"done": true, ...}; background=True
+    untuk job queue (prioritas di bawah request interaktif). Versi model
+    route ditahan selama stream berjalan (tidak di-stop oleh unload).
+    """
+    gate = MotionGate() if adaptive else None
+    tracker = IoUTracker() if adaptive else None
+    pending = deque()
+    counters = {"frames": 0, "processed": 0, "inference_calls": 0, "total_detections": 0, "corrupt_frames": 0}
+    start = time.perf_counter()
+    
+    async def emit(item) -> Dict:
+        index, shape, task, shift = item
+        if shape is None:
+            counters["corrupt_frames"] += 1
+            return {"frame": index, "error": "Frame JPEG rusak / tidak bisa di-decode"}
+        content = {"frame": index, "keyframe": task is not None}
+        if task is None:
+            tracker.shift(*shift)
+            content["detections"] = tracker.active()
+        else:
+            response = build_detection_response(await task, shape)
+            counters["inference_calls"] += 1
+            counters["total_detections"] += response["total_detections"]
+            detections = response["detections"]
+            if tracker is not None:
+                detections = tracker.update(detections, index)
+            content.update({
+                "detections": detections,
+                "class_counts": response["class_counts"],
+                "statistics": response["statistics"],
+                "inspection_status": response["inspection_status"]
             })
+        content["total_detections"] = len(content["detections"])
+        counters["processed"] += 1
+        return content
+    
+    with route.version.use():
+        try:
+            async for frame in frames:
+                counters["frames"] += 1
+                index = counters["frames"]
+                if frame is None:
+                    # Frame MJPEG rusak: dilaporkan sebagai baris error pada urutannya
+                    pending.append((index, None, None, None))
+                else:
+                    if gate is not None:
+                        keyframe, shift = await run_in_threadpool(gate.update, frame)
+                    else:
+                        keyframe, shift = (index - 1) % stride == 0, (0.0, 0.0)
+                        if not keyframe:
+                            continue
+                    task = asyncio.ensure_future(scheduler.submit(frame, background, route.params)) if keyframe else None
+                    pending.append((index, frame.shape, task, shift))
+                    del frame
+            
+                while len(pending) >= max(1, VIDEO_MAX_INFLIGHT):
+                    yield await emit(pending.popleft())
+        
+            while pending:
+                yield await emit(pending.popleft())
+        
+            seconds = time.perf_counter() - start
+            summary = {
+                "done": True,
+                "model_version": route.version.name,
+                **counters,
+                "seconds": round(seconds, 3),
+                "fps": round(counters["frames"] / seconds, 2) if seconds > 0 else 0.0
+            }
+            if tracker is not None:
+                summary["unique_defects"] = tracker.unique_defects()
+            yield summary
+        except Exception as e:
+            print(f"[!] Video stream error at frame {counters['frames']}: {e}")
+            yield {"done": True, "error": str(e), **counters}
+        finally:
+            # Client disconnect / error: batalkan inferensi yang belum diambil
+            for _, _, task, _ in pending:
+                if task is not None:
+                    task.cancel()
+
+async def stream_video_detections(frames, route: Route, stride: int = 1, adaptive: bool = False):
+    """Baris NDJSON per frame yang diproses, diakhiri baris ringkasan {"done": true}"""
+    async with aclosing(iter_video_detections(frames, route, stride, adaptive)) as contents:
+        async for content in contents:
+            yield (json.dumps(content, ensure_ascii=False) + "\n").encode("utf-8")
+
+@app.post("/detect-video")
+async def detect_video(request: Request, stride: int = 1, adaptive: bool = False,
+                       route: Route = Depends(inference_route)):
+    """
+    Deteksi pada video yang di-upload secara streaming (chunked body)
+    
+    Body berisi video mentah (bukan form-data). MJPEG (video/x-motion-jpeg,
+    multipart/x-mixed-replace, JPEG berurutan) di-decode per frame begitu
+    datanya lengkap; container lain (video/mp4, ...) di-spool ke disk lalu
+    di-decode. Hasil dikirim sebagai NDJSON: satu baris per frame yang
+    diproses, diakhiri baris ringkasan {"done": true, ...}.
+    
+    Query:
+        stride: Proses setiap n frame (diabaikan jika adaptive)
+        adaptive: Inferensi hanya pada keyframe, frame lain diisi tracker
+        model, conf, iou: Versi model & threshold (sama dengan /detect)
+    """
+    
+    content_type = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    if content_type in MJPEG_TYPES:
+        frames = iter_mjpeg_frames(request.stream())
+    elif content_type.startswith("video/") or content_type == "application/octet-stream":
+        suffix = mimetypes.guess_extension(content_type) or ".mp4"
+        frames = iter_container_frames(request.stream(), suffix=suffix, max_bytes=VIDEO_MAX_BYTES)
+    else:
+        raise HTTPException(status_code=400,
+                            detail="Body harus berupa video (video/*, MJPEG), bukan form-data")
     
-    return JSONResponse(content={"results": results})
+    return DuplexStreamingResponse(stream_video_detections(frames, route, max(1, stride), adaptive),
+                                   media_type="application/x-ndjson",
+                                   headers={"X-Model-Version": route.version.name})
+
+def read_job_image(path: str):
+    """Baca + decode satu input job dari disk (threadpool)"""
+    with open(path, "rb") as f:
+        contents = f.read(MAX_UPLOAD_BYTES + 1)
+    return decode_image(contents)
+
+@contextmanager
+def job_route(ctx: JobContext):
+    """Pegang versi model & threshold job: versi yang diminta saat submit, atau versi aktif saat job berjalan"""
+    params = ctx.params
+    try:
+        version = registry.hold(params.get("model"))
+    except KeyError as e:
+        raise RuntimeError(e.args[0])
+    try:
+        yield Route(version, params.get("conf", CONF_THRESHOLD), params.get("iou", IOU_THRESHOLD))
+    finally:
+        version.release()
+
+async def detect_job_images(ctx: JobContext, route: Route, start: int, entries: List[Dict]) -> List:
+    """
+    Deteksi satu langkah job batch gambar (prioritas background di scheduler)
+    
+    Returns:
+        List (index, {"index", "filename", "result" | "error"}) untuk JobContext.emit
+    """
+    rows = {start + i: {"index": start + i, "filename": e["filename"]} for i, e in enumerate(entries)}
+    decoded = []
+    for index, entry in zip(rows, entries):
+        if entry.get("error"):
+            rows[index]["error"] = entry["error"]
+            continue
+        try:
+            img_array, original_shape = await run_in_threadpool(
+                read_job_image, os.path.join(ctx.input_dir, entry["stored"]))
+            decoded.append((index, img_array, original_shape))
+        except Exception as e:
+            rows[index]["error"] = str(e)
+    
+    predictions = await asyncio.gather(*[scheduler.submit(img, True, route.params) for _, img, _ in decoded],
+                                       return_exceptions=True)
+    done = []
+    for (index, img, shape), pred in zip(decoded, predictions):
+        if isinstance(pred, Exception):
+            rows[index]["error"] = str(pred)
+        else:
+            done.append((index, shape, scale_predictions(pred, img.shape, shape)))
+    
+    responses = build_detection_responses([p for _, _, p in done], [sh for _, sh, _ in done])
+    for (index, _, _), response in zip(done, responses):
+        rows[index]["result"] = response
+    return list(rows.items())
+
+async def run_image_job(ctx: JobContext) -> Dict:
+    """Handler job 'images': lanjut dari item terakhir yang tersimpan (resume setelah restart)"""
+    entries = ctx.params["files"]
+    with job_route(ctx) as route:
+        for start in range(ctx.start, len(entries), max(1, JOB_BATCH_SIZE)):
+            if await ctx.cancelled():
+                break
+            rows = await detect_job_images(ctx, route, start, entries[start:start + max(1, JOB_BATCH_SIZE)])
+            await ctx.emit(rows, errors=sum(1 for _, row in rows if "error" in row))
+    
+    # Ringkasan dari semua hasil tersimpan (termasuk yang diproses sebelum restart)
+    summary = {"images": 0, "errors": 0, "total_detections": 0, "inspection_status": {},
+               "model_version": route.version.name}
+    offset = 0
+    while True:
+        page = await run_in_threadpool(job_store.results, ctx.job_id, offset, 500)
+        if not page:
+            break
+        for row in page:
+            summary["images"] += 1
+            if "error" in row:
+                summary["errors"] += 1
+                continue
+            summary["total_detections"] += row["result"]["total_detections"]
+            status = row["result"]["inspection_status"]["status"]
+            summary["inspection_status"][status] = summary["inspection_status"].get(status, 0) + 1
+        offset += len(page)
+    return summary
+
+async def run_video_job(ctx: JobContext) -> Dict:
+    """
+    Handler job 'video': satu baris hasil per frame yang diproses
+    
+    State tracker (adaptive) tidak bisa dilanjutkan dari tengah, jadi job
+    video yang terputus restart diproses ulang dari awal.
+    """
+    if ctx.start:
+        await ctx.restart()
+    params = ctx.params
+    path = os.path.join(ctx.input_dir, params["stored"])
+    frames = iter_mjpeg_frames(iter_file_chunks(path)) if params["mjpeg"] else iter_video_file(path)
+    
+    rows, index, summary = [], 0, None
+    flush_every = max(1, JOB_BATCH_SIZE) * 4
+    with job_route(ctx) as route:
+        async with aclosing(iter_video_detections(frames, route, params["stride"], params["adaptive"],
+                                                  background=True)) as contents:
+            async for content in contents:
+                if content.get("done"):
+                    summary = content
+                    break
+                rows.append((index, content))
+                index += 1
+                if len(rows) >= flush_every:
+                    await ctx.emit(rows, errors=sum(1 for _, row in rows if "error" in row))
+                    rows = []
+                    if await ctx.cancelled():
+                        break
+    await ctx.emit(rows, errors=sum(1 for _, row in rows if "error" in row))
+    if summary is not None and "error" in summary:
+        raise RuntimeError(summary["error"])
+    return summary
+
+job_store = JobStore(JOB_DB_PATH) if JOB_WORKERS > 0 else None
+job_queue = None
+if job_store is not None:
+    job_queue = JobQueue(job_store, JOB_DIR, {"images": run_image_job, "video": run_video_job},
+                         slots=JOB_WORKERS, ready=lambda: registry.state()[0] == "ready",
+                         retention_seconds=JOB_RETENTION_HOURS * 3600)
+
+def require_job(job_id: str = None) -> Dict:
+    """Raise 503 jika job queue nonaktif, 404 jika job tidak ada"""
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue nonaktif (JOB_WORKERS=0)")
+    if job_id is None:
+        return None
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job tidak ditemukan: {job_id}")
+    return job
+
+def job_model_params(model: str = None, conf: float = None, iou: float = None) -> Dict:
+    """Versi model & threshold yang disimpan di params job (versi harus sudah terdaftar)"""
+    conf, iou = validate_thresholds(conf, iou)
+    if model and model not in registry.versions:
+        raise HTTPException(status_code=404, detail=f"Versi model tidak ditemukan: {model}")
+    return {"model": model, "conf": conf, "iou": iou}
+
+@app.post("/jobs/batch", status_code=202)
+async def submit_batch_job(files: List[UploadFile] = File(...), model: str = None, conf: float = None,
+                           iou: float = None):
+    """
+    Daftarkan batch gambar sebagai job background (pengganti /detect-batch untuk batch besar)
+    
+    Upload disimpan ke disk lalu langsung dijawab 202 dengan id job; progress
+    lewat GET /jobs/{id} dan hasil per gambar lewat GET /jobs/{id}/results.
+    Tanpa ?model= job memakai versi yang aktif saat job diproses.
+    """
+    require_job()
+    options = job_model_params(model, conf, iou)
+    if len(files) > JOB_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Maksimal {JOB_MAX_FILES} file per job")
+    
+    job_id = job_queue.new_job_id()
+    entries = []
+    try:
+        for slot, file in enumerate(files):
+            entry = {"filename": file.filename}
+            if not file.content_type or not file.content_type.startswith('image/'):
+                entry["error"] = "File harus berupa gambar"
+            else:
+                suffix = os.path.splitext(file.filename or "")[1][:8]
+                entry["stored"] = f"{slot:06d}{suffix}"
+                with open(os.path.join(job_queue.input_dir(job_id), entry["stored"]), "wb") as out:
+                    await run_in_threadpool(shutil.copyfileobj, file.file, out)
+            entries.append(entry)
+    except Exception:
+        job_queue.discard(job_id)
+        raise
+    
+    job = await run_in_threadpool(job_queue.submit, "images", {"files": entries, **options}, len(entries), job_id)
+    return job
+
+@app.post("/jobs/video", status_code=202)
+async def submit_video_job(request: Request, stride: int = 1, adaptive: bool = False, model: str = None,
+                           conf: float = None, iou: float = None):
+    """
+    Daftarkan video sebagai job background (body video mentah seperti /detect-video)
+    
+    Upload disimpan seluruhnya ke disk dulu, jadi client boleh disconnect
+    setelah menerima id job; hasil per frame lewat GET /jobs/{id}/results.
+    """
+    require_job()
+    options = job_model_params(model, conf, iou)
+    content_type = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    mjpeg = content_type in MJPEG_TYPES
+    if not mjpeg and not (content_type.startswith("video/") or content_type == "application/octet-stream"):
+        raise HTTPException(status_code=400,
+                            detail="Body harus berupa video (video/*, MJPEG), bukan form-data")
+    
+    job_id = job_queue.new_job_id()
+    stored = "video" + (".mjpeg" if mjpeg else (mimetypes.guess_extension(content_type) or ".mp4"))
+    path = os.path.join(job_queue.input_dir(job_id), stored)
+    try:
+        received = 0
+        with open(path, "wb") as out:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > VIDEO_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Video melebihi batas {VIDEO_MAX_BYTES} bytes")
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        job_queue.discard(job_id)
+        raise
+    
+    stride = max(1, stride)
+    total = 0 if mjpeg else await run_in_threadpool(video_frame_count, path)
+    if total and not adaptive:
+        total = math.ceil(total / stride)
+    params = {"content_type": content_type, "stored": stored, "mjpeg": mjpeg,
+              "stride": stride, "adaptive": adaptive, "bytes": received, **options}
+    return await run_in_threadpool(job_queue.submit, "video", params, total, job_id)
+
+@app.get("/jobs")
+async def list_jobs(status: str = None, limit: int = 50):
+    """Daftar job terbaru (opsional filter status)"""
+    require_job()
+    return {"jobs": await run_in_threadpool(job_store.list, status, max(1, min(limit, 500)))}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status & progress job (processed / total, errors, ringkasan jika selesai)"""
+    return await run_in_threadpool(require_job, job_id)
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = 0, limit: int = 100):
+    """
+    Hasil per item job (paginasi, bisa dibaca selama job masih berjalan)
+    
+    Job gambar: satu item per file (urutan upload); job video: satu item per
+    frame yang diproses. Lanjutkan dengan offset=next_offset sampai complete.
+    """
+    job = await run_in_threadpool(require_job, job_id)
+    offset, limit = max(0, offset), max(1, min(limit, 1000))
+    results = await run_in_threadpool(job_store.results, job_id, offset, limit)
+    next_offset = offset + len(results)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "offset": offset,
+        "next_offset": next_offset,
+        "complete": job["status"] in JOB_FINISHED and next_offset >= job["processed"],
+        "results": results
+    }
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Batalkan job; job yang sedang berjalan berhenti setelah langkah yang sedang diproses"""
+    await run_in_threadpool(require_job, job_id)
+    return {"id": job_id, "status": await run_in_threadpool(job_queue.cancel, job_id)}
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Hapus job yang sudah selesai beserta hasilnya"""
+    job = await run_in_threadpool(require_job, job_id)
+    if job["status"] not in JOB_FINISHED:
+        raise HTTPException(status_code=409, detail="Job masih berjalan, batalkan terlebih dahulu")
+    await run_in_threadpool(job_queue.delete, job_id)
+    return {"id": job_id, "deleted": True}
+
+defect_index = DefectIndex(DEFECT_DB_PATH, DEFECT_MERGE_RADIUS_M) if DEFECT_DB_PATH else None
+
+def require_defect_index():
+    if defect_index is None:
+        raise HTTPException(status_code=503, detail="Index defect nonaktif (DEFECT_DB_PATH kosong)")
+
+def parse_captured_at(value: str = None):
+    """Epoch detik atau ISO 8601 (mis. 2024-05-01T08:30:00); None = waktu ingest"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Format captured_at tidak valid: {value}")
+
+@app.post("/ingest")
+async def ingest_image(file: UploadFile = File(...), km: str = Form(None), lat: float = Form(None),
+                       lon: float = Form(None), line: str = Form("default"), captured_at: str = Form(None),
+                       route: Route = Depends(inference_route)):
+    """
+    Deteksi satu gambar berlokasi lalu masukkan ke index defect
+    
+    Lokasi: km (chainage, "12.345" atau km-post "12+345") dan/atau lat + lon;
+    tanpa keduanya dipakai GPS dari EXIF gambar. Deteksi yang jatuh dalam
+    DEFECT_MERGE_RADIUS_M dari defect kelas & line yang sama digabung
+    (sightings bertambah), jadi foto overlap tidak menggandakan defect.
+    
+    Returns:
+        Response /detect + "location" dan "defects" (defect_id, merged, sightings per deteksi)
+    """
+    require_defect_index()
+    if not file.content_type or not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File harus berupa gambar")
+    try:
+        km = parse_chainage(km)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="lat dan lon harus diisi bersamaan")
+    seen_at = parse_captured_at(captured_at)
+    
+    with stage("read"):
+        contents = await file.read(MAX_UPLOAD_BYTES + 1)
+    if km is None and lat is None:
+        gps = await run_in_threadpool(exif_location, contents)
+        if gps is None:
+            raise HTTPException(status_code=400,
+                                detail="Lokasi wajib: isi km (chainage) atau lat + lon, atau gunakan gambar dengan GPS EXIF")
+        lat, lon = gps
+    
+    # Deteksi sama seperti /detect (termasuk result cache)
+    cache_key = cached = None
+    if result_cache is not None:
+        with stage("cache_lookup"):
+            cache_key = result_cache_key(contents, route)
+            cached = await run_in_threadpool(result_cache.get, cache_key)
+    if cached is not None:
+        content = json.loads(cached)
+    else:
+        img_array, original_shape = await read_and_decode(file, contents)
+        with stage("inference"):
+            pred_boxes = await scheduler.submit(img_array, params=route.params)
+        pred_boxes = scale_predictions(pred_boxes, img_array.shape, original_shape)
+        content = build_detection_response(pred_boxes, original_shape)
+        if cache_key is not None:
+            with stage("cache_store"):
+                await run_in_threadpool(result_cache.put, cache_key, JSONResponse(content=content).body)
+    
+    with stage("index"):
+        defects = await run_in_threadpool(
+            defect_index.ingest, content["detections"], km=km, lat=lat, lon=lon, line=line,
+            image=hashlib.sha256(contents).hexdigest(), filename=file.filename, seen_at=seen_at)
+    return {**content, "model_version": route.version.name,
+            "location": {"km": km, "lat": lat, "lon": lon, "line": line}, "defects": defects}
+
+@app.get("/defects")
+async def list_defects(km_from: str = None, km_to: str = None, lat_min: float = None, lon_min: float = None,
+                       lat_max: float = None, lon_max: float = None, line: str = None, severity: str = None,
+                       class_name: str = None, min_sightings: int = 1, limit: int = 1000, offset: int = 0):
+    """
+    Defect unik dalam rentang chainage dan/atau kotak GPS
+    
+    Contoh: /defects?km_from=12.3&km_to=14.0&severity=HIGH (urut chainage).
+    Kotak GPS butuh keempat lat_min, lon_min, lat_max, lon_max.
+    """
+    require_defect_index()
+    try:
+        km_from, km_to = parse_chainage(km_from), parse_chainage(km_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    bbox = (lat_min, lon_min, lat_max, lon_max)
+    if all(v is None for v in bbox):
+        bbox = None
+    elif any(v is None for v in bbox):
+        raise HTTPException(status_code=400, detail="Kotak GPS butuh lat_min, lon_min, lat_max dan lon_max")
+    if severity is not None:
+        severity = severity.upper()
+    offset, limit = max(0, offset), max(1, min(limit, 10000))
+    defects = await run_in_threadpool(defect_index.query, km_from, km_to, bbox, line, severity, class_name,
+                                      max(1, min_sightings), limit, offset)
+    return {"count": len(defects), "offset": offset, "next_offset": offset + len(defects), "defects": defects}
+
+@app.get("/defects/stats")
+async def defect_stats():
+    """Jumlah defect unik per severity & kelas, jumlah sighting & gambar"""
+    if defect_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **await run_in_threadpool(defect_index.stats)}
+
+@app.get("/defects/{defect_id}")
+async def get_defect(defect_id: int):
+    """Satu defect beserta sighting (gambar) terbarunya"""
+    require_defect_index()
+    defect = await run_in_threadpool(defect_index.get, defect_id)
+    if defect is None:
+        raise HTTPException(status_code=404, detail=f"Defect tidak ditemukan: {defect_id}")
+    return defect
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Queue depth & histogram batch size dari micro-batching scheduler"""
+    return scheduler.stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit / miss / eviction counter dari result cache"""
+    if result_cache is None:
+        return {"enabled": False}
+    active = registry.active_version()
+    return {"enabled": True, "model_version": active.key if active else None, **result_cache.stats()}
+
+@app.get("/workers/stats")
+async def worker_stats():
+    """Beban & status proses inferensi (mode INFERENCE_WORKERS > 0) per versi model"""
+    pools = {v.name: v.model for v in registry.list() if isinstance(v.model, WorkerPool)}
+    if not pools:
+        return {"workers": 0, "mode": "in-process"}
+    active = registry.active_version()
+    if active is not None and active.name in pools:
+        return {"version": active.name, **pools[active.name].stats(),
+                "versions": {name: pool.stats() for name, pool in pools.items()}}
+    return {"versions": {name: pool.stats() for name, pool in pools.items()}}
+
+def require_admin(request: Request):
+    """Raise 401 jika ADMIN_TOKEN diset dan header X-Admin-Token tidak cocok"""
+    if ADMIN_TOKEN and not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="X-Admin-Token tidak valid")
+
+model_loads = set()  # task load versi di background (referensi supaya tidak di-GC)
+
+@app.get("/models")
+async def list_models():
+    """Versi model terdaftar: state, hash, request in-flight; versi aktif & canary"""
+    return registry.describe()
+
+@app.post("/models/{name}/load", status_code=202)
+async def load_model_version(name: str, request: Request, path: str, activate: bool = False):
+    """
+    Load file weights (relatif terhadap MODEL_DIR) sebagai versi `name` di background
+    
+    Versi aktif tetap melayani traffic selama load + warm-up; pantau state
+    lewat GET /models. Dengan ?activate=true traffic langsung dipindah
+    begitu versi siap (hot-swap tanpa restart).
+    """
+    require_admin(request)
+    existing = registry.versions.get(name)
+    if existing is not None and existing.state != "failed":
+        raise HTTPException(status_code=409, detail=f"Versi {name} sudah ada ({existing.state})")
+    try:
+        full = registry.resolve_path(path)
+        if not os.path.isfile(full):
+            raise ValueError(f"File weights tidak ditemukan: {path}")
+        version = registry.register(name, full)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def load():
+        try:
+            registry.load(version, activate=activate)
+            print(f"[+] Model version {name} ({version.key}) ready in {version.load_seconds:.1f}s"
+                  + (", activated" if activate else ""))
+        except Exception as e:
+            print(f"[-] Error loading model version {name}: {e}")
+    
+    task = asyncio.get_running_loop().create_task(run_in_threadpool(load))
+    model_loads.add(task)
+    task.add_done_callback(model_loads.discard)
+    return version.describe()
+
+@app.post("/models/{name}/activate")
+async def activate_model_version(name: str, request: Request):
+    """Pindahkan traffic default ke versi `name` (request yang sedang berjalan selesai di versi lama)"""
+    require_admin(request)
+    try:
+        previous = registry.activate(name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    print(f"[*] Active model version: {previous} -> {name}")
+    return {"active": name, "previous": previous}
+
+@app.post("/models/{name}/canary")
+async def set_model_canary(name: str, request: Request, percent: float = 10):
+    """Kirim `percent` % request tanpa ?model= ke versi `name` (percent=0 mematikan canary)"""
+    require_admin(request)
+    try:
+        registry.set_canary(name, percent)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return registry.describe()
+
+@app.delete("/models/{name}")
+async def unload_model_version(name: str, request: Request):
+    """
+    Unload versi yang tidak aktif
+    
+    Versi langsung dikeluarkan dari routing, lalu ditunggu sampai request yang
+    masih memakainya selesai (maksimal MODEL_DRAIN_SECONDS) sebelum model di-stop.
+    """
+    require_admin(request)
+    try:
+        drained = await run_in_threadpool(registry.unload, name, MODEL_DRAIN_SECONDS)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"version": name, "unloaded": True, "drained": drained}
+
+def runtime_metrics() -> List[str]:
+    """Metric yang dibaca saat scrape: state model, scheduler & result cache"""
+    lines = gauge_lines("railway_model_ready", "1 jika model siap melayani request",
+                        1 if registry.state()[0] == "ready" else 0)
+    versions = registry.list()
+    lines += ["# HELP railway_model_requests_total Request per versi model", "# TYPE railway_model_requests_total counter"]
+    lines += [f'railway_model_requests_total{{version="{v.name}"}} {v.requests}' for v in versions]
+    lines += ["# HELP railway_model_in_flight Request yang sedang memakai versi model",
+              "# TYPE railway_model_in_flight gauge"]
+    lines += [f'railway_model_in_flight{{version="{v.name}"}} {v.in_flight}' for v in versions]
+    stats = scheduler.stats()
+    lines += gauge_lines("railway_scheduler_queue_depth", "Request yang menunggu di queue scheduler",
+                         stats["queue_depth"])
+    lines += gauge_lines("railway_scheduler_in_flight_batches", "Batch yang sedang diinferensi",
+                         stats["in_flight_batches"])
+    lines += gauge_lines("railway_scheduler_requests_total", "Request yang masuk scheduler",
+                         stats["total_requests"], "counter")
+    for key, name, doc in (("batch_size", "railway_scheduler_batch_size", "Ukuran batch inferensi"),
+                           ("queue_wait_ms", "railway_scheduler_queue_wait_ms", "Waktu antre di scheduler (ms)"),
+                           ("inference_ms", "railway_scheduler_inference_ms", "Durasi satu batch inferensi (ms)")):
+        lines += histogram_lines(name, doc, stats[key]["buckets"], stats[key]["sum"], stats[key]["count"])
+    if job_queue is not None:
+        counts = job_store.counts()
+        lines += ["# HELP railway_jobs Jumlah job per status", "# TYPE railway_jobs gauge"]
+        lines += [f'railway_jobs{{status="{status}"}} {counts.get(status, 0)}'
+                  for status in ("queued", "running", "cancelling") + JOB_FINISHED]
+    if defect_index is not None:
+        counts = defect_index.counts()
+        lines += gauge_lines("railway_defects_indexed", "Defect unik di index lokasi", counts["defects"])
+        lines += gauge_lines("railway_defect_observations", "Sighting (deteksi) yang masuk index lokasi",
+                             counts["observations"])
+    if result_cache is not None:
+        for attr in ("hits_memory", "hits_disk", "misses", "evictions", "expired"):
+            lines += gauge_lines(f"railway_result_cache_{attr}_total", f"Result cache {attr}",
+                                 getattr(result_cache, attr), "counter")
+    return lines
+
+REGISTRY.add_collector(runtime_metrics)
+
+@app.get("/metrics")
+async def metrics():
+    """Metric format teks Prometheus: latency per stage, request HTTP, deteksi per kelas, scheduler, cache"""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/classes")
 async def get_classes():
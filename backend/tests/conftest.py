@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modul backend di-import sebagai `utils.*` (sama seperti main.py dijalankan dari folder backend)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
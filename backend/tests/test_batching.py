@@ -0,0 +1,37 @@
+from utils.batching import bucket_key, make_batches
+
+
+def test_bucket_key_letterbox_shape():
+    assert bucket_key((480, 640, 3)) == (480, 640)
+    assert bucket_key((1080, 1920, 3)) == (384, 640)
+    assert bucket_key((640, 480)) == (640, 480)
+
+
+def test_same_bucket_for_same_aspect_ratio():
+    assert bucket_key((1080, 1920)) == bucket_key((720, 1280))
+    assert bucket_key((1080, 1920)) != bucket_key((1920, 1080))
+
+
+def test_make_batches_groups_by_bucket():
+    shapes = [(1080, 1920), (1920, 1080), (720, 1280), (1920, 1080)]
+    batches = make_batches(shapes, max_batch_size=8)
+    assert sorted(map(sorted, batches)) == [[0, 2], [1, 3]]
+
+
+def test_make_batches_splits_by_max_batch_size():
+    batches = make_batches([(640, 640)] * 5, max_batch_size=2)
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+def test_make_batches_covers_every_index_once():
+    shapes = [(100 + 37 * i, 200 + 11 * i) for i in range(20)]
+    batches = make_batches(shapes, max_batch_size=3, size=320)
+    assert sorted(i for batch in batches for i in batch) == list(range(20))
+    assert all(len(batch) <= 3 for batch in batches)
+    for batch in batches:
+        assert len({bucket_key(shapes[i], 320) for i in batch}) == 1
+
+
+def test_make_batches_empty_and_zero_batch_size():
+    assert make_batches([], max_batch_size=4) == []
+    assert make_batches([(640, 640)] * 2, max_batch_size=0) == [[0], [1]]
@@ -0,0 +1,90 @@
+import json
+
+import cv2
+import numpy as np
+
+from utils.bulk import JsonlWriter, run_bulk
+
+
+class FakeDetector:
+    """Pengganti RailwayDetector: satu deteksi per gambar, anotasi bisa dibuat gagal"""
+
+    def __init__(self, fail_annotation=()):
+        self.fail_annotation = set(fail_annotation)
+        self.batches = []
+
+    def detect_batch(self, images, shapes):
+        self.batches.append(len(images))
+        return [{'total': 1, 'status': {'status': 'AMAN'}, 'class_counts': {'rust': 1},
+                 'severity_counts': {'LOW': 1},
+                 'detections': [{'class': 'rust', 'bbox': [0, 0, 4, 4], 'confidence': 0.5}]}
+                for _ in images]
+
+    def annotate_image(self, image, detections, inplace=False):
+        if image.shape[1] in self.fail_annotation:
+            raise RuntimeError('annotate gagal')
+        return image
+
+
+def make_images(folder, widths):
+    folder.mkdir()
+    for i, width in enumerate(widths):
+        cv2.imwrite(str(folder / f'img{i:02d}.jpg'), np.zeros((16, width, 3), dtype=np.uint8))
+
+
+def read_records(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_bulk_writes_every_image_and_resumes(tmp_path):
+    make_images(tmp_path / 'in', [16] * 5)
+    output = str(tmp_path / 'out.jsonl')
+    writer = JsonlWriter(output)
+    stats = run_bulk(FakeDetector(), str(tmp_path / 'in'), writer, batch_size=2, workers=2)
+    writer.close()
+    assert stats['processed'] == 5 and stats['errors'] == 0 and stats['detections'] == 5
+    assert len(read_records(output)) == 5
+
+    writer = JsonlWriter(output)
+    detector = FakeDetector()
+    stats = run_bulk(detector, str(tmp_path / 'in'), writer, batch_size=2, workers=2)
+    writer.close()
+    assert stats['skipped'] == 5 and stats['processed'] == 0 and detector.batches == []
+
+
+def test_annotation_failure_is_recorded_as_error(tmp_path):
+    make_images(tmp_path / 'in', [16, 24, 16])
+    output = str(tmp_path / 'out.jsonl')
+    writer = JsonlWriter(output)
+    stats = run_bulk(FakeDetector(fail_annotation={24}), str(tmp_path / 'in'), writer, batch_size=2,
+                     workers=2, annotate_dir=str(tmp_path / 'annotated'))
+    writer.close()
+
+    records = {r['file'].rsplit('/', 1)[-1]: r for r in read_records(output)}
+    assert records['img01.jpg']['error'].startswith('annotate:')
+    assert 'error' not in records['img00.jpg'] and 'error' not in records['img02.jpg']
+    assert stats['errors'] == 1 and stats['detections'] == 2
+    assert sorted(p.name for p in (tmp_path / 'annotated').rglob('*.jpg')) == ['img00.jpg', 'img02.jpg']
+
+
+def test_resume_from_zip_does_not_read_done_members(tmp_path, monkeypatch):
+    import zipfile
+
+    make_images(tmp_path / 'in', [16] * 4)
+    archive = str(tmp_path / 'images.zip')
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for path in sorted((tmp_path / 'in').iterdir()):
+            zf.write(path, path.name)
+    output = str(tmp_path / 'out.jsonl')
+    writer = JsonlWriter(output)
+    run_bulk(FakeDetector(), archive, writer, batch_size=2)
+    writer.close()
+
+    reads = []
+    original = zipfile.ZipFile.read
+    monkeypatch.setattr(zipfile.ZipFile, 'read', lambda self, name, *a: reads.append(name) or original(self, name, *a))
+    writer = JsonlWriter(output)
+    stats = run_bulk(FakeDetector(), archive, writer, batch_size=2)
+    writer.close()
+    assert stats['skipped'] == 4 and reads == []
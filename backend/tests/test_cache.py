@@ -0,0 +1,119 @@
+import pytest
+
+from utils import cache as cache_module
+from utils.cache import ResultCache, file_digest
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'time', clock)
+    return clock
+
+
+def test_make_key_depends_on_contents_and_parts():
+    key = ResultCache.make_key(b'image', 'torch:abc', 0.25, 0.45)
+    assert key == ResultCache.make_key(b'image', 'torch:abc', 0.25, 0.45)
+    assert key != ResultCache.make_key(b'image', 'torch:def', 0.25, 0.45)
+    assert key != ResultCache.make_key(b'image', 'torch:abc', 0.5, 0.45)
+    assert key != ResultCache.make_key(b'other', 'torch:abc', 0.25, 0.45)
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = ResultCache(max_entries=2, ttl_seconds=0)
+    cache.put('a', b'1')
+    cache.put('b', b'2')
+    assert cache.get('a') == b'1'  # a jadi paling baru dipakai
+    cache.put('c', b'3')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1'
+    assert cache.get('c') == b'3'
+    assert cache.evictions == 1
+
+
+def test_ttl_expires_entries(clock):
+    cache = ResultCache(max_entries=8, ttl_seconds=60)
+    cache.put('a', b'1')
+    clock.now += 59
+    assert cache.get('a') == b'1'
+    clock.now += 2
+    assert cache.get('a') is None
+    assert cache.expired == 1
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+
+
+def test_disk_tier_survives_restart_and_expires(tmp_path, clock):
+    path = str(tmp_path / 'cache.db')
+    cache = ResultCache(max_entries=8, ttl_seconds=60, disk_path=path)
+    cache.put('a', b'1')
+
+    reopened = ResultCache(max_entries=8, ttl_seconds=60, disk_path=path)
+    assert reopened.get('a') == b'1'
+    assert reopened.hits_disk == 1
+    assert reopened.get('a') == b'1'
+    assert reopened.hits_memory == 1
+
+    clock.now += 61
+    fresh = ResultCache(max_entries=8, ttl_seconds=60, disk_path=path)
+    assert fresh.get('a') is None
+    assert fresh.stats()['disk']['entries'] == 0
+
+
+def test_disk_tier_evicts_by_last_access(tmp_path, clock):
+    cache = ResultCache(max_entries=0, ttl_seconds=0, disk_path=str(tmp_path / 'cache.db'),
+                        disk_max_bytes=10)
+    cache.put('a', b'x' * 4)
+    clock.now += 1
+    cache.put('b', b'x' * 4)
+    clock.now += 1
+    assert cache.get('a') is not None  # a diakses lebih baru dari b
+    clock.now += 1
+    cache.put('c', b'x' * 4)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+
+def test_file_digest(tmp_path):
+    path = tmp_path / 'weights.pt'
+    path.write_bytes(b'weights')
+    assert file_digest(str(path)) == file_digest(str(path))
+    assert len(file_digest(str(path), length=8)) == 8
+
+
+def test_disk_byte_total_tracks_replace_expire_and_reopen(tmp_path, clock):
+    path = str(tmp_path / 'cache.db')
+    cache = ResultCache(max_entries=0, ttl_seconds=60, disk_path=path)
+    cache.put('a', b'x' * 10)
+    cache.put('a', b'x' * 4)  # replace: ukuran lama tidak ikut terhitung
+    cache.put('b', b'x' * 6)
+    assert cache.stats()['disk']['bytes'] == 10
+    assert ResultCache(max_entries=0, disk_path=path).stats()['disk']['bytes'] == 10
+
+    clock.now += 61
+    assert cache.get('a') is None
+    assert cache.stats()['disk']['bytes'] == 6
+    cache.clear()
+    assert cache.stats()['disk']['bytes'] == 0
+
+
+def test_disk_eviction_in_batches_keeps_newest(tmp_path, clock):
+    cache = ResultCache(max_entries=0, ttl_seconds=0, disk_path=str(tmp_path / 'cache.db'),
+                        disk_max_bytes=1000)
+    cache.EVICT_BATCH = 8
+    for i in range(300):
+        clock.now += 1
+        cache.put(f'k{i}', b'x' * 10)
+    stats = cache.stats()['disk']
+    assert stats['bytes'] == 1000 and stats['entries'] == 100
+    assert cache.get('k199') is None
+    assert cache.get('k200') is not None and cache.get('k299') is not None
@@ -0,0 +1,68 @@
+import asyncio
+import os
+
+from utils.jobs import JobQueue, JobStore
+
+
+def make_queue(tmp_path, handlers, **kwargs):
+    store = JobStore(str(tmp_path / 'jobs.db'))
+    return store, JobQueue(store, str(tmp_path / 'jobs'), handlers, poll_interval=0.01, **kwargs)
+
+
+def test_job_runs_and_input_is_discarded(tmp_path):
+    async def handler(ctx):
+        await ctx.emit([(0, {'value': ctx.params['value']})])
+        return {'ok': True}
+
+    store, queue = make_queue(tmp_path, {'echo': handler})
+
+    async def main():
+        queue.start()
+        job_id = queue.new_job_id()
+        queue.submit('echo', {'value': 42}, total=1, job_id=job_id)
+        for _ in range(200):
+            if store.status(job_id) == 'done':
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return job_id
+
+    job_id = asyncio.run(main())
+    assert store.get(job_id)['summary'] == {'ok': True}
+    assert store.results(job_id) == [{'value': 42}]
+    assert not os.path.exists(queue.input_dir(job_id))
+
+
+def test_expired_jobs_are_purged_while_running(tmp_path):
+    async def handler(ctx):
+        return {}
+
+    store, queue = make_queue(tmp_path, {'noop': handler}, retention_seconds=0.05, purge_interval=0.05)
+
+    async def main():
+        queue.start()
+        job_id = queue.new_job_id()
+        queue.submit('noop', {}, job_id=job_id)
+        for _ in range(300):
+            if store.get(job_id) is None:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return job_id
+
+    job_id = asyncio.run(main())
+    assert store.get(job_id) is None
+    assert not os.path.exists(queue.input_dir(job_id))
+
+
+def test_purge_is_throttled(tmp_path):
+    store, queue = make_queue(tmp_path, {}, retention_seconds=1, purge_interval=3600)
+    calls = []
+    queue.purge = lambda: calls.append(1)
+
+    async def main():
+        await queue._purge_if_due()
+        await queue._purge_if_due()
+
+    asyncio.run(main())
+    assert len(calls) == 1
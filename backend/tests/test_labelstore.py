@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.datasets import load_data_config
+from utils.labelstore import LabelStore, build_label_store, load_label_store
+
+NAMES = ['crack', 'missing_bolt', 'rust']
+LABELS = {
+    'train': {'a': '0 0.5 0.5 0.2 0.2\n2 0.1 0.1 0.05 0.05\n', 'b': '', 'c': '1 0.3 0.3 0.1 0.4\n'},
+    'val': {'d': '0 0.4 0.4 0.1 0.1\n0 0.6 0.6 0.3 0.3\n'}
+}
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    for split, files in LABELS.items():
+        (tmp_path / split / 'images').mkdir(parents=True)
+        (tmp_path / split / 'labels').mkdir()
+        for stem, text in files.items():
+            (tmp_path / split / 'images' / f'{stem}.jpg').write_bytes(b'')
+            (tmp_path / split / 'labels' / f'{stem}.txt').write_text(text)
+    (tmp_path / 'data.yaml').write_text(
+        'train: ../train/images\nval: ../val/images\nnc: 3\nnames: [crack, missing_bolt, rust]\n')
+    return tmp_path
+
+
+def open_store(dataset):
+    config = load_data_config(str(dataset / 'data.yaml'), str(dataset))
+    return config, load_label_store(config)
+
+
+def test_store_contents(dataset):
+    _, store = open_store(dataset)
+    assert len(store) == 4 and store.num_boxes == 5
+    assert store.split_ranges == {'train': [0, 3], 'val': [3, 4]}
+    assert [os.path.basename(p) for p in store.image_paths('train')] == ['a.jpg', 'b.jpg', 'c.jpg']
+    np.testing.assert_allclose(store.labels(0), [[0, 0.5, 0.5, 0.2, 0.2], [2, 0.1, 0.1, 0.05, 0.05]])
+    assert store.labels(1).shape == (0, 5)
+    path, labels = store.samples('val')[0]
+    assert path.endswith('d.jpg') and len(labels) == 2
+
+
+def test_statistics_queries(dataset):
+    _, store = open_store(dataset)
+    assert store.class_histogram() == {'crack': 3, 'missing_bolt': 1, 'rust': 1}
+    assert store.class_histogram('train') == {'crack': 1, 'missing_bolt': 1, 'rust': 1}
+    assert store.image_histogram() == {'crack': 2, 'missing_bolt': 1, 'rust': 1}
+    assert store.images_with_class('crack').tolist() == [0, 3]
+    assert store.images_with_class('crack', 'val').tolist() == [3]
+    assert store.box_sizes('val', 'crack').shape == (2, 2)
+    assert store.size_distribution('train')['missing_bolt']['p50'] == pytest.approx(0.2, abs=1e-4)
+    with pytest.raises(ValueError):
+        store.class_id('unknown')
+
+
+def test_store_is_reused_when_fresh(dataset):
+    config, store = open_store(dataset)
+    assert not store.is_stale(config)
+    mtime = os.path.getmtime(store.path)
+    _, again = open_store(dataset)
+    assert os.path.getmtime(again.path) == mtime
+
+
+def test_in_place_label_edit_makes_store_stale(dataset):
+    config, store = open_store(dataset)
+    label = dataset / 'train' / 'labels' / 'b.txt'
+    labels_dir_mtime = os.stat(label.parent).st_mtime_ns
+    label.write_text('2 0.5 0.5 0.1 0.1\n')
+    stat = os.stat(label)
+    os.utime(label, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert os.stat(label.parent).st_mtime_ns == labels_dir_mtime
+
+    assert LabelStore(store.path).is_stale(config)
+    _, rebuilt = open_store(dataset)
+    np.testing.assert_allclose(rebuilt.labels(1), [[2, 0.5, 0.5, 0.1, 0.1]])
+
+
+def test_added_image_makes_store_stale(dataset):
+    config, store = open_store(dataset)
+    (dataset / 'val' / 'images' / 'e.jpg').write_bytes(b'')
+    os.utime(dataset / 'val' / 'images', ns=(0, os.stat(dataset / 'val' / 'images').st_mtime_ns + 10 ** 9))
+    assert store.is_stale(config)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'labels.store'
+    path.write_bytes(b'not a store')
+    with pytest.raises(ValueError):
+        LabelStore(str(path))
+
+
+def test_empty_split(tmp_path):
+    (tmp_path / 'data.yaml').write_text('train: ../train/images\nnc: 3\nnames: [crack, missing_bolt, rust]\n')
+    config = load_data_config(str(tmp_path / 'data.yaml'), str(tmp_path))
+    store = LabelStore(build_label_store(config, str(tmp_path / 'labels.store')))
+    assert len(store) == 0 and store.class_histogram() == dict.fromkeys(NAMES, 0)
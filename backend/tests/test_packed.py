@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from utils.packed import PackedEncoder, accepts_media, decode_packed, wants_packed
+from utils.postprocess import SEVERITY_COLORS, DetectionPostprocessor
+
+CLASS_NAMES = ['crack', 'missing_bolt', 'rust']
+POST = DetectionPostprocessor(CLASS_NAMES, ['crack'], ['missing_bolt'], colors=SEVERITY_COLORS)
+ENCODER = PackedEncoder(CLASS_NAMES, {n: POST.severity_of(i) for i, n in enumerate(CLASS_NAMES)},
+                        SEVERITY_COLORS)
+STATUSES = {
+    'BAHAYA': {'status': 'BAHAYA', 'icon': '🚨', 'color': '#dc2626'},
+    'AMAN': {'status': 'AMAN', 'icon': '✅', 'color': '#10b981'}
+}
+
+
+def response(pred, width: int = 640, height: int = 480) -> dict:
+    """Response dengan struktur yang sama dengan main.build_detection_responses"""
+    parsed = POST.parse(np.asarray(pred, dtype=np.float32).reshape(-1, 6))
+    severity, n = parsed['severity_counts'], parsed['total']
+    return {
+        'success': True,
+        'total_detections': n,
+        'detections': parsed['detections'],
+        'class_counts': parsed['class_counts'],
+        'statistics': {
+            'high_risk': severity['HIGH'],
+            'medium_risk': severity['MEDIUM'],
+            'low_risk': severity['LOW'],
+            'critical_percentage': round(severity['HIGH'] / n * 100, 1) if n else 0
+        },
+        'inspection_status': STATUSES['BAHAYA' if severity['HIGH'] else 'AMAN'],
+        'image_size': {'width': width, 'height': height}
+    }
+
+
+# Nilai yang exact di float32 supaya round-trip bisa dibandingkan dengan ==
+PRED_A = [[10.5, 20.25, 110.0, 220.75, 0.875, 0], [0, 0, 32, 32, 0.5, 2]]
+PRED_B = [[1, 2, 3, 4, 0.25, 1]]
+
+
+def test_single_round_trip():
+    result = response(PRED_A)
+    assert decode_packed(ENCODER.encode_single(result)) == result
+
+
+def test_empty_result_round_trip():
+    result = response([], width=1920, height=1080)
+    assert decode_packed(ENCODER.encode_single(result)) == result
+
+
+def test_batch_round_trip_with_errors():
+    entries = [
+        {'filename': 'a.jpg', 'result': response(PRED_A)},
+        {'filename': 'broken.jpg', 'error': 'File harus berupa gambar'},
+        {'filename': 'b.jpg', 'result': response(PRED_B, 1024, 768)}
+    ]
+    assert decode_packed(ENCODER.encode_batch(entries)) == {'results': entries}
+
+
+def test_arrays_are_4_byte_aligned():
+    data = ENCODER.encode_single(response(PRED_A))
+    meta_len = int(np.frombuffer(data, dtype='<u4', count=1, offset=8)[0])
+    assert meta_len % 4 == 0
+
+
+def test_decode_rejects_other_payloads():
+    with pytest.raises(ValueError):
+        decode_packed(b'{"success": true}')
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, False),
+    ('application/json', False),
+    ('application/x-railway-detections', True),
+    ('application/json, application/x-railway-detections;q=0.9', True),
+    ('application/x-railway-detections;q=0', False),
+    ('*/*', False)
+])
+def test_accept_negotiation(accept, expected):
+    assert wants_packed(accept) is expected
+
+
+def test_accepts_media_invalid_q():
+    assert not accepts_media('image/jpeg;q=abc', 'image/jpeg')
@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+
+from utils.postprocess import SEVERITY_COLORS, DetectionPostprocessor
+
+CLASS_NAMES = ['crack', 'missing_bolt', 'rust', 'vegetation']
+HIGH_RISK = ['crack']
+MEDIUM_RISK = ['missing_bolt']
+
+
+def reference_parse(pred: np.ndarray) -> dict:
+    """Loop per deteksi (implementasi sebelum vectorized) sebagai acuan schema"""
+    detections = []
+    class_counts = {name: 0 for name in CLASS_NAMES}
+    severity_counts = {'HIGH': 0, 'MEDIUM': 0, 'LOW': 0}
+    for x1, y1, x2, y2, conf, cls in pred:
+        class_id = int(cls)
+        if not 0 <= class_id < len(CLASS_NAMES):
+            continue
+        name = CLASS_NAMES[class_id]
+        severity = 'HIGH' if name in HIGH_RISK else 'MEDIUM' if name in MEDIUM_RISK else 'LOW'
+        detections.append({
+            'class': name,
+            'class_id': class_id,
+            'confidence': round(float(conf), 3),
+            'bbox': [float(x1), float(y1), float(x2), float(y2)],
+            'severity': severity,
+            'color': SEVERITY_COLORS[severity]
+        })
+        class_counts[name] += 1
+        severity_counts[severity] += 1
+    return {'detections': detections, 'total': len(detections),
+            'class_counts': class_counts, 'severity_counts': severity_counts}
+
+
+def random_predictions(rng, n: int) -> np.ndarray:
+    xy = rng.uniform(0, 600, (n, 2))
+    wh = rng.uniform(1, 100, (n, 2))
+    conf = rng.uniform(0.25, 1, (n, 1))
+    cls = rng.integers(-1, len(CLASS_NAMES) + 1, (n, 1))  # termasuk class id di luar rentang
+    return np.hstack([xy, xy + wh, conf, cls]).astype(np.float32)
+
+
+def test_parse_batch_matches_reference_json():
+    rng = np.random.default_rng(0)
+    post = DetectionPostprocessor(CLASS_NAMES, HIGH_RISK, MEDIUM_RISK, colors=SEVERITY_COLORS)
+    predictions = [random_predictions(rng, n) for n in (0, 1, 7, 30, 0, 3)]
+    results = post.parse_batch(predictions)
+    assert len(results) == len(predictions)
+    for pred, result in zip(predictions, results):
+        assert json.dumps(result) == json.dumps(reference_parse(pred))
+
+
+def test_parse_single_equals_batch_entry():
+    rng = np.random.default_rng(1)
+    post = DetectionPostprocessor(CLASS_NAMES, HIGH_RISK, MEDIUM_RISK, colors=SEVERITY_COLORS)
+    predictions = [random_predictions(rng, 5), random_predictions(rng, 9)]
+    batch = post.parse_batch(predictions)
+    assert [post.parse(p) for p in predictions] == batch
+
+
+def test_parse_without_colors_and_empty_inputs():
+    post = DetectionPostprocessor(CLASS_NAMES, HIGH_RISK, MEDIUM_RISK)
+    result = post.parse(np.array([[0, 0, 10, 10, 0.9, 2]], dtype=np.float32))
+    assert 'color' not in result['detections'][0]
+    assert result['severity_counts'] == {'HIGH': 0, 'MEDIUM': 0, 'LOW': 1}
+    assert post.parse_batch([]) == []
+    assert post.parse([])['total'] == 0
+
+
+def test_severity_of():
+    post = DetectionPostprocessor(CLASS_NAMES, HIGH_RISK, MEDIUM_RISK)
+    assert [post.severity_of(i) for i in range(4)] == ['HIGH', 'MEDIUM', 'LOW', 'LOW']
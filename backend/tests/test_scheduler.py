@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+from utils.scheduler import Histogram, InferenceScheduler
+
+
+class RecordingInfer:
+    """infer_fn palsu: catat setiap batch (gambar, params), hasil = gambar itu sendiri"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, images, *params):
+        with self.lock:
+            self.calls.append((list(images), params))
+        return [(image, params) for image in images]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_requests_are_batched():
+    infer = RecordingInfer()
+    scheduler = InferenceScheduler(infer, max_batch_size=8, max_wait_ms=50)
+
+    async def main():
+        results = await asyncio.gather(*[scheduler.submit(i) for i in range(5)])
+        await scheduler.stop()
+        return results
+
+    results = run(main())
+    assert [image for image, _ in results] == list(range(5))
+    assert len(infer.calls) == 1
+    assert sorted(infer.calls[0][0]) == list(range(5))
+
+
+def test_batch_respects_max_batch_size():
+    infer = RecordingInfer()
+    scheduler = InferenceScheduler(infer, max_batch_size=2, max_wait_ms=50)
+
+    async def main():
+        await asyncio.gather(*[scheduler.submit(i) for i in range(5)])
+        await scheduler.stop()
+
+    run(main())
+    assert all(len(images) <= 2 for images, _ in infer.calls)
+    assert sorted(i for images, _ in infer.calls for i in images) == list(range(5))
+
+
+def test_requests_with_different_params_are_not_mixed():
+    infer = RecordingInfer()
+    scheduler = InferenceScheduler(infer, max_batch_size=8, max_wait_ms=50)
+    params = [('model-a', 0.25, 0.45), ('model-b', 0.25, 0.45), ('model-a', 0.5, 0.45)]
+
+    async def main():
+        results = await asyncio.gather(*[scheduler.submit(i, params=params[i % 3]) for i in range(9)])
+        await scheduler.stop()
+        return results
+
+    results = run(main())
+    for i, (image, used) in enumerate(results):
+        assert image == i and used == params[i % 3]
+    for images, used in infer.calls:
+        assert all(params[i % 3] == used for i in images)
+    assert len(infer.calls) == 3
+
+
+def test_interactive_requests_fill_batch_before_background():
+    infer = RecordingInfer()
+    scheduler = InferenceScheduler(infer, max_batch_size=2, max_wait_ms=50)
+
+    async def main():
+        tasks = [asyncio.ensure_future(scheduler.submit(f'bg{i}', background=True)) for i in range(2)]
+        tasks += [asyncio.ensure_future(scheduler.submit(f'fg{i}')) for i in range(2)]
+        await asyncio.gather(*tasks)
+        await scheduler.stop()
+
+    run(main())
+    assert sorted(infer.calls[0][0]) == ['fg0', 'fg1']
+    assert scheduler.stats()['background_requests'] == 2
+
+
+def test_exception_is_propagated_to_every_request():
+    def failing(images, *params):
+        raise RuntimeError('boom')
+
+    scheduler = InferenceScheduler(failing, max_batch_size=4, max_wait_ms=20)
+
+    async def main():
+        results = await asyncio.gather(*[scheduler.submit(i) for i in range(3)], return_exceptions=True)
+        await scheduler.stop()
+        return results
+
+    results = run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_histogram_cumulative_buckets():
+    hist = Histogram([1, 5, 10])
+    for value in (0.5, 1, 3, 7, 20):
+        hist.observe(value)
+    data = hist.to_dict()
+    assert data['buckets'] == {'1': 2, '5': 3, '10': 4, '+Inf': 5}
+    assert data['count'] == 5
+    assert data['sum'] == 31.5
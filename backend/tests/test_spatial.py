@@ -0,0 +1,113 @@
+import pytest
+
+from utils.spatial import DefectIndex, parse_chainage, project
+
+
+def det(class_id: int = 0, confidence: float = 0.9, severity: str = 'HIGH', name: str = 'crack'):
+    return {'class': name, 'class_id': class_id, 'severity': severity,
+            'confidence': confidence, 'bbox': [0, 0, 10, 10]}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return DefectIndex(str(tmp_path / 'defects.db'), merge_radius_m=5.0)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (12.345, 12.345), ('12.345', 12.345), ('12,345', 12.345), ('12+345', 12.345),
+    ('km 7+050', 7.05)
+])
+def test_parse_chainage(value, expected):
+    assert parse_chainage(value) == pytest.approx(expected)
+
+
+def test_parse_chainage_empty():
+    assert parse_chainage(None) is None
+    assert parse_chainage('') is None
+
+
+def test_parse_chainage_invalid():
+    with pytest.raises(ValueError):
+        parse_chainage('abc')
+
+
+def test_nearby_sighting_merges_into_one_defect(index):
+    first = index.ingest([det()], km=12.000, image='img-1')
+    second = index.ingest([det(confidence=0.95)], km=12.003, image='img-2')
+    assert first[0]['merged'] is False
+    assert second[0] == {'defect_id': first[0]['defect_id'], 'merged': True, 'sightings': 2}
+    defect = index.get(first[0]['defect_id'])
+    assert defect['sightings'] == 2
+    assert defect['km'] == pytest.approx(12.0015)
+    assert defect['max_confidence'] == pytest.approx(0.95)
+    assert len(defect['observations']) == 2
+
+
+def test_no_merge_beyond_radius_other_class_or_line(index):
+    a = index.ingest([det()], km=12.000, image='img-1')[0]['defect_id']
+    assert index.ingest([det()], km=12.010, image='img-2')[0]['defect_id'] != a
+    assert index.ingest([det(class_id=1, name='rust', severity='LOW')], km=12.000, image='img-3')[0]['merged'] is False
+    assert index.ingest([det()], km=12.000, line='up', image='img-4')[0]['merged'] is False
+    assert index.counts()['defects'] == 4
+
+
+def test_one_detection_per_defect_per_image(index):
+    results = index.ingest([det(), det(confidence=0.5)], km=3.0, image='img-1')
+    assert results[0]['defect_id'] != results[1]['defect_id']
+    merged = index.ingest([det(), det()], km=3.001, image='img-2')
+    assert {r['defect_id'] for r in merged} == {r['defect_id'] for r in results}
+
+
+def test_gps_merge(index):
+    lat, lon = -6.2, 106.8
+    first = index.ingest([det()], lat=lat, lon=lon, image='img-1')[0]
+    # ~3 m ke utara
+    second = index.ingest([det()], lat=lat + 3 / 110_574.0, lon=lon, image='img-2')[0]
+    assert second['defect_id'] == first['defect_id'] and second['merged']
+    far = index.ingest([det()], lat=lat + 20 / 110_574.0, lon=lon, image='img-3')[0]
+    assert far['merged'] is False
+
+
+def test_project_is_metric():
+    x0, y0 = project(-6.2, 106.8)
+    x1, y1 = project(-6.2 + 1 / 110_574.0, 106.8)
+    assert x1 == pytest.approx(x0) and y1 - y0 == pytest.approx(1.0)
+
+
+def test_duplicate_image_is_not_counted_twice(index):
+    index.ingest([det()], km=1.0, image='same')
+    again = index.ingest([det()], km=1.0, image='same')
+    assert again[0]['duplicate_image'] is True
+    assert index.counts() == {'defects': 1, 'observations': 1, 'images': 1}
+
+
+def test_location_required(index):
+    with pytest.raises(ValueError):
+        index.ingest([det()], image='img-1')
+
+
+def test_query_by_km_range_and_severity(index):
+    index.ingest([det()], km=12.5, image='a')
+    index.ingest([det(class_id=2, name='rust', severity='LOW')], km=13.0, image='b')
+    index.ingest([det()], km=15.0, image='c')
+    found = index.query(12.3, 14.0)
+    assert [d['km'] for d in found] == [12.5, 13.0]
+    assert [d['class'] for d in index.query(12.3, 14.0, severity='HIGH')] == ['crack']
+    assert index.query(12.3, 14.0, min_sightings=2) == []
+
+
+def test_query_by_gps_bbox(index):
+    index.ingest([det()], lat=-6.2, lon=106.8, image='a')
+    index.ingest([det()], lat=-7.0, lon=110.0, image='b')
+    found = index.query(bbox=(-6.3, 106.7, -6.1, 106.9))
+    assert len(found) == 1 and found[0]['lat'] == pytest.approx(-6.2)
+
+
+def test_counts_match_stats_and_survive_reopen(tmp_path):
+    path = str(tmp_path / 'defects.db')
+    index = DefectIndex(path)
+    index.ingest([det(), det(class_id=1, name='rust', severity='LOW')], km=1.0, image='a')
+    index.ingest([det()], km=1.001, image='b')
+    stats = index.stats()
+    assert index.counts() == {k: stats[k] for k in ('defects', 'observations', 'images')}
+    assert DefectIndex(path).counts() == {'defects': 2, 'observations': 3, 'images': 2}
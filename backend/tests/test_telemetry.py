@@ -0,0 +1,63 @@
+import asyncio
+
+from fastapi import FastAPI
+
+from utils.telemetry import MetricsMiddleware, MetricsRegistry, SlowRequestProfiler
+
+
+def make_app(profiler=None):
+    registry = MetricsRegistry()
+    app = FastAPI()
+
+    @app.get('/jobs/{job_id}')
+    async def get_job(job_id: str):
+        return {'id': job_id}
+
+    @app.get('/health')
+    async def health():
+        return {}
+
+    app.add_middleware(MetricsMiddleware, registry=registry, profiler=profiler)
+    return app, registry
+
+
+def request(app, path: str, method: str = 'GET') -> int:
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+             'query_string': b'', 'headers': [], 'client': ('test', 1), 'server': ('test', 80)}
+    asyncio.run(app(scope, receive, send))
+    return next(m['status'] for m in messages if m['type'] == 'http.response.start')
+
+
+def test_requests_are_labelled_by_route_template():
+    app, registry = make_app()
+    assert request(app, '/jobs/abc') == 200
+    assert request(app, '/jobs/def') == 200
+    assert request(app, '/health') == 200
+    assert request(app, '/nope') == 404
+    assert request(app, '/jobs/abc', method='POST') == 405
+    text = registry.render()
+    assert 'railway_http_requests_total{method="GET",path="/jobs/{job_id}",status="200"} 2' in text
+    assert 'railway_http_requests_total{method="GET",path="/health",status="200"} 1' in text
+    assert 'railway_http_requests_total{method="GET",path="other",status="404"} 1' in text
+    assert 'railway_http_requests_total{method="POST",path="/jobs/{job_id}",status="405"} 1' in text
+    assert 'path="/jobs/abc"' not in text
+
+
+def test_slow_request_profile_is_written(tmp_path):
+    profiler = SlowRequestProfiler(threshold_ms=0, interval_ms=1, output_dir=str(tmp_path))
+    app, _ = make_app(profiler)
+    started = profiler.begin()
+    profiler.samples.append((started, ['main;handler']))
+    assert request(app, '/health') == 200
+    profiler.end(started, 'GET /manual')
+    assert profiler.active == 0
+    assert list(tmp_path.glob('*.folded'))
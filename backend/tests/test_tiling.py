@@ -0,0 +1,101 @@
+import numpy as np
+
+from utils.boxes import box_ios, box_iou, nms
+from utils.tiling import TiledPredictor, make_tiles, merge_tile_predictions, tile_windows
+
+
+def test_tile_windows_cover_image_with_equal_tiles():
+    windows = tile_windows(1000, 1500, tile_size=640, overlap=0.2)
+    assert {(x2 - x1, y2 - y1) for x1, y1, x2, y2 in windows} == {(640, 640)}
+    assert max(w[2] for w in windows) == 1500 and max(w[3] for w in windows) == 1000
+    covered = np.zeros((1000, 1500), dtype=bool)
+    for x1, y1, x2, y2 in windows:
+        covered[y1:y2, x1:x2] = True
+    assert covered.all()
+
+
+def test_small_image_is_single_tile():
+    image = np.zeros((300, 400, 3), dtype=np.uint8)
+    crops, windows = make_tiles(image, tile_size=640)
+    assert windows == [(0, 0, 400, 300)]
+    assert crops[0] is image
+
+
+def test_make_tiles_appends_full_image():
+    image = np.zeros((1000, 1500, 3), dtype=np.uint8)
+    crops, windows = make_tiles(image, tile_size=640, include_full=True)
+    assert windows[-1] == (0, 0, 1500, 1000) and crops[-1] is image
+    assert len(make_tiles(image, tile_size=640, include_full=False)[0]) == len(crops) - 1
+
+
+def test_box_overlap_metrics():
+    a = np.array([[0, 0, 10, 10]], dtype=np.float32)
+    b = np.array([[0, 0, 5, 10], [20, 20, 30, 30]], dtype=np.float32)
+    np.testing.assert_allclose(box_iou(a, b), [[0.5, 0.0]], atol=1e-6)
+    np.testing.assert_allclose(box_ios(a, b), [[1.0, 0.0]], atol=1e-6)
+
+
+def test_nms_keeps_highest_score_per_cluster():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]], dtype=np.float32)
+    keep = nms(boxes, np.array([0.6, 0.9, 0.5]), iou_threshold=0.45)
+    assert keep.tolist() == [1, 2]
+
+
+def test_merge_shifts_tile_predictions_to_image_coordinates():
+    windows = [(0, 0, 640, 640), (512, 0, 1152, 640)]
+    predictions = [np.zeros((0, 6), np.float32),
+                   np.array([[100, 100, 150, 150, 0.8, 1]], dtype=np.float32)]
+    merged = merge_tile_predictions(predictions, windows)
+    np.testing.assert_allclose(merged, [[612, 100, 662, 150, 0.8, 1]])
+
+
+def test_merge_prefers_whole_box_over_truncated_copy():
+    # Box terpotong di tepi kanan tile kiri (conf lebih tinggi) vs box utuh di tile kanan
+    windows = [(0, 0, 640, 640), (512, 0, 1152, 640)]
+    predictions = [np.array([[600, 100, 639, 150, 0.9, 0]], dtype=np.float32),
+                   np.array([[88, 100, 168, 150, 0.7, 0]], dtype=np.float32)]
+    merged = merge_tile_predictions(predictions, windows)
+    assert len(merged) == 1
+    np.testing.assert_allclose(merged[0], [600, 100, 680, 150, 0.7, 0])
+
+
+def test_merge_is_class_aware():
+    windows = [(0, 0, 640, 640), (512, 0, 1152, 640)]
+    box = [520, 100, 600, 150]
+    predictions = [np.array([box + [0.9, 0]], dtype=np.float32),
+                   np.array([[8, 100, 88, 150, 0.8, 2]], dtype=np.float32)]
+    merged = merge_tile_predictions(predictions, windows)
+    assert sorted(merged[:, 5].tolist()) == [0, 2]
+
+
+def test_merge_empty():
+    assert merge_tile_predictions([np.zeros((0, 6))], [(0, 0, 640, 640)]).shape == (0, 6)
+
+
+class FakeBackend:
+    iou_threshold = 0.45
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, images, size=None, conf=None, iou=None):
+        self.calls.append(len(images))
+        return [np.array([[10, 10, 20, 20, 0.5, 0]], dtype=np.float32) for _ in images]
+
+
+def test_tiled_predictor_runs_all_tiles_in_one_call():
+    backend = FakeBackend()
+    predictor = TiledPredictor(backend, tile_size=640, overlap=0.2)
+    image = np.zeros((1000, 1500, 3), dtype=np.uint8)
+    result = predictor.predict([image])
+    assert backend.calls == [predictor.tiles_run]
+    assert len(result) == 1 and result[0].shape[1] == 6
+
+
+def test_merge_is_class_aware_on_very_large_images():
+    # Gambar > 7680 px: offset kelas tetap harus memisahkan kelas berbeda
+    windows = [(0, 0, 8000, 8000)]
+    predictions = [np.array([[7700, 7700, 7750, 7750, 0.9, 0],
+                             [20, 20, 60, 60, 0.8, 1]], dtype=np.float32)]
+    merged = merge_tile_predictions(predictions, windows)
+    assert sorted(merged[:, 5].tolist()) == [0, 1]
@@ -0,0 +1,105 @@
+import asyncio
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from utils.videostream import MJPEGParser, iter_mjpeg_frames
+
+
+def jpeg(seed: int, size=(24, 32), params=()) -> bytes:
+    image = np.random.default_rng(seed).integers(0, 255, (*size, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', image, list(params))[1].tobytes()
+
+
+def with_exif_thumbnail(data: bytes, thumbnail: bytes) -> bytes:
+    """Sisipkan segmen APP1 Exif berisi thumbnail JPEG (IFD1) setelah SOI"""
+    ifd0 = struct.pack('<H', 0) + struct.pack('<I', 14)
+    ifd1 = struct.pack('<H', 2) + struct.pack('<HHII', 0x0201, 4, 1, 44) + \
+        struct.pack('<HHII', 0x0202, 4, 1, len(thumbnail)) + struct.pack('<I', 0)
+    tiff = b'II*\x00' + struct.pack('<I', 8) + ifd0 + ifd1 + thumbnail
+    payload = b'Exif\x00\x00' + tiff
+    return data[:2] + b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload + data[2:]
+
+
+FRAMES = [jpeg(i) for i in range(3)]
+
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def feed_all(parser: MJPEGParser, chunks):
+    frames = []
+    for chunk in chunks:
+        frames += parser.feed(chunk)
+    return frames
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 1 << 20])
+def test_concatenated_frames_any_chunking(chunk_size):
+    frames = feed_all(MJPEGParser(), split(b''.join(FRAMES), chunk_size))
+    assert frames == FRAMES
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 1 << 20])
+def test_multipart_boundaries_are_skipped(chunk_size):
+    stream = b''.join(b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + f + b'\r\n' for f in FRAMES)
+    frames = feed_all(MJPEGParser(), split(stream, chunk_size))
+    assert frames == FRAMES
+    assert all(cv2.imdecode(np.frombuffer(f, np.uint8), cv2.IMREAD_COLOR) is not None for f in frames)
+
+
+def test_incomplete_frame_is_held_until_complete():
+    parser = MJPEGParser()
+    data = FRAMES[0]
+    assert parser.feed(data[:-1]) == []
+    assert parser.feed(data[-1:]) == [data]
+
+
+def test_oversized_frame_raises():
+    parser = MJPEGParser(max_frame_bytes=64)
+    with pytest.raises(ValueError):
+        parser.feed(b'\xff\xd8\xff\xe1\xff\xff' + b'\x00' * 100)
+
+
+def test_exif_thumbnail_does_not_split_frame():
+    photo = with_exif_thumbnail(jpeg(10, (120, 160)), jpeg(11, (8, 8)))
+    for chunk_size in (1, 13, 1 << 20):
+        frames = feed_all(MJPEGParser(), split(photo + FRAMES[0], chunk_size))
+        assert frames == [photo, FRAMES[0]]
+    image = cv2.imdecode(np.frombuffer(photo, np.uint8), cv2.IMREAD_COLOR)
+    assert image is not None and image.shape[:2] == (120, 160)
+
+
+@pytest.mark.parametrize('params', [
+    (cv2.IMWRITE_JPEG_PROGRESSIVE, 1),
+    (cv2.IMWRITE_JPEG_RST_INTERVAL, 1)
+])
+def test_progressive_and_restart_markers(params):
+    data = jpeg(12, (64, 64), params)
+    frames = feed_all(MJPEGParser(), split(data + FRAMES[1], 7))
+    assert frames == [data, FRAMES[1]]
+
+
+def test_truncated_frame_is_returned_for_reporting():
+    broken = FRAMES[0][:len(FRAMES[0]) // 2]
+    frames = feed_all(MJPEGParser(), [broken + FRAMES[1]])
+    assert frames == [broken, FRAMES[1]]
+
+
+def test_corrupt_segment_structure_is_returned_for_reporting():
+    frames = feed_all(MJPEGParser(), [b'\xff\xd8garbage' + FRAMES[0]])
+    assert frames == [b'\xff\xd8', FRAMES[0]]
+
+
+def test_iter_mjpeg_frames_yields_none_for_undecodable_frame():
+    async def chunks():
+        yield b'\xff\xd8garbage' + FRAMES[0]
+
+    async def collect():
+        return [frame async for frame in iter_mjpeg_frames(chunks())]
+
+    frames = asyncio.run(collect())
+    assert frames[0] is None and frames[1].shape == (24, 32, 3)
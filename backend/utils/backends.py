@@ -0,0 +1,269 @@
+"""
+Inference Backends for Railway Track Inspection
+Backend inferensi yang bisa dipilih saat runtime: eager torch, TorchScript, ONNX Runtime
+"""
+
+import ast
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+from utils.loader import load_checkpoint
+from utils.telemetry import stage
+
+
+class InferenceBackend:
+    """
+    Interface backend inferensi YOLOv5
+
+    Pre-processing (letterbox), NMS dan rescale box dikerjakan di sini sehingga
+    semua backend menghasilkan output yang identik; subclass cukup
+    mengimplementasikan `load()` dan `forward()`.
+    """
+
+    name = 'base'
+    suffix = ''
+
+    def __init__(self, weights: str, device: str = 'cpu', conf_threshold: float = 0.25,
+                 iou_threshold: float = 0.45, imgsz: int = 640, threads: int = 0):
+        """
+        Args:
+            weights: Path ke file model untuk backend ini
+            device: Device torch ('cpu', 'cuda', ...)
+            conf_threshold: Confidence threshold default untuk NMS
+            iou_threshold: IOU threshold default untuk NMS
+            imgsz: Ukuran inferensi default (sisi terpanjang)
+            threads: Jumlah intra-op thread (0 = default runtime)
+        """
+        self.weights = str(weights)
+        self.device = torch.device(device)
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.imgsz = imgsz
+        self.threads = threads
+        self.max_det = 1000
+
+        # Diisi oleh load()
+        self.stride = 32
+        self.names: Dict[int, str] = {}
+        self.dynamic_shape = True   # False: input harus berukuran fixed_shape
+        self.fixed_shape = (imgsz, imgsz)
+        self.fixed_batch = 0        # >0: model hanya menerima batch sebesar ini
+
+    def load(self):
+        raise NotImplementedError
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """Raw forward pass: BCHW float (0-1) -> prediksi (B, anchors, 5 + nc)"""
+        raise NotImplementedError
+
+    def input_shape(self, shapes: Sequence[Sequence[int]], size: Optional[int] = None) -> List[int]:
+        """Shape letterbox (h, w) untuk sekumpulan gambar, sama dengan AutoShape YOLOv5"""
+        if not self.dynamic_shape:
+            return list(self.fixed_shape)
+        size = size or self.imgsz
+        scaled = [[int(y * size / max(s[:2])) for y in s[:2]] for s in shapes]
+        return [int(np.ceil(x / self.stride) * self.stride) for x in np.array(scaled).max(0)]
+
+    def preprocess(self, images: List[np.ndarray], size: Optional[int] = None):
+        """Letterbox & stack list gambar RGB uint8 menjadi tensor BCHW"""
+        from yolov5.utils.augmentations import letterbox
+
+        shape1 = self.input_shape([im.shape for im in images], size)
+        x = np.stack([letterbox(im, shape1, auto=False)[0] for im in images])
+        x = np.ascontiguousarray(x.transpose((0, 3, 1, 2)))
+        return torch.from_numpy(x).to(self.device).float() / 255, shape1
+
+    def predict(self, images: List[np.ndarray], size: Optional[int] = None,
+                conf: Optional[float] = None, iou: Optional[float] = None) -> List[np.ndarray]:
+        """
+        Jalankan deteksi untuk list gambar RGB dalam satu batch
+
+        Returns:
+            List array float32 (n, 6): x1, y1, x2, y2, conf, cls per gambar
+        """
+        from yolov5.utils.general import non_max_suppression, scale_boxes
+
+        conf = self.conf_threshold if conf is None else conf
+        iou = self.iou_threshold if iou is None else iou
+
+        with torch.inference_mode():
+            with stage('preprocess', 'backend'):
+                x, shape1 = self.preprocess(images, size)
+            with stage('forward', 'backend'):
+                y = self._forward_fixed_batch(x) if self.fixed_batch else self.forward(x)
+            with stage('nms', 'backend'):
+                y = non_max_suppression(y, conf, iou, max_det=self.max_det)
+
+                predictions = []
+                for im, det in zip(images, y):
+                    scale_boxes(shape1, det[:, :4], im.shape[:2])
+                    predictions.append(det.cpu().numpy())
+        return predictions
+
+    def _forward_fixed_batch(self, x: torch.Tensor) -> torch.Tensor:
+        """Forward untuk model dengan batch statis: pecah & pad sesuai fixed_batch"""
+        outputs = []
+        for i in range(0, len(x), self.fixed_batch):
+            chunk = x[i:i + self.fixed_batch]
+            n = len(chunk)
+            if n < self.fixed_batch:
+                chunk = torch.cat([chunk, chunk.new_zeros((self.fixed_batch - n, *chunk.shape[1:]))])
+            outputs.append(self.forward(chunk)[:n])
+        return torch.cat(outputs)
+
+    def warmup(self, runs: int = 1, batch_size: int = 1):
+        """Forward pass dummy supaya alokasi & JIT selesai sebelum traffic masuk"""
+        dummy = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.predict([dummy] * max(1, batch_size))
+
+    def describe(self) -> Dict:
+        return {
+            'backend': self.name,
+            'weights': self.weights,
+            'device': str(self.device),
+            'dynamic_shape': self.dynamic_shape,
+            'input_shape': None if self.dynamic_shape else list(self.fixed_shape),
+            'threads': self.threads
+        }
+
+
+class TorchBackend(InferenceBackend):
+    """Eager PyTorch dari checkpoint best.pt"""
+
+    name = 'torch'
+    suffix = '.pt'
+
+    def load(self):
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        self.model = load_checkpoint(self.weights, device=str(self.device))
+        self.stride = max(int(self.model.stride.max()), 32)
+        self.names = dict(self.model.names)
+        return self
+
+    def forward(self, x):
+        return self.model(x)[0]
+
+
+class TorchScriptBackend(InferenceBackend):
+    """Model TorchScript hasil `python -m utils.export --include torchscript`"""
+
+    name = 'torchscript'
+    suffix = '.torchscript'
+
+    def load(self):
+        if not os.path.isfile(self.weights):
+            raise FileNotFoundError(f"Model TorchScript tidak ditemukan: {self.weights}")
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        extra_files = {'config.txt': ''}
+        self.model = torch.jit.load(self.weights, map_location=self.device, _extra_files=extra_files)
+        self.model.eval()
+        if extra_files['config.txt']:
+            config = json.loads(extra_files['config.txt'])
+            self.stride = int(config.get('stride', 32))
+            self.names = {int(k): v for k, v in config.get('names', {}).items()}
+            self.dynamic_shape = bool(config.get('dynamic', False))
+            self.fixed_shape = tuple(config['shape'][2:4])
+            self.fixed_batch = 0 if self.dynamic_shape else int(config['shape'][0])
+        return self
+
+    def forward(self, x):
+        y = self.model(x)
+        return y[0] if isinstance(y, (list, tuple)) else y
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime (CPUExecutionProvider) dari model hasil export"""
+
+    name = 'onnx'
+    suffix = '.onnx'
+
+    def load(self):
+        import onnxruntime
+
+        if not os.path.isfile(self.weights):
+            raise FileNotFoundError(f"Model ONNX tidak ditemukan: {self.weights}")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+        providers = ['CPUExecutionProvider']
+        if self.device.type == 'cuda':
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = onnxruntime.InferenceSession(self.weights, options, providers=providers)
+
+        self.input_name = self.session.get_inputs()[0].name
+        batch, _, height, width = self.session.get_inputs()[0].shape
+        self.dynamic_shape = not (isinstance(height, int) and isinstance(width, int))
+        if not self.dynamic_shape:
+            self.fixed_shape = (height, width)
+        self.fixed_batch = batch if isinstance(batch, int) else 0
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        if 'stride' in meta:
+            self.stride = int(meta['stride'])
+        if 'names' in meta:
+            self.names = ast.literal_eval(meta['names'])
+        return self
+
+    def forward(self, x):
+        y = self.session.run(None, {self.input_name: x.cpu().numpy()})[0]
+        return torch.from_numpy(y).to(self.device)
+
+
+QUANTIZED_SUFFIX = '-int8'
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    TorchScriptBackend.name: TorchScriptBackend,
+    OnnxBackend.name: OnnxBackend
+}
+
+
+def resolve_weights(model_path: str, backend: str, quantized: bool = False) -> str:
+    """
+    Tentukan file model untuk backend tertentu
+
+    `models/best.pt` dengan backend onnx menjadi `models/best.onnx`, dan
+    dengan quantized=True menjadi `models/best-int8.onnx` (hasil utils.quantize).
+    Path yang sudah ber-suffix sesuai backend dipakai apa adanya.
+    """
+    suffix = BACKENDS[backend].suffix
+    path = Path(model_path)
+    if quantized:
+        if backend != OnnxBackend.name:
+            raise ValueError("Model INT8 hanya tersedia untuk backend onnx")
+        if path.suffix == suffix and path.stem.endswith(QUANTIZED_SUFFIX):
+            return str(path)
+        return str(path.with_name(path.stem + QUANTIZED_SUFFIX + suffix))
+    return str(path if path.suffix == suffix else path.with_suffix(suffix))
+
+
+def create_backend(name: str, model_path: str, device: str = 'cpu', quantized: bool = False,
+                   **kwargs) -> InferenceBackend:
+    """
+    Buat & load backend inferensi berdasarkan nama
+
+    Args:
+        name: 'torch', 'torchscript' atau 'onnx'
+        model_path: Path weights (.pt) atau file hasil export
+        device: Device torch
+        quantized: Pakai varian INT8 (hanya onnx)
+        **kwargs: Diteruskan ke constructor backend (conf_threshold, iou_threshold, imgsz, threads)
+
+    Returns:
+        Backend yang sudah di-load
+    """
+    name = name.lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Backend tidak dikenal: {name} (pilihan: {', '.join(BACKENDS)})")
+    backend = BACKENDS[name](resolve_weights(model_path, name, quantized), device=device, **kwargs)
+    return backend.load()
@@ -0,0 +1,56 @@
+"""
+Batching Utilities for Railway Track Inspection
+Helper untuk mengelompokkan gambar ke batch inferensi
+"""
+
+import math
+from typing import Dict, List, Sequence, Tuple
+
+
+def bucket_key(shape: Sequence[int], size: int = 640, stride: int = 32) -> Tuple[int, int]:
+    """
+    Hitung shape letterbox yang dipakai YOLOv5 untuk sebuah gambar
+
+    Gambar dengan key yang sama akan di-pad ke ukuran yang sama persis,
+    sehingga bisa digabung dalam satu tensor tanpa padding tambahan.
+
+    Args:
+        shape: Shape gambar (height, width, ...)
+        size: Ukuran inferensi (sisi terpanjang)
+        stride: Stride maksimum model
+
+    Returns:
+        Tuple (height, width) setelah resize & pad
+    """
+    h, w = shape[:2]
+    g = size / max(h, w)
+    return (
+        math.ceil(int(h * g) / stride) * stride,
+        math.ceil(int(w * g) / stride) * stride
+    )
+
+
+def make_batches(shapes: Sequence[Sequence[int]], max_batch_size: int,
+                 size: int = 640, stride: int = 32) -> List[List[int]]:
+    """
+    Kelompokkan gambar per bucket ukuran lalu pecah sesuai max batch size
+
+    Args:
+        shapes: List shape gambar
+        max_batch_size: Jumlah gambar maksimum per batch
+        size: Ukuran inferensi
+        stride: Stride maksimum model
+
+    Returns:
+        List batch, setiap batch berisi index gambar pada `shapes`
+    """
+    max_batch_size = max(1, max_batch_size)
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for i, shape in enumerate(shapes):
+        buckets.setdefault(bucket_key(shape, size, stride), []).append(i)
+
+    batches = []
+    for indices in buckets.values():
+        for start in range(0, len(indices), max_batch_size):
+            batches.append(indices[start:start + max_batch_size])
+    return batches
@@ -0,0 +1,453 @@
+"""
+Benchmark Suite for Railway Track Inspection
+Micro-benchmark hot path (decode, inferensi, post-processing, annotate, video) + load test HTTP API
+
+Tanpa models/best.pt dipakai model pengganti YOLOv5n dengan bobot acak (7 kelas),
+sehingga angka tetap bisa dibandingkan antar commit secara offline.
+
+Usage (dari folder backend):
+    python -m utils.benchmark --output bench.json
+    python -m utils.benchmark --http --concurrency 1 4 16 --requests 200 --output bench.json
+    python -m utils.benchmark --http --url http://localhost:8000 --skip-micro
+    python -m utils.benchmark --compare bench_main.json --output bench.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from utils.postprocess import DetectionPostprocessor
+
+STANDIN_CFG = 'yolov5n.yaml'
+STANDIN_PATH = os.path.join(tempfile.gettempdir(), 'railway-benchmark', 'standin-yolov5n.pt')
+
+
+def latency_summary(samples_ms: Sequence[float]) -> Dict:
+    """Ringkasan latency (ms): mean, min, p50, p95, p99, max"""
+    if not len(samples_ms):
+        return {'runs': 0}
+    lat = np.asarray(samples_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+    return {
+        'runs': len(lat),
+        'mean': round(float(lat.mean()), 3),
+        'min': round(float(lat.min()), 3),
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3),
+        'max': round(float(lat.max()), 3)
+    }
+
+
+def time_it(fn: Callable, repeats: int = 20, warmup: int = 2) -> Dict:
+    """Jalankan fn berulang kali, kembalikan latency_summary dalam ms"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return latency_summary(samples)
+
+
+def create_standin_weights(path: str = STANDIN_PATH, class_names: Sequence[str] = None,
+                           cfg: str = STANDIN_CFG, seed: int = 0) -> str:
+    """
+    Simpan checkpoint YOLOv5 (default yolov5n) berbobot acak dengan format best.pt
+
+    Arsitektur & ukuran tensor sama dengan model hasil training sehingga
+    latency representatif; deteksinya tentu tidak bermakna.
+    """
+    if os.path.isfile(path):
+        return path
+    import torch
+    import yolov5
+    from yolov5.models.yolo import Model
+
+    from utils.detector import RailwayDetector
+
+    # Model() membuka cfg relatif terhadap cwd; yaml bawaan ada di paket yolov5
+    if not os.path.isfile(cfg):
+        cfg = str(Path(yolov5.__file__).parent / 'models' / cfg)
+    class_names = list(class_names or RailwayDetector.CLASS_NAMES)
+    torch.manual_seed(seed)
+    model = Model(cfg, ch=3, nc=len(class_names))
+    model.names = class_names
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    torch.save({'model': model.half(), 'epoch': -1}, path)
+    print(f"[*] Stand-in model ({cfg}, random weights): {path}")
+    return path
+
+
+def resolve_benchmark_weights(weights: str, backend: str) -> str:
+    """Weights asli jika ada, selain itu model pengganti (export onnx / torchscript bila perlu)"""
+    from utils.backends import resolve_weights
+
+    if os.path.isfile(resolve_weights(weights, backend)):
+        return weights
+    print(f"[!] {weights} tidak ditemukan, memakai model pengganti")
+    standin = create_standin_weights()
+    if backend != 'torch' and not os.path.isfile(resolve_weights(standin, backend)):
+        from utils import export
+        exporter = export.export_onnx if backend == 'onnx' else export.export_torchscript
+        exporter(standin, dynamic=True)
+    return standin
+
+
+def synthetic_image(width: int = 1280, height: int = 720, seed: int = 0) -> np.ndarray:
+    """Gambar RGB mirip foto (noise halus + garis rel) supaya ukuran JPEG realistis"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    for x in (width // 3, 2 * width // 3):
+        cv2.line(image, (x, 0), (x + width // 10, height), (90, 90, 90), max(2, width // 80))
+    return image
+
+
+def encode_jpeg(image: np.ndarray, quality: int = 90) -> bytes:
+    return cv2.imencode('.jpg', cv2.cvtColor(image, cv2.COLOR_RGB2BGR),
+                        [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def synthetic_predictions(n_images: int, n_det: int, width: int, height: int, nc: int = 7,
+                          seed: int = 0) -> List[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    preds = []
+    for _ in range(n_images):
+        xy = rng.uniform(0, [width * 0.9, height * 0.9], (n_det, 2))
+        wh = rng.uniform(10, [width * 0.1, height * 0.1], (n_det, 2))
+        preds.append(np.concatenate([xy, xy + wh, rng.uniform(0.25, 1, (n_det, 1)),
+                                     rng.integers(0, nc, (n_det, 1))], 1).astype(np.float32))
+    return preds
+
+
+def write_synthetic_video(path: str, frames: int = 90, width: int = 640, height: int = 480,
+                          fps: int = 30) -> str:
+    """Video mp4v dengan gambar yang bergeser (simulasi kamera berjalan)"""
+    base = synthetic_image(width * 2, height, seed=1)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for i in range(frames):
+        x = (i * 4) % width
+        writer.write(cv2.cvtColor(np.ascontiguousarray(base[:, x:x + width]), cv2.COLOR_RGB2BGR))
+    writer.release()
+    return path
+
+
+def run_micro(detector, image_sizes: Sequence[int] = (640, 1920, 4000), batch_size: int = 8,
+              repeats: int = 20, video_frames: int = 90) -> Dict:
+    """
+    Micro-benchmark in-process untuk setiap hot path
+
+    Args:
+        detector: RailwayDetector yang sudah di-load
+        image_sizes: Lebar gambar uji (tinggi = 3/4 lebar)
+        batch_size: Ukuran batch untuk benchmark detect_batch / post-processing
+        repeats: Jumlah pengulangan per benchmark
+        video_frames: Panjang video sintetis (0 = lewati benchmark video)
+    """
+    from utils.detector import VideoDetector
+    from utils.imageio import decode_image, decode_image_pil
+
+    results = {}
+    imgsz = getattr(detector.model, 'imgsz', 640)
+
+    for width in image_sizes:
+        height = width * 3 // 4
+        image = synthetic_image(width, height)
+        contents = encode_jpeg(image)
+        key = f'{width}x{height}'
+        print(f"[*] Decode {key} ({len(contents) / 1e6:.2f} MB JPEG)")
+        results[f'decode_pil/{key}'] = time_it(lambda: decode_image_pil(contents), repeats)
+        results[f'decode_full/{key}'] = time_it(lambda: decode_image(contents), repeats)
+        results[f'decode_reduced/{key}'] = time_it(lambda: decode_image(contents, target_size=imgsz), repeats)
+
+    image = synthetic_image(1280, 720)
+    print("[*] Inference")
+    results['detect/1280x720'] = time_it(lambda: detector.detect(image), repeats)
+    batch = [synthetic_image(1280, 720, seed=i) for i in range(batch_size)]
+    stats = time_it(lambda: detector.detect_batch(batch), max(3, repeats // 4))
+    stats['per_image_ms'] = round(stats['mean'] / batch_size, 3)
+    results[f'detect_batch/{batch_size}x1280x720'] = stats
+    results['predict/1280x720'] = time_it(lambda: detector.model.predict([image]), repeats)
+
+    print("[*] Post-processing & annotation")
+    postprocessor = DetectionPostprocessor(detector.CLASS_NAMES, detector.HIGH_RISK, detector.MEDIUM_RISK)
+    for n_det in (10, 100):
+        preds = synthetic_predictions(batch_size, n_det, 1280, 720)
+        results[f'postprocess/{batch_size}x{n_det}det'] = time_it(lambda: postprocessor.parse_batch(preds),
+                                                                  repeats * 5)
+    detections = detector._parse_prediction(synthetic_predictions(1, 30, 1280, 720)[0], image.shape)['detections']
+    results['annotate/1280x720x30det'] = time_it(lambda: detector.annotate_image(image, detections), repeats)
+
+    if video_frames:
+        video = VideoDetector(detector)
+        with tempfile.TemporaryDirectory() as tmp:
+            source = write_synthetic_video(os.path.join(tmp, 'input.mp4'), frames=video_frames)
+            for mode, kwargs in (('sequential', {}), ('pipelined', {'pipelined': True, 'batch_size': batch_size}),
+                                 ('adaptive', {'adaptive': True})):
+                print(f"[*] Video ({mode}, {video_frames} frames)")
+                stats = video.process_video(source, os.path.join(tmp, f'{mode}.mp4'), **kwargs)
+                results[f'process_video/{mode}'] = {'frames': stats['frames'], 'seconds': stats['seconds'],
+                                                   'fps': stats['fps']}
+    return results
+
+
+def _multipart(files: Sequence[tuple], field: str) -> tuple:
+    """Body multipart/form-data: files = [(filename, bytes, content_type), ...]"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for filename, data, content_type in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+                     f'filename="{filename}"\r\nContent-Type: {content_type}\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def _unique_jpeg(contents: bytes, counter: int) -> bytes:
+    """Sisipkan segmen komentar JPEG (COM) supaya setiap request tidak kena result cache"""
+    comment = f'bench-{counter}'.encode()
+    return contents[:2] + b'\xff\xfe' + (len(comment) + 2).to_bytes(2, 'big') + comment + contents[2:]
+
+
+def run_load(url: str, endpoint: str = '/detect', image: bytes = None, concurrency: int = 4,
+             requests: int = 100, batch_files: int = 4, cache_hits: bool = False,
+             timeout: float = 120.0) -> Dict:
+    """
+    Load generator HTTP: `concurrency` thread, masing-masing satu koneksi keep-alive
+
+    Args:
+        url: Base URL API (http://host:port)
+        endpoint: '/detect' atau '/detect-batch' (boleh dengan query string)
+        image: Bytes JPEG yang dikirim (default gambar sintetis 1280x720)
+        concurrency: Jumlah request paralel
+        requests: Total request
+        batch_files: Jumlah file per request /detect-batch
+        cache_hits: Kirim bytes identik (mengukur jalur result cache)
+
+    Returns:
+        Latency p50/p95/p99, throughput (request/s & gambar/s), jumlah error per status
+    """
+    parsed = urllib.parse.urlsplit(url)
+    image = image or encode_jpeg(synthetic_image(1280, 720))
+    is_batch = endpoint.split('?')[0].rstrip('/').endswith('detect-batch')
+    files_per_request = batch_files if is_batch else 1
+    counter = iter(range(10 ** 12))
+    lock = threading.Lock()
+    latencies, statuses = [], {}
+
+    def next_body():
+        with lock:
+            start = next(counter) * files_per_request
+        files = [(f'bench_{start + i}.jpg', image if cache_hits else _unique_jpeg(image, start + i), 'image/jpeg')
+                 for i in range(files_per_request)]
+        return _multipart(files, 'files' if is_batch else 'file')
+
+    def worker(n_requests: int):
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+        try:
+            for _ in range(n_requests):
+                body, content_type = next_body()
+                t0 = time.perf_counter()
+                try:
+                    conn.request('POST', endpoint, body=body, headers={'Content-Type': content_type})
+                    response = conn.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException) as e:
+                    status = type(e).__name__
+                    conn.close()
+                    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+                elapsed = (time.perf_counter() - t0) * 1000
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if status == 200:
+                        latencies.append(elapsed)
+        finally:
+            conn.close()
+
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, [s for s in shares if s]))
+    seconds = time.perf_counter() - start
+
+    ok = statuses.get(200, 0)
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': requests,
+        'files_per_request': files_per_request,
+        'cache_hits': cache_hits,
+        'seconds': round(seconds, 3),
+        'throughput_rps': round(ok / seconds, 2) if seconds > 0 else 0.0,
+        'throughput_images': round(ok * files_per_request / seconds, 2) if seconds > 0 else 0.0,
+        'errors': {str(k): v for k, v in statuses.items() if k != 200},
+        'latency_ms': latency_summary(latencies)
+    }
+
+
+def wait_until_ready(url: str, timeout: float = 300.0):
+    """Tunggu GET / mengembalikan 200 (model_state ready)"""
+    parsed = urllib.parse.urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=5)
+            conn.request('GET', '/')
+            response = conn.getresponse()
+            body = response.read()
+            conn.close()
+            if response.status == 200:
+                return
+            if b'"failed"' in body:
+                raise RuntimeError(f"Model gagal di-load: {body.decode(errors='replace')}")
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server {url} tidak siap dalam {timeout} detik")
+
+
+def start_server(weights: str, backend: str, port: int, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    """Jalankan uvicorn main:app di proses terpisah dengan model benchmark"""
+    server_env = dict(os.environ, MODEL_PATH=os.path.abspath(weights), INFERENCE_BACKEND=backend,
+                      RESULT_CACHE_PATH='', **(env or {}))
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1',
+                             '--port', str(port), '--log-level', 'warning'],
+                            cwd=backend_dir, env=server_env)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline: Dict, current: Dict) -> List[str]:
+    """Baris perbandingan mean / p95 latency (micro) dan p95 / throughput (HTTP) vs baseline"""
+    lines = [f"{'benchmark':<44} {'baseline':>10} {'current':>10} {'change':>8}"]
+
+    def row(name, old, new, lower_is_better=True):
+        if old is None or new is None:
+            return
+        change = (new - old) / old * 100 if old else 0.0
+        marker = '' if abs(change) < 5 else ('(+)' if (change < 0) == lower_is_better else '(-)')
+        lines.append(f"{name:<44} {old:>10.2f} {new:>10.2f} {change:>+7.1f}% {marker}")
+
+    for name, stats in current.get('micro', {}).items():
+        old = baseline.get('micro', {}).get(name)
+        if not old:
+            continue
+        if 'fps' in stats:
+            row(f'{name} fps', old.get('fps'), stats['fps'], lower_is_better=False)
+        else:
+            row(f'{name} mean ms', old.get('mean'), stats.get('mean'))
+    for key, stats in current.get('http', {}).items():
+        old = baseline.get('http', {}).get(key)
+        if not old:
+            continue
+        row(f'{key} p95 ms', old['latency_ms'].get('p95'), stats['latency_ms'].get('p95'))
+        row(f'{key} rps', old['throughput_rps'], stats['throughput_rps'], lower_is_better=False)
+    return lines
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark API & hot path detector')
+    parser.add_argument('--weights', default='models/best.pt', help='Tanpa file ini dipakai model pengganti acak')
+    parser.add_argument('--backend', default=os.getenv('INFERENCE_BACKEND', 'torch'),
+                        choices=['torch', 'torchscript', 'onnx'])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[640, 1920, 4000], help='Lebar gambar decode')
+    parser.add_argument('--video-frames', type=int, default=90, help='0 = lewati benchmark video')
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--http', action='store_true', help='Jalankan load test HTTP')
+    parser.add_argument('--url', default=None, help='API yang sudah berjalan (default: start uvicorn sendiri)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--endpoints', nargs='+', default=['/detect', '/detect-batch'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=100, help='Request per level concurrency')
+    parser.add_argument('--batch-files', type=int, default=4, help='File per request /detect-batch')
+    parser.add_argument('--cache-hits', action='store_true', help='Kirim gambar identik (jalur result cache)')
+    parser.add_argument('--image', default=None, help='Gambar untuk load test (default sintetis 1280x720)')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help='JSON hasil benchmark lain sebagai baseline')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    weights = resolve_benchmark_weights(args.weights, args.backend) if not args.url else args.weights
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'backend': args.backend,
+        'weights': weights,
+        'standin': os.path.abspath(weights) == os.path.abspath(STANDIN_PATH),
+        'micro': {},
+        'http': {}
+    }
+
+    if not args.skip_micro:
+        from utils.detector import RailwayDetector
+
+        detector = RailwayDetector(weights, backend=args.backend)
+        report['micro'] = run_micro(detector, args.sizes, args.batch_size, args.repeats, args.video_frames)
+
+    if args.http:
+        server = None
+        url = args.url
+        if not url:
+            url = f'http://127.0.0.1:{args.port}'
+            print(f"[*] Starting API server on {url}")
+            server = start_server(weights, args.backend, args.port)
+        try:
+            wait_until_ready(url)
+            image = Path(args.image).read_bytes() if args.image else None
+            for endpoint in args.endpoints:
+                for concurrency in args.concurrency:
+                    print(f"[*] Load test {endpoint} concurrency={concurrency} requests={args.requests}")
+                    result = run_load(url, endpoint, image, concurrency, args.requests, args.batch_files,
+                                      args.cache_hits)
+                    lat = result['latency_ms']
+                    print(f"    p50 {lat.get('p50')} ms, p95 {lat.get('p95')} ms, p99 {lat.get('p99')} ms, "
+                          f"{result['throughput_rps']} req/s, {result['throughput_images']} images/s, "
+                          f"errors {result['errors'] or 0}")
+                    report['http'][f'{endpoint}@c{concurrency}'] = result
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"[+] Results saved: {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print(f"[*] Compare vs {args.compare} (commit {baseline.get('commit')})")
+        print('\n'.join(compare_results(baseline, report)))
+
+
+if __name__ == '__main__':
+    main()
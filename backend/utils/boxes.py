@@ -0,0 +1,78 @@
+"""
+Box Utilities for Railway Track Inspection
+Operasi bounding box (xyxy) berbasis NumPy
+"""
+
+import numpy as np
+
+
+def box_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    IoU antar dua set box xyxy secara vectorized
+
+    Args:
+        boxes1: Array (N, 4)
+        boxes2: Array (M, 4)
+
+    Returns:
+        Matriks IoU (N, M)
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float32).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float32).reshape(-1, 4)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    return inter / (area1[:, None] + area2[None, :] - inter + 1e-9)
+
+
+def box_ios(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    Intersection over smaller area antar dua set box xyxy
+
+    Berguna untuk menggabungkan box yang terpotong di tepi tile dengan box
+    utuhnya (IoU keduanya kecil, tetapi box potongan hampir seluruhnya
+    berada di dalam box utuh).
+
+    Returns:
+        Matriks IoS (N, M)
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float32).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float32).reshape(-1, 4)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    return inter / (np.minimum(area1[:, None], area2[None, :]) + 1e-9)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.45,
+        metric: str = 'iou') -> np.ndarray:
+    """
+    Greedy non-maximum suppression
+
+    Args:
+        boxes: Array (N, 4) xyxy
+        scores: Array (N,)
+        iou_threshold: Box dengan overlap di atas nilai ini terhadap box
+            yang skornya lebih tinggi dibuang
+        metric: 'iou' atau 'ios' (intersection over smaller)
+
+    Returns:
+        Index box yang dipertahankan, urut skor menurun
+    """
+    overlap = box_ios if metric == 'ios' else box_iou
+    order = np.argsort(-np.asarray(scores), kind='stable')
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        if len(order) == 1:
+            break
+        rest = order[1:]
+        order = rest[overlap(boxes[i:i + 1], boxes[rest])[0] <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
@@ -0,0 +1,332 @@
+"""
+Bulk Inspection for Railway Track Inspection
+Proses folder / glob / arsip tar-zip gambar inspeksi secara offline, resumable
+
+Usage (dari folder backend):
+    python -m utils.bulk inspeksi_2024/ --output hasil.jsonl
+    python -m utils.bulk "foto/**/*.jpg" --output hasil.jsonl --annotate-dir annotated/
+    python -m utils.bulk foto.tar.gz --output hasil_parquet/ --format parquet
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import tarfile
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Container, Dict, Iterator, List, Set, Tuple, Union
+
+import cv2
+
+from utils.datasets import IMAGE_EXTENSIONS
+from utils.detector import RailwayDetector
+from utils.imageio import decode_image
+
+ARCHIVE_SEPARATOR = '::'
+
+
+def iter_inputs(source: str, skip: Container[str] = ()) -> Iterator[Tuple[str, Union[str, bytes, None]]]:
+    """
+    Daftar input gambar secara streaming
+
+    Args:
+        source: Folder, pola glob atau arsip tar / zip
+        skip: Nama yang sudah diproses (resume); isi member arsip-nya tidak dibaca
+
+    Yields:
+        (nama unik, path file atau bytes isi member arsip; None untuk member di skip)
+    """
+    lower = source.lower()
+    if os.path.isfile(source) and (lower.endswith('.zip')):
+        with zipfile.ZipFile(source) as archive:
+            for info in sorted(archive.infolist(), key=lambda i: i.filename):
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    name = f"{source}{ARCHIVE_SEPARATOR}{info.filename}"
+                    yield name, None if name in skip else archive.read(info)
+    elif os.path.isfile(source) and tarfile.is_tarfile(source):
+        # Mode stream: member dibaca berurutan tanpa index, cocok untuk arsip besar
+        with tarfile.open(source, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    name = f"{source}{ARCHIVE_SEPARATOR}{member.name}"
+                    yield name, None if name in skip else archive.extractfile(member).read()
+    elif os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    yield path, path
+    else:
+        for path in sorted(glob.glob(source, recursive=True)):
+            if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                yield path, path
+
+
+class JsonlWriter:
+    """Satu baris JSON per gambar, di-flush per batch; baris rusak di akhir dipotong saat resume"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            self._recover()
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _recover(self):
+        valid = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    self.done.add(json.loads(line)['file'])
+                except (ValueError, KeyError):
+                    break
+                valid += len(line)
+        with open(self.path, 'r+b') as f:
+            f.truncate(valid)
+
+    def write(self, records: List[Dict]):
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    Satu file part Parquet per batch di dalam folder output (butuh pyarrow)
+
+    Part ditulis ke file sementara lalu di-rename sehingga part yang ada
+    selalu utuh; deteksi disimpan sebagai string JSON.
+    """
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Format parquet butuh pyarrow: pip install pyarrow")
+        self.pq = pq
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.done: Set[str] = set()
+        parts = sorted(self.path.glob('part-*.parquet'))
+        for part in parts:
+            self.done.update(pq.read_table(part, columns=['file']).column('file').to_pylist())
+        self._index = len(parts)
+
+    def write(self, records: List[Dict]):
+        import pyarrow as pa
+
+        if not records:
+            return
+        rows = [{
+            'file': r['file'],
+            'error': r.get('error'),
+            'total': r.get('total'),
+            'status': r.get('status'),
+            'width': r.get('image_size', {}).get('width'),
+            'height': r.get('image_size', {}).get('height'),
+            'class_counts': json.dumps(r.get('class_counts')),
+            'severity_counts': json.dumps(r.get('severity_counts')),
+            'detections': json.dumps(r.get('detections', []), ensure_ascii=False)
+        } for r in records]
+        target = self.path / f'part-{self._index:06d}.parquet'
+        temp = target.with_suffix('.tmp')
+        self.pq.write_table(pa.Table.from_pylist(rows), temp)
+        os.replace(temp, target)
+        self._index += 1
+
+    def close(self):
+        pass
+
+
+def _load_and_decode(item: Tuple[str, Union[str, bytes]], target_size: int, max_pixels: int):
+    name, payload = item
+    try:
+        if isinstance(payload, str):
+            with open(payload, 'rb') as f:
+                payload = f.read()
+        image, original_shape = decode_image(payload, target_size=target_size, max_pixels=max_pixels)
+        return name, image, original_shape, None
+    except Exception as e:
+        return name, None, None, str(e)
+
+
+def _save_annotated(detector: RailwayDetector, image, detections: List[Dict],
+                    annotate_dir: str, name: str, jpeg_quality: int = 90):
+    archive, _, member = name.rpartition(ARCHIVE_SEPARATOR)
+    if archive:
+        name = os.path.join(Path(archive).name, member)
+    relative = os.path.splitdrive(name)[1].lstrip('/\\')
+    path = Path(annotate_dir) / Path(relative).with_suffix('.jpg')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Array decode tidak dipakai lagi: gambar & konversi warna langsung di buffer yang sama
+    annotated = detector.annotate_image(image, detections, inplace=True)
+    cv2.imwrite(str(path), cv2.cvtColor(annotated, cv2.COLOR_RGB2BGR, dst=annotated),
+                [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+
+
+def run_bulk(detector: RailwayDetector, source: str, writer, batch_size: int = 8,
+             workers: int = 4, imgsz: int = 640, annotate_dir: str = None,
+             max_pixels: int = 0, log_every: int = 100, jpeg_quality: int = 90) -> Dict:
+    """
+    Decode paralel (thread pool) + inferensi batch, hasil ditulis streaming
+
+    Decode batch berikutnya berjalan selagi batch sekarang diinferensi.
+    File yang sudah ada di output (writer.done) dilewati. Dengan annotate_dir
+    hasil satu batch baru ditulis setelah semua gambar anotasinya tersimpan,
+    sehingga resume tidak melewati file yang anotasinya belum ada.
+
+    Returns:
+        Statistik: processed, skipped, errors, seconds, images_per_second
+    """
+    # Anotasi butuh resolusi penuh; tanpa anotasi JPEG besar cukup di-decode skala kecil
+    target_size = 0 if annotate_dir else imgsz
+    skipped = 0
+
+    def pending_items():
+        nonlocal skipped
+        for item in iter_inputs(source, skip=writer.done):
+            if item[0] in writer.done:
+                skipped += 1
+                continue
+            yield item
+
+    items = pending_items()
+    stats = {'processed': 0, 'errors': 0, 'detections': 0}
+    start = time.perf_counter()
+    last_log = 0
+
+    def flush(records: List[Dict], annotations: Dict[int, Future]):
+        nonlocal last_log
+        for index, future in annotations.items():
+            try:
+                future.result()
+            except Exception as e:
+                record = records[index]
+                stats['detections'] -= record['total']
+                stats['errors'] += 1
+                records[index] = {'file': record['file'], 'error': f"annotate: {e}"}
+        writer.write(records)
+        stats['processed'] += len(records)
+
+        if stats['processed'] - last_log >= log_every:
+            last_log = stats['processed']
+            rate = stats['processed'] / (time.perf_counter() - start)
+            print(f"[*] {stats['processed']} images ({rate:.1f} images/s), "
+                  f"{stats['errors']} errors, {skipped} skipped")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='bulk-decode') as pool:
+        def submit_next():
+            chunk = list(itertools.islice(items, batch_size))
+            return [pool.submit(_load_and_decode, item, target_size, max_pixels) for item in chunk]
+
+        upcoming = submit_next()
+        previous = None
+        while upcoming:
+            current, upcoming = upcoming, submit_next()
+            decoded = [future.result() for future in current]
+
+            ok = [d for d in decoded if d[3] is None]
+            results = {}
+            if ok:
+                try:
+                    batch = detector.detect_batch([d[1] for d in ok], [d[2] for d in ok])
+                    results = {d[0]: r for d, r in zip(ok, batch)}
+                except Exception as e:
+                    results = {d[0]: e for d in ok}
+
+            records, annotations = [], {}
+            for name, image, original_shape, error in decoded:
+                result = results.get(name)
+                if isinstance(result, Exception):
+                    error = str(result)
+                if error is not None:
+                    records.append({'file': name, 'error': error})
+                    stats['errors'] += 1
+                    continue
+                records.append({
+                    'file': name,
+                    'total': result['total'],
+                    'status': result['status']['status'],
+                    'class_counts': result['class_counts'],
+                    'severity_counts': result['severity_counts'],
+                    'detections': result['detections'],
+                    'image_size': {'width': original_shape[1], 'height': original_shape[0]}
+                })
+                stats['detections'] += result['total']
+                if annotate_dir:
+                    # Encode JPEG di thread pool selagi batch berikutnya diinferensi
+                    annotations[len(records) - 1] = pool.submit(
+                        _save_annotated, detector, image, result['detections'],
+                        annotate_dir, name, jpeg_quality)
+
+            # Batch sebelumnya ditulis setelah anotasinya selesai
+            if previous is not None:
+                flush(*previous)
+            previous = records, annotations
+        if previous is not None:
+            flush(*previous)
+
+    seconds = time.perf_counter() - start
+    stats.update({
+        'skipped': skipped,
+        'seconds': round(seconds, 2),
+        'images_per_second': round(stats['processed'] / seconds, 2) if seconds > 0 else 0.0
+    })
+    return stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Inspeksi offline banyak gambar (folder / glob / tar / zip)')
+    parser.add_argument('source', help='Folder, pola glob ("foto/**/*.jpg") atau arsip .tar(.gz) / .zip')
+    parser.add_argument('--output', default='bulk_results.jsonl', help='File JSONL / folder Parquet')
+    parser.add_argument('--format', default='jsonl', choices=['jsonl', 'parquet'])
+    parser.add_argument('--weights', default='models/best.pt')
+    parser.add_argument('--backend', default=None, help='torch | torchscript | onnx (default env INFERENCE_BACKEND)')
+    parser.add_argument('--quantized', action='store_true')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--iou', type=float, default=0.45)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Thread decode')
+    parser.add_argument('--annotate-dir', default=None, help='Simpan gambar beranotasi ke folder ini')
+    parser.add_argument('--jpeg-quality', type=int, default=90, help='Kualitas JPEG gambar beranotasi')
+    parser.add_argument('--max-pixels', type=int, default=8000 * 8000)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    writer = JsonlWriter(args.output) if args.format == 'jsonl' else ParquetWriter(args.output)
+    if writer.done:
+        print(f"[*] Resume: {len(writer.done)} images already in {args.output}")
+
+    detector = RailwayDetector(args.weights, conf_threshold=args.conf, iou_threshold=args.iou,
+                               device=args.device, backend=args.backend, quantized=args.quantized,
+                               imgsz=args.imgsz)
+    try:
+        stats = run_bulk(detector, args.source, writer, batch_size=max(1, args.batch_size),
+                         workers=args.workers, imgsz=args.imgsz, annotate_dir=args.annotate_dir,
+                         max_pixels=args.max_pixels, jpeg_quality=args.jpeg_quality)
+    finally:
+        writer.close()
+
+    print(f"[+] Done: {stats['processed']} images in {stats['seconds']}s "
+          f"({stats['images_per_second']} images/s), {stats['errors']} errors, "
+          f"{stats['skipped']} skipped, {stats['detections']} detections")
+    print(f"[+] Results: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Result Cache for Railway Track Inspection
+Cache response deteksi berdasarkan hash isi upload (LRU + TTL, opsional tier disk)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def file_digest(path: str, length: int = 12) -> str:
+    """SHA-256 (dipendekkan) dari isi file, dipakai sebagai versi model"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()[:length]
+
+
+class ResultCache:
+    """
+    Cache dua tingkat untuk response JSON yang sudah di-serialize
+
+    Tier memori berupa LRU (OrderedDict) dengan batas jumlah entry; tier disk
+    opsional berupa SQLite sehingga bertahan setelah restart, dengan batas
+    ukuran total dan eviction berdasarkan waktu akses terakhir. Kedua tier
+    memakai TTL yang sama.
+
+    EVICT_BATCH entry tertua (index accessed) dihapus per langkah eviction
+    sehingga biaya put tidak bergantung pada jumlah entry di disk.
+    """
+
+    EVICT_BATCH = 64
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600,
+                 disk_path: Optional[str] = None, disk_max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Jumlah entry maksimum di memori
+            ttl_seconds: Umur maksimum entry (0 = tanpa kedaluwarsa)
+            disk_path: Path file SQLite untuk tier disk (None = nonaktif)
+            disk_max_bytes: Ukuran total maksimum value di tier disk
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+        self._db = None
+        self.disk_path = disk_path
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                'created REAL NOT NULL, accessed REAL NOT NULL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed)')
+            # Total ukuran dihitung sekali saat buka, lalu di-update tiap insert / delete
+            self._disk_bytes = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    @staticmethod
+    def make_key(contents: bytes, *parts) -> str:
+        """Key cache: hash isi upload + versi model + parameter inferensi"""
+        h = hashlib.sha256(contents)
+        h.update('|'.join(str(p) for p in parts).encode())
+        return h.hexdigest()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl > 0 and now - created > self.ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Ambil response tersimpan; None jika miss / kedaluwarsa"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.hits_memory += 1
+                    return value
+                del self._memory[key]
+                self.expired += 1
+
+            if self._db is not None:
+                row = self._db.execute('SELECT value, created, size FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    value, created, size = row
+                    if not self._expired(created, now):
+                        self._db.execute('UPDATE results SET accessed = ? WHERE key = ?', (now, key))
+                        self._put_memory(key, created, value)
+                        self.hits_disk += 1
+                        return value
+                    self._db.execute('DELETE FROM results WHERE key = ?', (key,))
+                    self._disk_bytes -= size
+                    self.expired += 1
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: bytes):
+        """Simpan response (bytes JSON) ke memori dan disk"""
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, now, value)
+            if self._db is not None:
+                old = self._db.execute('SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+                self._db.execute(
+                    'INSERT OR REPLACE INTO results (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)',
+                    (key, value, len(value), now, now))
+                self._disk_bytes += len(value) - (old[0] if old else 0)
+                self._evict_disk()
+
+    def _put_memory(self, key: str, created: float, value: bytes):
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        # Hapus entry paling lama tidak diakses (per batch, lewat index accessed) sampai di bawah batas
+        while self._disk_bytes > self.disk_max_bytes:
+            rows = self._db.execute('SELECT key, size FROM results ORDER BY accessed LIMIT ?',
+                                    (self.EVICT_BATCH,)).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            stale = []
+            for key, size in rows:
+                if self._disk_bytes <= self.disk_max_bytes:
+                    break
+                stale.append((key,))
+                self._disk_bytes -= size
+            self._db.executemany('DELETE FROM results WHERE key = ?', stale)
+            self.evictions += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM results')
+                self._disk_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            disk = None
+            if self._db is not None:
+                count = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+                disk = {'path': self.disk_path, 'entries': count, 'bytes': self._disk_bytes,
+                        'max_bytes': self.disk_max_bytes}
+            return {
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits_memory + self.hits_disk,
+                'hits_memory': self.hits_memory,
+                'hits_disk': self.hits_disk,
+                'misses': self.misses,
+                'hit_rate': round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expired': self.expired,
+                'disk': disk
+            }
@@ -0,0 +1,74 @@
+"""
+Dataset Utilities for Railway Track Inspection
+Baca datasets/data.yaml (format YOLOv5 / Roboflow) beserta label per gambar
+"""
+
+import os
+from pathlib import Path, PurePosixPath
+from typing import Dict, Optional
+
+import numpy as np
+import yaml
+
+SPLITS = ('train', 'val', 'test')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def load_data_config(yaml_path: str, root: Optional[str] = None) -> Dict:
+    """
+    Load data.yaml dan resolve folder gambar tiap split
+
+    Path di data.yaml hasil export Roboflow berupa path absolut Windows
+    (C:/Users/...). Jika `root` diberikan (atau env DATASET_ROOT), atau path
+    tersebut tidak ada di mesin ini, folder split dicari sebagai
+    `<root>/<nama folder split>/images` dengan root default folder data.yaml.
+
+    Returns:
+        Dict isi data.yaml + key 'paths' {split: folder gambar} dan 'root'
+    """
+    with open(yaml_path, encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+
+    root = root or os.getenv('DATASET_ROOT')
+    base = Path(root) if root else Path(yaml_path).resolve().parent
+    config['root'] = str(base)
+    config['paths'] = {}
+    for split in SPLITS:
+        if not config.get(split):
+            continue
+        configured = Path(config[split])
+        if root or not configured.exists():
+            folder = PurePosixPath(str(config[split]).replace('\\', '/')).parent.name
+            configured = base / folder / 'images'
+        config['paths'][split] = str(configured)
+    return config
+
+
+def label_path_for(image_path: str) -> str:
+    """Path label YOLO untuk sebuah gambar: .../images/x.jpg -> .../labels/x.txt"""
+    image_path = Path(image_path)
+    return str(image_path.parent.parent / 'labels' / (image_path.stem + '.txt'))
+
+
+def read_labels(label_path: str) -> np.ndarray:
+    """
+    Baca file label YOLO
+
+    Returns:
+        Array float32 (n, 5): class, x_center, y_center, width, height (normalized)
+    """
+    if not os.path.isfile(label_path):
+        return np.zeros((0, 5), dtype=np.float32)
+    labels = np.loadtxt(label_path, dtype=np.float32, ndmin=2)
+    return labels[:, :5] if labels.size else np.zeros((0, 5), dtype=np.float32)
+
+
+def labels_to_xyxy(labels: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Konversi label normalized xywh ke (n, 5): class, x1, y1, x2, y2 dalam pixel"""
+    out = np.empty_like(labels)
+    out[:, 0] = labels[:, 0]
+    out[:, 1] = (labels[:, 1] - labels[:, 3] / 2) * width
+    out[:, 2] = (labels[:, 2] - labels[:, 4] / 2) * height
+    out[:, 3] = (labels[:, 1] + labels[:, 3] / 2) * width
+    out[:, 4] = (labels[:, 2] + labels[:, 4] / 2) * height
+    return out
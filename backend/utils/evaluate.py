@@ -0,0 +1,337 @@
+"""
+Evaluation Utilities for Railway Track Inspection
+Hitung precision / recall / mAP per kelas dari prediksi backend vs label YOLO
+
+Usage (dari folder backend), evaluasi split val & test + gate akurasi / latency:
+    python -m utils.evaluate --weights models/best.pt --data ../datasets/data.yaml --root ../datasets
+    python -m utils.evaluate --backend onnx --splits val --min-map50 0.6 --max-latency 80
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.backends import create_backend
+from utils.boxes import box_iou
+from utils.datasets import labels_to_xyxy, load_data_config, read_labels
+from utils.imageio import decode_image, scale_predictions
+from utils.labelstore import load_label_store
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def match_predictions(pred: np.ndarray, labels: np.ndarray,
+                      iou_thresholds: np.ndarray = IOU_THRESHOLDS) -> np.ndarray:
+    """
+    Tandai prediksi yang benar (TP) untuk setiap IoU threshold
+
+    Args:
+        pred: Array (n, 6) x1, y1, x2, y2, conf, cls
+        labels: Array (m, 5) cls, x1, y1, x2, y2 (pixel)
+
+    Returns:
+        Array bool (n, len(iou_thresholds))
+    """
+    correct = np.zeros((len(pred), len(iou_thresholds)), dtype=bool)
+    if not len(pred) or not len(labels):
+        return correct
+
+    iou = box_iou(labels[:, 1:], pred[:, :4])
+    iou = np.where(labels[:, 0:1] == pred[None, :, 5], iou, 0.0)
+    for i, threshold in enumerate(iou_thresholds):
+        label_idx, pred_idx = np.nonzero(iou >= threshold)
+        if not len(label_idx):
+            continue
+        matches = np.stack([label_idx, pred_idx, iou[label_idx, pred_idx]], axis=1)
+        if len(matches) > 1:
+            # Satu label hanya boleh dipasangkan ke satu prediksi (IoU tertinggi dulu)
+            matches = matches[matches[:, 2].argsort()[::-1]]
+            matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+            matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+        correct[matches[:, 1].astype(int), i] = True
+    return correct
+
+
+def compute_ap(recall: np.ndarray, precision: np.ndarray) -> float:
+    """Average precision dengan interpolasi 101 titik (COCO)"""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    y = np.interp(x, mrec, mpre)
+    return float(((y[1:] + y[:-1]) / 2 * np.diff(x)).sum())
+
+
+def ap_per_class(tp: np.ndarray, conf: np.ndarray, pred_cls: np.ndarray,
+                 target_cls: np.ndarray, nc: int) -> Dict[str, np.ndarray]:
+    """
+    Precision, recall (pada confidence dengan F1 terbaik) dan AP per kelas
+
+    Returns:
+        Dict 'precision' (nc,), 'recall' (nc,), 'ap' (nc, n_iou), 'labels' (nc,)
+    """
+    order = np.argsort(-conf)
+    tp, conf, pred_cls = tp[order], conf[order], pred_cls[order]
+    n_labels = np.bincount(target_cls.astype(int), minlength=nc)[:nc]
+
+    px = np.linspace(0, 1, 1000)
+    p_curve, r_curve = np.zeros((nc, len(px))), np.zeros((nc, len(px)))
+    ap = np.full((nc, tp.shape[1]), np.nan)
+    for c in range(nc):
+        i = pred_cls == c
+        if not n_labels[c]:
+            continue
+        ap[c] = 0.0
+        if not i.any():
+            continue
+        tpc = tp[i].cumsum(0)
+        fpc = (1 - tp[i]).cumsum(0)
+        recall = tpc / n_labels[c]
+        precision = tpc / (tpc + fpc)
+        r_curve[c] = np.interp(-px, -conf[i], recall[:, 0], left=0)
+        p_curve[c] = np.interp(-px, -conf[i], precision[:, 0], left=1)
+        for j in range(tp.shape[1]):
+            ap[c, j] = compute_ap(recall[:, j], precision[:, j])
+
+    f1 = 2 * p_curve * r_curve / (p_curve + r_curve + 1e-16)
+    best = int(f1[n_labels > 0].mean(0).argmax()) if (n_labels > 0).any() else 0
+    return {
+        'precision': p_curve[:, best],
+        'recall': r_curve[:, best],
+        'ap': ap,
+        'labels': n_labels,
+        'best_conf': float(px[best])
+    }
+
+
+def _load_sample(sample: Tuple[str, Union[str, np.ndarray]], target_size: int):
+    image_path, labels = sample
+    try:
+        with open(image_path, 'rb') as f:
+            image, original_shape = decode_image(f.read(), target_size=target_size)
+    except (OSError, ValueError):
+        return image_path, None, None, None
+    if isinstance(labels, str):
+        labels = read_labels(labels)
+    labels = labels_to_xyxy(labels, original_shape[1], original_shape[0])
+    return image_path, image, original_shape, labels
+
+
+def evaluate(backend, samples: Sequence[Tuple[str, Union[str, np.ndarray]]], class_names: List[str],
+             conf: float = 0.001, iou: float = 0.6, size: int = None, batch_size: int = 1,
+             workers: int = 4, reduced_decode: bool = False) -> Dict:
+    """
+    Jalankan backend pada sampel (gambar, label) lalu hitung metrik per kelas
+
+    Decode gambar + baca label berjalan di thread pool (satu batch di depan
+    inferensi) sehingga latency yang diukur hanya panggilan backend.
+
+    Args:
+        backend: InferenceBackend yang sudah di-load
+        samples: List (path gambar, path label YOLO atau array label dari LabelStore)
+        class_names: Nama kelas sesuai id
+        conf: Confidence threshold NMS (rendah untuk kurva PR penuh)
+        iou: IOU threshold NMS
+        size: Ukuran inferensi (default ukuran backend)
+        batch_size: Jumlah gambar per panggilan backend
+        workers: Thread decode
+        reduced_decode: Decode JPEG besar pada skala kecil seperti API (REDUCED_DECODE)
+
+    Returns:
+        Dict metrik per kelas, mAP dan latency per gambar
+    """
+    batch_size = max(1, batch_size)
+    target_size = (size or getattr(backend, 'imgsz', 640)) if reduced_decode else 0
+    batches = [samples[i:i + batch_size] for i in range(0, len(samples), batch_size)]
+    stats, latencies = [], []
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='eval-decode') as pool:
+        def submit(index):
+            if index >= len(batches):
+                return []
+            return [pool.submit(_load_sample, sample, target_size) for sample in batches[index]]
+
+        upcoming = submit(0)
+        for index in range(len(batches)):
+            loaded, upcoming = [f.result() for f in upcoming], submit(index + 1)
+            for image_path, image, _, _ in loaded:
+                if image is None:
+                    print(f"[!] Gambar tidak bisa dibaca: {image_path}")
+            loaded = [item for item in loaded if item[1] is not None]
+            if not loaded:
+                continue
+
+            t0 = time.perf_counter()
+            preds = backend.predict([item[1] for item in loaded], size=size, conf=conf, iou=iou)
+            latencies.extend([(time.perf_counter() - t0) * 1000 / len(loaded)] * len(loaded))
+
+            for (_, image, original_shape, labels), pred in zip(loaded, preds):
+                pred = scale_predictions(pred, image.shape, original_shape)
+                stats.append((match_predictions(pred, labels), pred[:, 4], pred[:, 5], labels[:, 0]))
+
+    return summarize(stats, latencies, class_names)
+
+
+def summarize(stats: List[Tuple], latencies: List[float], class_names: List[str]) -> Dict:
+    """Gabungkan statistik per gambar menjadi metrik per kelas + ringkasan latency"""
+    nc = len(class_names)
+    if stats:
+        tp, conf, pred_cls, target_cls = (np.concatenate(x, 0) for x in zip(*stats))
+    else:
+        tp, conf, pred_cls, target_cls = np.zeros((0, len(IOU_THRESHOLDS)), bool), np.zeros(0), np.zeros(0), np.zeros(0)
+    metrics = ap_per_class(tp, conf, pred_cls, target_cls, nc)
+
+    per_class = {}
+    for c, name in enumerate(class_names):
+        has_labels = bool(metrics['labels'][c])
+        per_class[name] = {
+            'labels': int(metrics['labels'][c]),
+            'precision': round(float(metrics['precision'][c]), 4) if has_labels else None,
+            'recall': round(float(metrics['recall'][c]), 4) if has_labels else None,
+            'ap50': round(float(metrics['ap'][c, 0]), 4) if has_labels else None,
+            'ap50_95': round(float(metrics['ap'][c].mean()), 4) if has_labels else None
+        }
+
+    valid = ~np.isnan(metrics['ap'][:, 0])
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'images': len(stats),
+        'per_class': per_class,
+        'map50': round(float(metrics['ap'][valid, 0].mean()), 4) if valid.any() else 0.0,
+        'map50_95': round(float(metrics['ap'][valid].mean()), 4) if valid.any() else 0.0,
+        'latency_ms': {
+            'mean': round(float(lat.mean()), 2),
+            'p50': round(float(np.percentile(lat, 50)), 2),
+            'p95': round(float(np.percentile(lat, 95)), 2)
+        }
+    }
+
+
+def check_gates(results: Dict[str, Dict], min_map50: float = 0.0, min_map: float = 0.0,
+                max_latency: float = 0.0) -> List[str]:
+    """
+    Bandingkan hasil evaluasi per split dengan batas minimum akurasi / maksimum latency p95
+
+    Returns:
+        List pesan pelanggaran (kosong = lolos)
+    """
+    failures = []
+    for split, result in results.items():
+        if min_map50 and result['map50'] < min_map50:
+            failures.append(f"{split}: mAP@0.5 {result['map50']} < {min_map50}")
+        if min_map and result['map50_95'] < min_map:
+            failures.append(f"{split}: mAP@0.5:0.95 {result['map50_95']} < {min_map}")
+        if max_latency and result['latency_ms']['p95'] > max_latency:
+            failures.append(f"{split}: latency p95 {result['latency_ms']['p95']} ms > {max_latency} ms")
+    return failures
+
+
+def format_results(results: Dict[str, Dict]) -> str:
+    """Tabel markdown metrik per kelas untuk setiap split"""
+    fmt = lambda v: '-' if v is None else f'{v:.3f}'  # noqa: E731
+    lines = []
+    for split, result in results.items():
+        lat = result['latency_ms']
+        lines += [
+            f"## {split} ({result['images']} images)",
+            '',
+            f"mAP@0.5 **{result['map50']:.4f}** | mAP@0.5:0.95 **{result['map50_95']:.4f}** | "
+            f"latency mean {lat['mean']} ms, p50 {lat['p50']} ms, p95 {lat['p95']} ms",
+            '',
+            '| Class | Labels | P | R | AP50 | AP50-95 |',
+            '|---|---:|---:|---:|---:|---:|'
+        ]
+        for name, row in result['per_class'].items():
+            lines.append(f"| {name} | {row['labels']} | {fmt(row['precision'])} | {fmt(row['recall'])} | "
+                         f"{fmt(row['ap50'])} | {fmt(row['ap50_95'])} |")
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Evaluasi mAP + latency model pada split dataset')
+    parser.add_argument('--weights', default='models/best.pt')
+    parser.add_argument('--backend', default='torch', choices=['torch', 'torchscript', 'onnx'])
+    parser.add_argument('--quantized', action='store_true', help='Model INT8 (backend onnx)')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--data', default='../datasets/data.yaml', help='Path data.yaml')
+    parser.add_argument('--root', default=None, help='Override root dataset (default: folder data.yaml)')
+    parser.add_argument('--store', default=None, help='Path label store (default: <root>/labels.store)')
+    parser.add_argument('--splits', nargs='+', default=['val', 'test'])
+    parser.add_argument('--images', type=int, default=0, help='Batasi jumlah gambar per split (0 = semua)')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=0.001)
+    parser.add_argument('--iou', type=float, default=0.6)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=4, help='Thread decode')
+    parser.add_argument('--reduced-decode', action='store_true', help='Decode JPEG besar skala kecil seperti API')
+    parser.add_argument('--tiled', action='store_true', help='Inferensi ber-tile (utils.tiling)')
+    parser.add_argument('--tile-size', type=int, default=640)
+    parser.add_argument('--overlap', type=float, default=0.2)
+    parser.add_argument('--min-map50', type=float, default=0.0, help='Gagal (exit 1) jika mAP@0.5 di bawah nilai ini')
+    parser.add_argument('--min-map', type=float, default=0.0, help='Gagal jika mAP@0.5:0.95 di bawah nilai ini')
+    parser.add_argument('--max-latency', type=float, default=0.0, help='Gagal jika latency p95 (ms) di atas nilai ini')
+    parser.add_argument('--output', default=None, help='Path report JSON (default: evaluation_report.json di samping weights)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = load_data_config(args.data, args.root)
+    class_names = list(config['names'])
+    store = load_label_store(config, args.store)
+
+    backend = create_backend(args.backend, args.weights, device=args.device, quantized=args.quantized,
+                             imgsz=args.imgsz)
+    backend.warmup()
+    predictor = backend
+    if args.tiled:
+        from utils.tiling import TiledPredictor  # utils.tiling mengimpor modul ini
+        predictor = TiledPredictor(backend, args.tile_size, args.overlap)
+
+    results = {}
+    for split in args.splits:
+        if split not in store.split_ranges:
+            raise SystemExit(f"Split '{split}' tidak ada di {args.data}")
+        samples = store.samples(split, limit=args.images)
+        if not samples:
+            raise SystemExit(f"Tidak ada gambar di {config['paths'][split]}")
+        print(f"[*] Evaluating {len(samples)} images from split '{split}'")
+        results[split] = evaluate(predictor, samples, class_names, conf=args.conf, iou=args.iou,
+                                  size=args.imgsz, batch_size=args.batch_size, workers=args.workers,
+                                  reduced_decode=args.reduced_decode)
+
+    report = {
+        'weights': args.weights,
+        'backend': args.backend,
+        'quantized': args.quantized,
+        'imgsz': args.imgsz,
+        'conf': args.conf,
+        'iou': args.iou,
+        'batch_size': args.batch_size,
+        'reduced_decode': args.reduced_decode,
+        'tiled': args.tiled,
+        'splits': results
+    }
+    failures = check_gates(results, args.min_map50, args.min_map, args.max_latency)
+    report['passed'] = not failures
+
+    path = Path(args.output) if args.output else Path(args.weights).with_name('evaluation_report.json')
+    path.write_text(json.dumps(report, indent=2))
+    print(format_results(results))
+    print(f"[+] Report saved: {path}")
+
+    for failure in failures:
+        print(f"[-] Gate failed: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
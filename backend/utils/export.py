@@ -0,0 +1,197 @@
+"""
+Model Export for Railway Track Inspection
+Export best.pt ke TorchScript / ONNX dan cek parity deteksi antar backend
+
+Usage (dari folder backend):
+    python -m utils.export --weights models/best.pt --include torchscript onnx --check --source ../samples
+"""
+
+import argparse
+import glob
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+import torch
+
+from utils.backends import create_backend, resolve_weights
+from utils.boxes import box_iou
+from utils.loader import load_checkpoint
+
+
+def _prepare_for_export(net, dynamic: bool):
+    from yolov5.models.yolo import Detect
+
+    for m in net.modules():
+        if isinstance(m, Detect):
+            m.inplace = False
+            m.dynamic = dynamic
+            m.export = True
+    return net
+
+
+def export_torchscript(weights: str, imgsz: int = 640, batch_size: int = 1,
+                       dynamic: bool = False) -> str:
+    """Trace best.pt menjadi file .torchscript (config.txt berisi stride, names, shape)"""
+    net = _prepare_for_export(load_checkpoint(weights), dynamic)
+    im = torch.zeros(batch_size, 3, imgsz, imgsz)
+    for _ in range(2):
+        net(im)  # dry run, inisialisasi grid Detect
+
+    f = resolve_weights(weights, 'torchscript')
+    ts = torch.jit.trace(net, im, strict=False)
+    config = {
+        'shape': list(im.shape),
+        'stride': int(max(net.stride)),
+        'names': net.names,
+        'dynamic': dynamic
+    }
+    ts.save(f, _extra_files={'config.txt': json.dumps(config)})
+    print(f"[+] TorchScript exported: {f}")
+    return f
+
+
+def export_onnx(weights: str, imgsz: int = 640, batch_size: int = 1,
+                dynamic: bool = False, opset: int = 12) -> str:
+    """Export best.pt ke .onnx dengan metadata stride & names (kompatibel YOLOv5)"""
+    import onnx
+
+    net = _prepare_for_export(load_checkpoint(weights), dynamic)
+    im = torch.zeros(batch_size, 3, imgsz, imgsz)
+    for _ in range(2):
+        net(im)
+
+    f = resolve_weights(weights, 'onnx')
+    dynamic_axes = None
+    if dynamic:
+        dynamic_axes = {
+            'images': {0: 'batch', 2: 'height', 3: 'width'},
+            'output0': {0: 'batch', 1: 'anchors'}
+        }
+    torch.onnx.export(net, im, f, verbose=False, opset_version=opset, do_constant_folding=True,
+                      input_names=['images'], output_names=['output0'], dynamic_axes=dynamic_axes)
+
+    model_onnx = onnx.load(f)
+    onnx.checker.check_model(model_onnx)
+    for k, v in {'stride': int(max(net.stride)), 'names': net.names}.items():
+        meta = model_onnx.metadata_props.add()
+        meta.key, meta.value = k, str(v)
+    onnx.save(model_onnx, f)
+    print(f"[+] ONNX exported: {f}")
+    return f
+
+
+def compare_detections(reference: List[np.ndarray], candidate: List[np.ndarray],
+                       iou_tol: float = 0.9, conf_tol: float = 0.02) -> Dict:
+    """
+    Bandingkan deteksi dua backend untuk gambar yang sama
+
+    Setiap box referensi dicocokkan (greedy, kelas sama, IoU tertinggi) dengan
+    box kandidat. Parity lolos jika semua box cocok dengan IoU >= iou_tol dan
+    selisih confidence <= conf_tol.
+    """
+    matched, unmatched, extra = 0, 0, 0
+    min_iou, max_conf_diff = 1.0, 0.0
+
+    for ref, cand in zip(reference, candidate):
+        used = np.zeros(len(cand), dtype=bool)
+        iou = box_iou(ref[:, :4], cand[:, :4])
+        same_class = ref[:, None, 5] == cand[None, :, 5]
+        iou = np.where(same_class, iou, 0.0)
+        for i in np.argsort(-ref[:, 4]):
+            scores = np.where(used, -1.0, iou[i]) if len(cand) else np.array([])
+            j = int(np.argmax(scores)) if len(scores) else -1
+            if j < 0 or scores[j] < iou_tol:
+                unmatched += 1
+                continue
+            used[j] = True
+            matched += 1
+            min_iou = min(min_iou, float(scores[j]))
+            max_conf_diff = max(max_conf_diff, abs(float(ref[i, 4] - cand[j, 4])))
+        extra += int((~used).sum())
+
+    return {
+        'matched': matched,
+        'missing': unmatched,
+        'extra': extra,
+        'min_iou': round(min_iou, 4),
+        'max_conf_diff': round(max_conf_diff, 4),
+        'passed': unmatched == 0 and extra == 0 and max_conf_diff <= conf_tol
+    }
+
+
+def load_parity_images(source: str, limit: int = 32) -> List[np.ndarray]:
+    """Baca gambar RGB untuk parity check; tanpa source pakai gambar noise sintetis"""
+    images = []
+    if source:
+        paths = sorted(glob.glob(os.path.join(source, '*'))) if os.path.isdir(source) else sorted(glob.glob(source))
+        for path in paths:
+            img = cv2.imread(path)
+            if img is not None:
+                images.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+            if len(images) >= limit:
+                break
+    if not images:
+        print("[!] Tidak ada gambar source, parity check memakai gambar sintetis")
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(4)]
+    return images
+
+
+def check_parity(weights: str, backends: List[str], images: List[np.ndarray], device: str = 'cpu',
+                 imgsz: int = 640, iou_tol: float = 0.9, conf_tol: float = 0.02) -> Dict:
+    """Jalankan backend eager torch sebagai referensi lalu bandingkan backend lain"""
+    reference = create_backend('torch', weights, device=device, imgsz=imgsz)
+    expected = [reference.predict([im])[0] for im in images]
+
+    report = {}
+    for name in backends:
+        candidate = create_backend(name, weights, device=device, imgsz=imgsz)
+        actual = [candidate.predict([im])[0] for im in images]
+        report[name] = compare_detections(expected, actual, iou_tol=iou_tol, conf_tol=conf_tol)
+        status = 'OK' if report[name]['passed'] else 'MISMATCH'
+        print(f"[{'+' if report[name]['passed'] else '-'}] Parity {name}: {status} {report[name]}")
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export best.pt ke TorchScript / ONNX')
+    parser.add_argument('--weights', default='models/best.pt', help='Path checkpoint .pt')
+    parser.add_argument('--include', nargs='+', default=['torchscript', 'onnx'],
+                        choices=['torchscript', 'onnx'], help='Format export')
+    parser.add_argument('--imgsz', type=int, default=640, help='Ukuran input export')
+    parser.add_argument('--batch-size', type=int, default=1, help='Batch size (jika tidak dynamic)')
+    parser.add_argument('--static', action='store_true', help='Export shape statis (default dynamic)')
+    parser.add_argument('--opset', type=int, default=12, help='ONNX opset')
+    parser.add_argument('--check', action='store_true', help='Jalankan parity check setelah export')
+    parser.add_argument('--source', default='', help='Folder / glob gambar untuk parity check')
+    parser.add_argument('--iou-tol', type=float, default=0.9, help='IoU minimum box yang dianggap sama')
+    parser.add_argument('--conf-tol', type=float, default=0.02, help='Selisih confidence maksimum')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    dynamic = not args.static
+    exporters = {'torchscript': export_torchscript, 'onnx': export_onnx}
+    for fmt in args.include:
+        kwargs = {'opset': args.opset} if fmt == 'onnx' else {}
+        exporters[fmt](args.weights, imgsz=args.imgsz, batch_size=args.batch_size,
+                       dynamic=dynamic, **kwargs)
+
+    if args.check:
+        images = load_parity_images(args.source)
+        report = check_parity(args.weights, args.include, images, imgsz=args.imgsz,
+                              iou_tol=args.iou_tol, conf_tol=args.conf_tol)
+        report_path = Path(args.weights).with_name('parity_report.json')
+        report_path.write_text(json.dumps(report, indent=2))
+        print(f"[+] Parity report: {report_path}")
+        if not all(r['passed'] for r in report.values()):
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Image Decode for Railway Track Inspection
+Decode bytes upload (JPEG / PNG) langsung ke buffer RGB contiguous, dengan batas ukuran & decode skala kecil
+
+Usage (dari folder backend), micro-benchmark decode time & peak memory:
+    python -m utils.imageio --sizes 640 1920 4000 8000
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Flag reduced decode: libjpeg melakukan scaling di domain DCT (jauh lebih cepat dari resize)
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                 (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+# Orientation EXIF yang menukar lebar & tinggi (rotasi 90 / 270)
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class ImageTooLarge(ValueError):
+    """Upload melebihi batas byte / piksel"""
+
+
+def probe_image(contents: bytes) -> Tuple[str, int, int, int]:
+    """
+    Baca header saja (tanpa decode piksel)
+
+    Returns:
+        (format, width, height, exif orientation)
+    """
+    try:
+        with Image.open(io.BytesIO(contents)) as image:
+            orientation = 1
+            if image.format == 'JPEG':
+                orientation = image.getexif().get(0x0112, 1)
+            return image.format, image.width, image.height, orientation
+    except Exception as e:
+        raise ValueError("File bukan gambar yang valid") from e
+
+
+def decode_image(contents: bytes, target_size: int = 0, max_bytes: int = 0, max_pixels: int = 0,
+                 timings: Optional[Dict[str, float]] = None) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Decode bytes upload menjadi array RGB uint8 contiguous (H, W, 3)
+
+    Grayscale / RGBA langsung di-decode ke 3 channel oleh OpenCV dan
+    konversi BGR -> RGB dilakukan in-place, jadi hanya ada satu buffer
+    piksel. Orientasi EXIF diterapkan. JPEG yang jauh lebih besar dari
+    `target_size` di-decode pada skala 1/2, 1/4 atau 1/8 (sisi terpanjang
+    tetap >= target_size).
+
+    Args:
+        contents: Bytes file gambar
+        target_size: Ukuran input model (0 = selalu decode penuh)
+        max_bytes: Batas ukuran upload (0 = tanpa batas)
+        max_pixels: Batas width x height sebelum decode (0 = tanpa batas)
+        timings: Jika diberikan, diisi durasi (detik) stage 'probe', 'decode'
+            dan 'color' (konversi BGR -> RGB terpisah)
+
+    Returns:
+        (array RGB, (height, width) gambar asli setelah orientasi EXIF)
+    """
+    if max_bytes and len(contents) > max_bytes:
+        raise ImageTooLarge(f"Ukuran file {len(contents)} bytes melebihi batas {max_bytes} bytes")
+
+    t0 = time.perf_counter()
+    fmt, width, height, orientation = probe_image(contents)
+    t1 = time.perf_counter()
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLarge(f"Resolusi {width}x{height} melebihi batas {max_pixels} piksel")
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+
+    flags = cv2.IMREAD_COLOR
+    if fmt == 'JPEG' and target_size:
+        for factor, reduced in REDUCED_FLAGS:
+            if max(width, height) // factor >= target_size:
+                flags = reduced
+                break
+
+    buffer = np.frombuffer(contents, dtype=np.uint8)
+    rgb_flag = getattr(cv2, 'IMREAD_COLOR_RGB', None)  # OpenCV >= 4.10
+    if rgb_flag is not None and flags == cv2.IMREAD_COLOR:
+        image = cv2.imdecode(buffer, rgb_flag)
+        t2 = t3 = time.perf_counter()
+    else:
+        image = cv2.imdecode(buffer, flags)
+        t2 = time.perf_counter()
+        if image is not None:
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+        t3 = time.perf_counter()
+    if image is None:
+        raise ValueError("Gambar tidak bisa di-decode")
+    if timings is not None:
+        timings['probe'] = t1 - t0
+        timings['decode'] = t2 - t1
+        if t3 > t2:
+            timings['color'] = t3 - t2
+    return image, (height, width)
+
+
+def scale_predictions(pred: np.ndarray, decoded_shape, original_shape) -> np.ndarray:
+    """Kembalikan box hasil inferensi gambar reduced ke koordinat gambar asli"""
+    if tuple(decoded_shape[:2]) == tuple(original_shape[:2]) or not len(pred):
+        return pred
+    pred = np.array(pred, dtype=np.float32)
+    pred[:, [0, 2]] *= original_shape[1] / decoded_shape[1]
+    pred[:, [1, 3]] *= original_shape[0] / decoded_shape[0]
+    return pred
+
+
+def decode_image_pil(contents: bytes) -> np.ndarray:
+    """Jalur decode lama (PIL -> np.array -> cvtColor), hanya untuk pembanding benchmark"""
+    image = Image.open(io.BytesIO(contents))
+    img_array = np.array(image)
+    if len(img_array.shape) == 2:
+        img_array = cv2.cvtColor(img_array, cv2.COLOR_GRAY2RGB)
+    elif img_array.shape[2] == 4:
+        img_array = cv2.cvtColor(img_array, cv2.COLOR_RGBA2RGB)
+    return img_array
+
+
+def _peak_rss_kb() -> int:
+    import resource  # Unix only, hanya untuk benchmark
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(method: str, path: str, target_size: int) -> Dict:
+    """Dijalankan di proses baru supaya peak RSS tidak terpengaruh run sebelumnya"""
+    with open(path, 'rb') as f:
+        contents = f.read()
+    # Inisialisasi codec dulu supaya tidak ikut terukur
+    warm = cv2.imencode(os.path.splitext(path)[1], np.zeros((8, 8, 3), np.uint8))[1].tobytes()
+    decode_image_pil(warm)
+    decode_image(warm)
+    baseline = _peak_rss_kb()
+    t0 = time.perf_counter()
+    if method == 'pil':
+        image = decode_image_pil(contents)
+    else:
+        image, _ = decode_image(contents, target_size=target_size if method == 'reduced' else 0)
+    seconds = time.perf_counter() - t0
+    return {'ms': round(seconds * 1000, 2), 'peak_mb': round((_peak_rss_kb() - baseline) / 1024, 1),
+            'shape': list(image.shape)}
+
+
+def run_benchmark(sizes, target_size: int = 640, repeats: int = 3) -> Dict:
+    rng = np.random.default_rng(0)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            h = size * 3 // 4
+            # Noise halus supaya ukuran file mirip foto asli
+            small = rng.integers(0, 255, (max(1, h // 8), max(1, size // 8), 3), dtype=np.uint8)
+            image = cv2.resize(small, (size, h), interpolation=cv2.INTER_LINEAR)
+            for ext in ('.jpg', '.png'):
+                path = os.path.join(tmp, f'{size}{ext}')
+                cv2.imwrite(path, image)
+                key = f'{size}x{h}{ext}'
+                results[key] = {'bytes': os.path.getsize(path)}
+                for method in ('pil', 'full', 'reduced'):
+                    runs = []
+                    for _ in range(repeats):
+                        out = subprocess.run(
+                            [sys.executable, '-m', 'utils.imageio', '--measure', method, path,
+                             '--target-size', str(target_size)],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+                        runs.append(json.loads(out.stdout))
+                    results[key][method] = {
+                        'ms': min(r['ms'] for r in runs),
+                        'peak_mb': max(r['peak_mb'] for r in runs),
+                        'shape': runs[0]['shape']
+                    }
+                row = results[key]
+                print(f"{key:>16} {row['bytes'] / 1e6:6.2f} MB | "
+                      + ' | '.join(f"{m}: {row[m]['ms']:8.2f} ms {row[m]['peak_mb']:7.1f} MB"
+                                   for m in ('pil', 'full', 'reduced')))
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Micro-benchmark decode gambar upload')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[640, 1920, 4000, 8000],
+                        help='Lebar gambar uji (tinggi = 3/4 lebar)')
+    parser.add_argument('--target-size', type=int, default=640)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', default=None, help='Simpan hasil sebagai JSON')
+    parser.add_argument('--measure', nargs=2, metavar=('METHOD', 'PATH'), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.measure:
+        print(json.dumps(_measure(args.measure[0], args.measure[1], args.target_size)))
+        return
+    results = run_benchmark(args.sizes, args.target_size, args.repeats)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Benchmark saved: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+"""
+Job Queue for Railway Track Inspection
+Antrean job persisten (SQLite) untuk batch gambar besar & video, diproses di background
+
+Job disimpan di tabel `jobs` (status, progress, ringkasan) dan hasil per item
+di tabel `job_results`, sehingga status, progress dan hasil (paginasi) tetap
+bisa dibaca setelah client disconnect maupun setelah server restart. Input
+job disimpan di folder <job_dir>/<job_id>/.
+
+Status: queued -> running -> done | failed | cancelled
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """Persistensi job & hasil per item di SQLite (aman dipakai beberapa proses)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, '
+            'total INTEGER NOT NULL DEFAULT 0, processed INTEGER NOT NULL DEFAULT 0, '
+            'errors INTEGER NOT NULL DEFAULT 0, owner INTEGER, summary TEXT, error TEXT, '
+            'created REAL NOT NULL, started REAL, finished REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created)')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS job_results ('
+            'job_id TEXT NOT NULL, idx INTEGER NOT NULL, payload TEXT NOT NULL, '
+            'PRIMARY KEY (job_id, idx)) WITHOUT ROWID')
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['summary'] = json.loads(job['summary']) if job['summary'] else None
+        job['progress'] = round(job['processed'] / job['total'], 4) if job['total'] else None
+        job.pop('owner')
+        return job
+
+    def create(self, kind: str, params: Dict, total: int = 0, job_id: Optional[str] = None) -> Dict:
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO jobs (id, kind, status, params, total, created) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, kind, 'queued', json.dumps(params, ensure_ascii=False), total, time.time()))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def status(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        query, args = 'SELECT * FROM jobs', []
+        if status:
+            query += ' WHERE status = ?'
+            args.append(status)
+        query += ' ORDER BY created DESC LIMIT ?'
+        args.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, args).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def claim_next(self, kinds: Sequence[str]) -> Optional[Dict]:
+        """Ambil job queued tertua dan tandai running (atomic antar proses)"""
+        marks = ','.join('?' * len(kinds))
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(
+                    f'SELECT id FROM jobs WHERE status = ? AND kind IN ({marks}) ORDER BY created LIMIT 1',
+                    ('queued', *kinds)).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        'UPDATE jobs SET status = ?, owner = ?, started = COALESCE(started, ?) WHERE id = ?',
+                        ('running', os.getpid(), time.time(), row[0]))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        return self.get(row[0]) if row is not None else None
+
+    def set_total(self, job_id: str, total: int):
+        with self._lock:
+            self._db.execute('UPDATE jobs SET total = ? WHERE id = ?', (total, job_id))
+
+    def add_results(self, job_id: str, rows: List[Tuple[int, Dict]], errors: int = 0):
+        """Simpan hasil beberapa item + update progress dalam satu transaksi"""
+        if not rows:
+            return
+        payloads = [(job_id, index, json.dumps(content, ensure_ascii=False)) for index, content in rows]
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO job_results (job_id, idx, payload) VALUES (?, ?, ?)', payloads)
+                self._db.execute(
+                    'UPDATE jobs SET processed = (SELECT COUNT(*) FROM job_results WHERE job_id = ?), '
+                    'errors = errors + ? WHERE id = ?', (job_id, errors, job_id))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def clear_results(self, job_id: str):
+        with self._lock:
+            self._db.execute('DELETE FROM job_results WHERE job_id = ?', (job_id,))
+            self._db.execute('UPDATE jobs SET processed = 0, errors = 0 WHERE id = ?', (job_id,))
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 100) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT payload FROM job_results WHERE job_id = ? AND idx >= ? ORDER BY idx LIMIT ?',
+                (job_id, offset, limit)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def finish(self, job_id: str, status: str, summary: Optional[Dict] = None, error: Optional[str] = None):
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, summary = ?, error = ?, finished = ?, owner = NULL WHERE id = ?',
+                (status, json.dumps(summary, ensure_ascii=False) if summary is not None else None,
+                 error, time.time(), job_id))
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """queued -> cancelled langsung; running -> cancelling (dihentikan worker di batch berikutnya)"""
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                             (time.time(), job_id))
+            self._db.execute("UPDATE jobs SET status = 'cancelling' WHERE id = ? AND status = 'running'", (job_id,))
+        return self.status(job_id)
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._db.execute('DELETE FROM job_results WHERE job_id = ?', (job_id,))
+            self._db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def requeue_orphans(self) -> int:
+        """Job running milik proses yang sudah mati (crash / restart) dikembalikan ke queue"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, status, owner FROM jobs WHERE status IN ('running', 'cancelling')").fetchall()
+            # PID sendiri juga yatim: saat start proses ini belum menjalankan job (PID bisa dipakai ulang)
+            orphans = [(row['id'], row['status']) for row in rows
+                       if row['owner'] == os.getpid() or not _pid_alive(row['owner'])]
+            for job_id, status in orphans:
+                if status == 'cancelling':
+                    self._db.execute("UPDATE jobs SET status = 'cancelled', finished = ?, owner = NULL WHERE id = ?",
+                                     (time.time(), job_id))
+                else:
+                    self._db.execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ?", (job_id,))
+        return len(orphans)
+
+    def expired(self, max_age_seconds: float) -> List[str]:
+        """Id job selesai yang lebih tua dari max_age_seconds"""
+        marks = ','.join('?' * len(FINISHED))
+        with self._lock:
+            rows = self._db.execute(f'SELECT id FROM jobs WHERE status IN ({marks}) AND finished < ?',
+                                    (*FINISHED, time.time() - max_age_seconds)).fetchall()
+        return [row[0] for row in rows]
+
+
+class JobContext:
+    """Dipakai handler: resume index, simpan hasil, cek pembatalan"""
+
+    def __init__(self, store: JobStore, job: Dict, input_dir: str):
+        self.store = store
+        self.job = job
+        self.job_id = job['id']
+        self.input_dir = input_dir
+        self.params = job['params']
+        self.start = job['processed']  # item yang sudah tersimpan sebelum restart
+
+    async def set_total(self, total: int):
+        await run_in_threadpool(self.store.set_total, self.job_id, total)
+
+    async def emit(self, rows: List[Tuple[int, Dict]], errors: int = 0):
+        await run_in_threadpool(self.store.add_results, self.job_id, rows, errors)
+
+    async def restart(self):
+        """Buang hasil parsial (handler yang tidak bisa melanjutkan dari tengah, mis. video)"""
+        await run_in_threadpool(self.store.clear_results, self.job_id)
+        self.start = 0
+
+    async def cancelled(self) -> bool:
+        return await run_in_threadpool(self.store.status, self.job_id) != 'running'
+
+
+JobHandler = Callable[[JobContext], Awaitable[Optional[Dict]]]
+
+
+class JobQueue:
+    """
+    Worker asyncio yang mengambil job dari JobStore dan menjalankan handler per jenis job
+
+    Jumlah job yang berjalan bersamaan dibatasi `slots`; handler menjalankan
+    inferensi dengan prioritas background di scheduler sehingga request
+    interaktif (/detect) tetap didahulukan.
+    """
+
+    def __init__(self, store: JobStore, job_dir: str, handlers: Dict[str, JobHandler], slots: int = 1,
+                 ready: Callable[[], bool] = lambda: True, poll_interval: float = 1.0,
+                 retention_seconds: float = 0, purge_interval: float = 3600):
+        """
+        Args:
+            store: JobStore
+            job_dir: Folder input job (<job_dir>/<job_id>/)
+            handlers: Jenis job -> coroutine handler(ctx) yang mengembalikan ringkasan
+            slots: Jumlah job yang diproses bersamaan
+            ready: Job baru diambil hanya jika ready() True (mis. model sudah dimuat)
+            poll_interval: Interval cek job baru dari proses lain (detik)
+            retention_seconds: Job selesai lebih tua dari ini dihapus (0 = simpan selamanya)
+            purge_interval: Jarak minimal antar penghapusan job kedaluwarsa (detik)
+        """
+        self.store = store
+        self.job_dir = job_dir
+        self.handlers = handlers
+        self.slots = max(1, slots)
+        self.ready = ready
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.purge_interval = purge_interval
+        self._last_purge = float('-inf')
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self.running: Dict[str, str] = {}  # job id -> kind
+        os.makedirs(job_dir, exist_ok=True)
+
+    def input_dir(self, job_id: str) -> str:
+        return os.path.join(self.job_dir, job_id)
+
+    def start(self):
+        if self._workers:
+            return
+        requeued = self.store.requeue_orphans()
+        if requeued:
+            print(f"[*] Requeued {requeued} interrupted job(s)")
+        self.purge()
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._run()) for _ in range(self.slots)]
+
+    async def stop(self):
+        """Stop worker; job yang sedang berjalan dilanjutkan saat start berikutnya"""
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+
+    def submit(self, kind: str, params: Dict, total: int = 0, job_id: Optional[str] = None) -> Dict:
+        """Daftarkan job (input sudah ditulis ke input_dir(job_id)) lalu bangunkan worker"""
+        job = self.store.create(kind, params, total, job_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def new_job_id(self) -> str:
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.input_dir(job_id), exist_ok=True)
+        return job_id
+
+    def discard(self, job_id: str):
+        """Hapus input (mis. upload gagal sebelum job didaftarkan)"""
+        shutil.rmtree(self.input_dir(job_id), ignore_errors=True)
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        status = self.store.request_cancel(job_id)
+        if status == 'cancelled':
+            self.discard(job_id)
+        return status
+
+    def delete(self, job_id: str):
+        self.store.delete(job_id)
+        self.discard(job_id)
+
+    def purge(self):
+        self._last_purge = time.monotonic()
+        if self.retention_seconds <= 0:
+            return
+        for job_id in self.store.expired(self.retention_seconds):
+            self.delete(job_id)
+
+    async def _purge_if_due(self):
+        """Purge berkala selama server berjalan (paling sering sekali per purge_interval)"""
+        if self.retention_seconds <= 0 or time.monotonic() - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = time.monotonic()  # slot lain tidak ikut purge bersamaan
+        try:
+            await run_in_threadpool(self.purge)
+        except Exception as e:
+            print(f"[!] Job purge failed: {e}")
+
+    async def _next_job(self) -> Dict:
+        while True:
+            await self._purge_if_due()
+            if self.ready():
+                job = await run_in_threadpool(self.store.claim_next, list(self.handlers))
+                if job is not None:
+                    return job
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self):
+        while True:
+            job = await self._next_job()
+            job_id = job['id']
+            self.running[job_id] = job['kind']
+            ctx = JobContext(self.store, job, self.input_dir(job_id))
+            start = time.perf_counter()
+            print(f"[*] Job {job_id} ({job['kind']}) started")
+            try:
+                summary = await self.handlers[job['kind']](ctx)
+                status = 'cancelled' if await ctx.cancelled() else 'done'
+                await run_in_threadpool(self.store.finish, job_id, status, summary)
+                print(f"[+] Job {job_id} {status} in {time.perf_counter() - start:.1f}s")
+            except asyncio.CancelledError:
+                # Shutdown: status tetap running, dilanjutkan setelah restart
+                raise
+            except Exception as e:
+                print(f"[!] Job {job_id} failed: {e}")
+                await run_in_threadpool(self.store.finish, job_id, 'failed', None, str(e))
+            finally:
+                self.running.pop(job_id, None)
+            if await run_in_threadpool(self.store.status, job_id) in FINISHED:
+                self.discard(job_id)
+
+    def stats(self) -> Dict:
+        return {
+            'slots': self.slots,
+            'running': dict(self.running),
+            'jobs': self.store.counts()
+        }
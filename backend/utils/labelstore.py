@@ -0,0 +1,353 @@
+"""
+Label Store for Railway Track Inspection
+Semua label YOLO (ribuan file .txt kecil) dikemas dalam satu file kolom yang bisa di-memory-map
+
+Format file (little endian):
+    b'RLBLSTR1' | uint64 panjang header | header JSON | padding 64 byte | kolom array
+
+Usage (dari folder backend):
+    python -m utils.labelstore --data ../datasets/data.yaml --root ../datasets
+    python -m utils.labelstore --split train --with-class track_crack
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.datasets import IMAGE_EXTENSIONS, SPLITS, label_path_for, load_data_config
+
+MAGIC = b'RLBLSTR1'
+ALIGN = 64
+STORE_NAME = 'labels.store'
+
+# Kolom per gambar: image_offsets[i]:image_offsets[i + 1] = baris box gambar i
+# Kolom per box (urut image id): box_image, box_class, box_xywh (normalized)
+# Index kelas: class_order[class_offsets[c]:class_offsets[c + 1]] = baris box kelas c
+
+
+def _read_label_file(path: str) -> List[List[float]]:
+    """Parse label YOLO; kolom setelah 5 pertama (segmen polygon) diabaikan"""
+    rows = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                values = line.split()
+                if len(values) >= 5:
+                    rows.append([float(v) for v in values[:5]])
+    except FileNotFoundError:
+        pass
+    return rows
+
+
+def _split_entries(images_dir: str) -> List[Tuple[str, str]]:
+    """
+    Pasangan (path gambar, path label) satu split
+
+    Jika folder gambar kosong / tidak ada (mis. hanya label yang di-commit),
+    entry dibuat dari file label dengan path gambar tebakan .jpg.
+    """
+    images = []
+    if os.path.isdir(images_dir):
+        images = sorted(entry.path for entry in os.scandir(images_dir)
+                        if entry.name.lower().endswith(IMAGE_EXTENSIONS))
+    if images:
+        return [(p, label_path_for(p)) for p in images]
+    labels_dir = Path(images_dir).parent / 'labels'
+    if not labels_dir.is_dir():
+        return []
+    labels = sorted(entry.path for entry in os.scandir(labels_dir) if entry.name.endswith('.txt'))
+    return [(str(Path(images_dir) / (Path(p).stem + '.jpg')), p) for p in labels]
+
+
+def _fingerprint(images_dir: str) -> List:
+    """
+    mtime folder gambar & label + digest (nama, mtime, ukuran) semua file label
+
+    mtime folder berubah saat file ditambah / dihapus; label yang diedit di
+    tempat hanya mengubah mtime / ukuran file-nya sendiri.
+    """
+    stamps = []
+    for folder in (Path(images_dir), Path(images_dir).parent / 'labels'):
+        stamps.append(folder.stat().st_mtime_ns if folder.is_dir() else 0)
+    digest = hashlib.blake2b(digest_size=16)
+    labels_dir = Path(images_dir).parent / 'labels'
+    if labels_dir.is_dir():
+        for entry in sorted(os.scandir(labels_dir), key=lambda e: e.name):
+            if entry.name.endswith('.txt'):
+                stat = entry.stat()
+                digest.update(f'{entry.name}\0{stat.st_mtime_ns}\0{stat.st_size}\n'.encode('utf-8'))
+    stamps.append(digest.hexdigest())
+    return stamps
+
+
+def build_label_store(config: Dict, path: str, splits: Sequence[str] = SPLITS) -> str:
+    """
+    Baca semua label split lalu tulis satu file store (atomic: tmp lalu rename)
+
+    Args:
+        config: Hasil load_data_config
+        path: Path file store
+        splits: Split yang dikemas
+
+    Returns:
+        Path file store
+    """
+    class_names = list(config['names'])
+    image_paths, image_split, counts, rows = [], [], [], []
+    split_ranges, fingerprints = {}, {}
+    for split_id, split in enumerate(splits):
+        images_dir = config['paths'].get(split)
+        if not images_dir:
+            continue
+        start = len(image_paths)
+        for image_path, label_path in _split_entries(images_dir):
+            labels = _read_label_file(label_path)
+            image_paths.append(image_path)
+            image_split.append(split_id)
+            counts.append(len(labels))
+            rows.extend(labels)
+        split_ranges[split] = [start, len(image_paths)]
+        fingerprints[split] = _fingerprint(images_dir)
+
+    boxes = np.array(rows, dtype=np.float32).reshape(-1, 5)
+    box_class = boxes[:, 0].astype(np.int16)
+    class_order = np.argsort(box_class, kind='stable').astype(np.int32)
+    encoded = [p.encode('utf-8') for p in image_paths]
+
+    columns = {
+        'image_offsets': np.concatenate(([0], np.cumsum(counts, dtype=np.int64))).astype(np.int64),
+        'image_split': np.array(image_split, dtype=np.uint8),
+        'path_offsets': np.concatenate(([0], np.cumsum([len(p) for p in encoded], dtype=np.int64))).astype(np.int64),
+        'path_bytes': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'box_image': np.repeat(np.arange(len(counts), dtype=np.int32), counts),
+        'box_class': box_class,
+        'box_xywh': np.ascontiguousarray(boxes[:, 1:]),
+        'class_order': class_order,
+        'class_offsets': np.searchsorted(box_class[class_order], np.arange(len(class_names) + 1)).astype(np.int64)
+    }
+
+    layout, offset = {}, 0
+    for name, array in columns.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = json.dumps({
+        'names': class_names,
+        'splits': list(splits),
+        'split_ranges': split_ranges,
+        'fingerprints': fingerprints,
+        'paths': config['paths'],
+        'columns': layout
+    }).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    temp = f'{path}.tmp'
+    with open(temp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for name, array in columns.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(temp, path)
+    return path
+
+
+class LabelStore:
+    """
+    Akses read-only ke file store lewat np.memmap (tanpa parse ulang label)
+
+    Semua query statistik berupa operasi numpy pada kolom; box satu split
+    adalah rentang kontigu karena baris box urut per gambar.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Bukan file label store: {path}")
+            header_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            self.header = json.loads(f.read(header_len))
+        data_start = -(-(len(MAGIC) + 8 + header_len) // ALIGN) * ALIGN
+
+        self.names: List[str] = self.header['names']
+        self.nc = len(self.names)
+        self.split_ranges: Dict[str, List[int]] = self.header['split_ranges']
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, spec in self.header['columns'].items():
+            shape = tuple(spec['shape'])
+            if not np.prod(shape):
+                self.columns[name] = np.zeros(shape, dtype=spec['dtype'])
+                continue
+            self.columns[name] = np.memmap(path, dtype=spec['dtype'], mode='r',
+                                           offset=data_start + spec['offset'], shape=shape)
+        self.image_offsets = self.columns['image_offsets']
+        self.box_image = self.columns['box_image']
+        self.box_class = self.columns['box_class']
+        self.box_xywh = self.columns['box_xywh']
+
+    def __len__(self) -> int:
+        return len(self.image_offsets) - 1
+
+    @property
+    def num_boxes(self) -> int:
+        return len(self.box_class)
+
+    def is_stale(self, config: Dict) -> bool:
+        """True jika folder split / file label berubah atau berbeda sejak store dibuat"""
+        if self.header['paths'] != config['paths']:
+            return True
+        return any(_fingerprint(config['paths'][split]) != stamps
+                   for split, stamps in self.header['fingerprints'].items())
+
+    def class_id(self, name) -> int:
+        if isinstance(name, (int, np.integer)):
+            return int(name)
+        if name not in self.names:
+            raise ValueError(f"Kelas tidak dikenal: {name} (pilihan: {', '.join(self.names)})")
+        return self.names.index(name)
+
+    def image_range(self, split: Optional[str] = None) -> Tuple[int, int]:
+        if split is None:
+            return 0, len(self)
+        if split not in self.split_ranges:
+            raise ValueError(f"Split '{split}' tidak ada di label store")
+        return tuple(self.split_ranges[split])
+
+    def box_range(self, split: Optional[str] = None) -> Tuple[int, int]:
+        start, end = self.image_range(split)
+        return int(self.image_offsets[start]), int(self.image_offsets[end])
+
+    def image_path(self, index: int) -> str:
+        offsets = self.columns['path_offsets']
+        return bytes(self.columns['path_bytes'][offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def image_paths(self, split: Optional[str] = None, limit: int = 0) -> List[str]:
+        start, end = self.image_range(split)
+        if limit:
+            end = min(end, start + limit)
+        return [self.image_path(i) for i in range(start, end)]
+
+    def labels(self, index: int) -> np.ndarray:
+        """Label satu gambar, array float32 (n, 5): class, x_center, y_center, width, height"""
+        start, end = self.image_offsets[index], self.image_offsets[index + 1]
+        out = np.empty((end - start, 5), dtype=np.float32)
+        out[:, 0] = self.box_class[start:end]
+        out[:, 1:] = self.box_xywh[start:end]
+        return out
+
+    def samples(self, split: str, limit: int = 0) -> List[Tuple[str, np.ndarray]]:
+        """Pasangan (path gambar, label) untuk utils.evaluate"""
+        start, end = self.image_range(split)
+        if limit:
+            end = min(end, start + limit)
+        return [(self.image_path(i), self.labels(i)) for i in range(start, end)]
+
+    def class_histogram(self, split: Optional[str] = None) -> Dict[str, int]:
+        """Jumlah box per kelas"""
+        start, end = self.box_range(split)
+        counts = np.bincount(self.box_class[start:end], minlength=self.nc)[:self.nc]
+        return dict(zip(self.names, counts.tolist()))
+
+    def image_histogram(self, split: Optional[str] = None) -> Dict[str, int]:
+        """Jumlah gambar yang memuat tiap kelas"""
+        start, end = self.box_range(split)
+        pairs = np.unique(self.box_image[start:end].astype(np.int64) * self.nc + self.box_class[start:end])
+        counts = np.bincount(pairs % self.nc, minlength=self.nc)[:self.nc]
+        return dict(zip(self.names, counts.tolist()))
+
+    def box_sizes(self, split: Optional[str] = None, class_name=None) -> np.ndarray:
+        """Lebar & tinggi (normalized) box, array (n, 2)"""
+        start, end = self.box_range(split)
+        wh = self.box_xywh[start:end, 2:]
+        if class_name is None:
+            return wh
+        return wh[self.box_class[start:end] == self.class_id(class_name)]
+
+    def size_distribution(self, split: Optional[str] = None,
+                          percentiles: Sequence[float] = (5, 25, 50, 75, 95)) -> Dict[str, Dict]:
+        """Persentil sqrt(w * h) (sisi box relatif terhadap gambar) per kelas"""
+        start, end = self.box_range(split)
+        side = np.sqrt(self.box_xywh[start:end, 2] * self.box_xywh[start:end, 3])
+        classes = self.box_class[start:end]
+        result = {}
+        for c, name in enumerate(self.names):
+            values = side[classes == c]
+            result[name] = {f'p{int(p)}': round(float(v), 4)
+                            for p, v in zip(percentiles, np.percentile(values, percentiles))} if len(values) else {}
+        return result
+
+    def images_with_class(self, class_name, split: Optional[str] = None) -> np.ndarray:
+        """Id gambar (urut) yang memuat minimal satu box kelas tertentu, lewat index kelas"""
+        c = self.class_id(class_name)
+        offsets = self.columns['class_offsets']
+        rows = self.columns['class_order'][offsets[c]:offsets[c + 1]]
+        images = np.unique(self.box_image[rows])
+        if split is not None:
+            start, end = self.image_range(split)
+            images = images[(images >= start) & (images < end)]
+        return images
+
+
+def load_label_store(config: Dict, path: Optional[str] = None, rebuild: bool = False) -> LabelStore:
+    """
+    Buka label store dataset, build ulang jika belum ada / sudah basi
+
+    Args:
+        config: Hasil load_data_config
+        path: Path file store (default: <root dataset>/labels.store)
+        rebuild: Paksa build ulang
+    """
+    path = path or os.path.join(config['root'], STORE_NAME)
+    if not rebuild and os.path.isfile(path):
+        store = LabelStore(path)
+        if not store.is_stale(config):
+            return store
+    print(f"[*] Building label store: {path}")
+    return LabelStore(build_label_store(config, path))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build / query label store dataset')
+    parser.add_argument('--data', default='../datasets/data.yaml', help='Path data.yaml')
+    parser.add_argument('--root', default=None, help='Override root dataset (default: folder data.yaml)')
+    parser.add_argument('--store', default=None, help='Path file store (default: <root>/labels.store)')
+    parser.add_argument('--rebuild', action='store_true')
+    parser.add_argument('--split', default=None, help='Batasi query ke satu split')
+    parser.add_argument('--with-class', default=None, help='List gambar yang memuat kelas ini')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = load_data_config(args.data, args.root)
+    store = load_label_store(config, args.store, rebuild=args.rebuild)
+
+    if args.with_class:
+        images = store.images_with_class(args.with_class, args.split)
+        for index in images:
+            print(store.image_path(int(index)))
+        print(f"[+] {len(images)} images with '{args.with_class}'")
+        return
+
+    start, end = store.image_range(args.split)
+    box_start, box_end = store.box_range(args.split)
+    print(json.dumps({
+        'store': store.path,
+        'images': end - start,
+        'boxes': box_end - box_start,
+        'splits': {split: r[1] - r[0] for split, r in store.split_ranges.items()},
+        'class_histogram': store.class_histogram(args.split),
+        'images_per_class': store.image_histogram(args.split),
+        'box_size': store.size_distribution(args.split)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Model Loader for Railway Track Inspection
+Load YOLOv5 weights sepenuhnya dari file lokal (tanpa torch.hub / network)
+"""
+
+import os
+
+import torch
+
+
+def load_checkpoint(weights: str, device: str = 'cpu'):
+    """
+    Load checkpoint YOLOv5 (.pt) lokal menjadi model torch (fused, eval mode)
+
+    Berbeda dengan torch.hub.load / yolov5.load, fungsi ini tidak pernah
+    menghubungi GitHub atau HuggingFace Hub: file yang tidak ada langsung error.
+
+    Args:
+        weights: Path ke file best.pt
+        device: Device torch ('cpu', 'cuda', 'cuda:0', ...)
+
+    Returns:
+        DetectionModel YOLOv5 (output Detect dalam mode export)
+    """
+    if not os.path.isfile(weights):
+        raise FileNotFoundError(f"Model weights tidak ditemukan: {weights}")
+
+    # Import yolov5.models.yolo juga mendaftarkan root package yolov5 ke sys.path,
+    # dibutuhkan untuk unpickle checkpoint hasil training (models.yolo.Model)
+    from yolov5.models.yolo import Detect
+
+    ckpt = torch.load(weights, map_location='cpu')
+    net = (ckpt.get('ema') or ckpt['model']).float()
+    net = net.fuse().eval() if hasattr(net, 'fuse') else net.eval()
+
+    # Kompatibilitas checkpoint lama (sama seperti yolov5 attempt_load)
+    if not hasattr(net, 'stride'):
+        net.stride = torch.tensor([32.])
+    if isinstance(getattr(net, 'names', None), (list, tuple)):
+        net.names = dict(enumerate(net.names))
+    for m in net.modules():
+        if isinstance(m, Detect):
+            if not isinstance(m.anchor_grid, list):
+                delattr(m, 'anchor_grid')
+                setattr(m, 'anchor_grid', [torch.zeros(1)] * m.nl)
+            m.inplace = False  # aman untuk inferensi multi-thread
+            m.export = True    # output hanya tensor prediksi
+        elif isinstance(m, torch.nn.Upsample) and not hasattr(m, 'recompute_scale_factor'):
+            m.recompute_scale_factor = None
+
+    return net.to(torch.device(device))
@@ -0,0 +1,203 @@
+"""
+Packed Response Format for Railway Track Inspection
+Encode hasil deteksi menjadi layout biner ringkas (Accept: application/x-railway-detections)
+
+Layout (little endian, array selalu mulai di offset kelipatan 4):
+    'RDET' | uint16 version | uint16 n_images | uint32 panjang meta | meta JSON (padding 4)
+    uint32 n_det[n_images] | uint32 width[n_images] | uint32 height[n_images]
+    float32 bbox[N * 4] | float32 confidence[N] | uint8 class_id[N] | uint8 status[n_images]
+
+Meta JSON dikirim sekali per response: tabel kelas, severity per kelas,
+warna per severity, tabel inspection_status, dan (batch) filename / error
+per gambar. Nama kelas, severity, warna dan class_counts per deteksi tidak
+diulang; client (frontend/app.js decodePackedDetections) menyusun ulang
+struktur JSON yang sama dengan response /detect & /detect-batch.
+"""
+
+import json
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+PACKED_MEDIA_TYPE = 'application/x-railway-detections'
+MAGIC = b'RDET'
+VERSION = 1
+NO_STATUS = 255  # gambar error / tanpa hasil
+
+
+def accepts_media(accept: Optional[str], media_type: str) -> bool:
+    """True jika header Accept menyebut media_type secara eksplisit dengan q > 0"""
+    if not accept:
+        return False
+    for part in accept.split(','):
+        media, *params = [p.strip() for p in part.split(';')]
+        if media.lower() != media_type:
+            continue
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def wants_packed(accept: Optional[str]) -> bool:
+    """True jika header Accept meminta format packed (JSON tetap default)"""
+    return accepts_media(accept, PACKED_MEDIA_TYPE)
+
+
+def _pad4(data: bytes) -> bytes:
+    return data + b' ' * (-len(data) % 4)
+
+
+class PackedEncoder:
+    """Encoder dengan tabel kelas / severity / warna yang disiapkan sekali"""
+
+    def __init__(self, class_names: Sequence[str], class_severity: Dict[str, str],
+                 severity_colors: Dict[str, str]):
+        self.class_names = list(class_names)
+        self.severities = list(severity_colors)
+        self.table = {
+            'classes': self.class_names,
+            'severities': self.severities,
+            'colors': [severity_colors[s] for s in self.severities],
+            'class_severity': [self.severities.index(class_severity[name]) for name in self.class_names]
+        }
+
+    def encode(self, results: Sequence[Optional[Dict]], images: Optional[List[Dict]] = None) -> bytes:
+        """
+        Encode response deteksi (struktur build_detection_response)
+
+        Args:
+            results: Response per gambar (None untuk gambar yang error)
+            images: Metadata batch per gambar ({'filename', 'error'}); None = response /detect
+
+        Returns:
+            Bytes format packed
+        """
+        statuses, status_index = [], {}
+        status_ids = np.full(len(results), NO_STATUS, dtype=np.uint8)
+        counts = np.zeros(len(results), dtype=np.uint32)
+        sizes = np.zeros((2, len(results)), dtype=np.uint32)
+        boxes, confidences, class_ids = [], [], []
+
+        for i, result in enumerate(results):
+            if result is None:
+                continue
+            status = result['inspection_status']
+            key = status['status']
+            if key not in status_index:
+                status_index[key] = len(statuses)
+                statuses.append(status)
+            status_ids[i] = status_index[key]
+            sizes[0, i] = result['image_size']['width']
+            sizes[1, i] = result['image_size']['height']
+            detections = result['detections']
+            counts[i] = len(detections)
+            for det in detections:
+                boxes.append(det['bbox'])
+                confidences.append(det['confidence'])
+                class_ids.append(det['class_id'])
+
+        meta = dict(self.table, statuses=statuses, batch=images is not None)
+        if images is not None:
+            meta['images'] = images
+        meta_bytes = _pad4(json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+        header = MAGIC + np.array([VERSION, len(results)], dtype='<u2').tobytes() + \
+            np.array([len(meta_bytes)], dtype='<u4').tobytes()
+        return b''.join([
+            header,
+            meta_bytes,
+            counts.astype('<u4').tobytes(),
+            sizes.astype('<u4').tobytes(),
+            np.asarray(boxes, dtype='<f4').reshape(-1, 4).tobytes(),
+            np.asarray(confidences, dtype='<f4').tobytes(),
+            np.asarray(class_ids, dtype=np.uint8).tobytes(),
+            status_ids.tobytes()
+        ])
+
+    def encode_single(self, result: Dict) -> bytes:
+        return self.encode([result])
+
+    def encode_batch(self, entries: List[Dict]) -> bytes:
+        """Encode isi 'results' /detect-batch: [{'filename', 'result' | 'error'}, ...]"""
+        images = [{'filename': e.get('filename'), 'error': e.get('error')} for e in entries]
+        return self.encode([e.get('result') for e in entries], images)
+
+
+def decode_packed(data: bytes) -> Dict:
+    """Decode format packed kembali ke struktur JSON (pembanding / client Python)"""
+    if data[:4] != MAGIC:
+        raise ValueError("Bukan response packed")
+    version, n_images = np.frombuffer(data, dtype='<u2', count=2, offset=4)
+    if version != VERSION:
+        raise ValueError(f"Versi packed tidak didukung: {version}")
+    meta_len = int(np.frombuffer(data, dtype='<u4', count=1, offset=8)[0])
+    meta = json.loads(data[12:12 + meta_len])
+    offset = 12 + meta_len
+
+    def take(dtype, count):
+        nonlocal offset
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes
+        return array
+
+    counts = take('<u4', n_images)
+    widths, heights = take('<u4', n_images), take('<u4', n_images)
+    total = int(counts.sum())
+    boxes = take('<f4', total * 4).reshape(-1, 4)
+    confidences = take('<f4', total)
+    class_ids = take(np.uint8, total)
+    statuses = take(np.uint8, n_images)
+
+    classes, severities, colors = meta['classes'], meta['severities'], meta['colors']
+    results, start = [], 0
+    for i in range(n_images):
+        end = start + int(counts[i])
+        if statuses[i] == NO_STATUS:
+            results.append(None)
+            start = end
+            continue
+        detections = []
+        class_counts = dict.fromkeys(classes, 0)
+        severity_counts = dict.fromkeys(severities, 0)
+        for box, conf, cid in zip(boxes[start:end].tolist(), confidences[start:end].tolist(),
+                                  class_ids[start:end].tolist()):
+            severity = severities[meta['class_severity'][cid]]
+            class_counts[classes[cid]] += 1
+            severity_counts[severity] += 1
+            detections.append({'class': classes[cid], 'class_id': cid, 'confidence': round(conf, 3),
+                               'bbox': box, 'severity': severity, 'color': colors[severities.index(severity)]})
+        n = len(detections)
+        high = severity_counts.get('HIGH', 0)
+        results.append({
+            'success': True,
+            'total_detections': n,
+            'detections': detections,
+            'class_counts': class_counts,
+            'statistics': {
+                'high_risk': high,
+                'medium_risk': severity_counts.get('MEDIUM', 0),
+                'low_risk': severity_counts.get('LOW', 0),
+                'critical_percentage': round(high / n * 100, 1) if n else 0
+            },
+            'inspection_status': meta['statuses'][statuses[i]],
+            'image_size': {'width': int(widths[i]), 'height': int(heights[i])}
+        })
+        start = end
+
+    if not meta.get('batch'):
+        return results[0]
+    entries = []
+    for image, result in zip(meta['images'], results):
+        entry = {'filename': image['filename']}
+        if result is not None:
+            entry['result'] = result
+        elif image.get('error') is not None:
+            entry['error'] = image['error']
+        entries.append(entry)
+    return {'results': entries}
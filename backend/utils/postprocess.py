@@ -0,0 +1,112 @@
+"""
+Detection Post-processing for Railway Track Inspection
+Ubah array prediksi (x1, y1, x2, y2, conf, cls) menjadi JSON deteksi + statistik secara vectorized
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+SEVERITIES = ('HIGH', 'MEDIUM', 'LOW')
+SEVERITY_COLORS = {'HIGH': '#ef4444', 'MEDIUM': '#f59e0b', 'LOW': '#10b981'}
+
+
+class DetectionPostprocessor:
+    """
+    Post-processing deteksi berbasis lookup table
+
+    Severity dan warna per class id disiapkan sekali sebagai array. Untuk
+    satu batch, semua prediksi digabung menjadi satu array sehingga filter
+    kelas, lookup severity serta hitungan per kelas / severity per gambar
+    (bincount) dikerjakan dalam satu pass; JSON dibangun langsung dari
+    kolom-kolom array via tolist().
+    """
+
+    def __init__(self, class_names: Sequence[str], high_risk: Sequence[str],
+                 medium_risk: Sequence[str], colors: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            class_names: Nama kelas sesuai class id
+            high_risk: Kelas dengan severity HIGH
+            medium_risk: Kelas dengan severity MEDIUM (lainnya LOW)
+            colors: Warna per severity (None = tanpa field 'color')
+        """
+        self.class_names = list(class_names)
+        self.nc = len(self.class_names)
+        self.names = np.array(self.class_names, dtype=object)
+        self.severity_lut = np.array([
+            0 if name in high_risk else 1 if name in medium_risk else 2
+            for name in self.class_names
+        ], dtype=np.int64)
+        # (nc, 3): class counts @ onehot = severity counts
+        self.severity_onehot = np.eye(len(SEVERITIES), dtype=np.int64)[self.severity_lut]
+        self.severities = np.array(SEVERITIES, dtype=object)
+        self.colors = None
+        if colors:
+            self.colors = np.array([colors[s] for s in SEVERITIES], dtype=object)
+
+    def severity_of(self, class_id: int) -> str:
+        return SEVERITIES[self.severity_lut[class_id]]
+
+    def parse_batch(self, predictions: Sequence[np.ndarray]) -> List[Dict]:
+        """
+        Parse prediksi banyak gambar sekaligus
+
+        Args:
+            predictions: Array (n, 6) x1, y1, x2, y2, conf, cls per gambar
+
+        Returns:
+            Per gambar: 'detections' (list dict), 'total', 'class_counts',
+            'severity_counts'
+        """
+        n_images = len(predictions)
+        if not n_images:
+            return []
+        arrays = [np.asarray(p, dtype=np.float32).reshape(-1, 6) if len(p) else np.zeros((0, 6), np.float32)
+                  for p in predictions]
+        pred = np.concatenate(arrays)
+        image_idx = np.repeat(np.arange(n_images), [len(a) for a in arrays])
+
+        cls = pred[:, 5].astype(np.int64)
+        valid = (cls >= 0) & (cls < self.nc)
+        if not valid.all():
+            pred, cls, image_idx = pred[valid], cls[valid], image_idx[valid]
+        severity = self.severity_lut[cls]
+
+        class_counts = np.bincount(image_idx * self.nc + cls,
+                                   minlength=n_images * self.nc).reshape(n_images, self.nc)
+        severity_counts = class_counts @ self.severity_onehot
+        bounds = np.concatenate(([0], np.cumsum(class_counts.sum(1)))).tolist()
+
+        columns = [
+            self.names[cls].tolist(),
+            cls.tolist(),
+            np.round(pred[:, 4].astype(np.float64), 3).tolist(),
+            pred[:, :4].tolist(),
+            self.severities[severity].tolist()
+        ]
+        if self.colors is not None:
+            columns.append(self.colors[severity].tolist())
+            detections = [
+                {'class': name, 'class_id': cid, 'confidence': conf, 'bbox': box,
+                 'severity': sev, 'color': color}
+                for name, cid, conf, box, sev, color in zip(*columns)
+            ]
+        else:
+            detections = [
+                {'class': name, 'class_id': cid, 'confidence': conf, 'bbox': box, 'severity': sev}
+                for name, cid, conf, box, sev in zip(*columns)
+            ]
+
+        class_counts = class_counts.tolist()
+        severity_counts = severity_counts.tolist()
+        return [{
+            'detections': detections[bounds[i]:bounds[i + 1]],
+            'total': bounds[i + 1] - bounds[i],
+            'class_counts': dict(zip(self.class_names, class_counts[i])),
+            'severity_counts': dict(zip(SEVERITIES, severity_counts[i]))
+        } for i in range(n_images)]
+
+    def parse(self, prediction: np.ndarray) -> Dict:
+        """Parse prediksi satu gambar (lihat parse_batch)"""
+        return self.parse_batch([prediction])[0]
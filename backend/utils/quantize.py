@@ -0,0 +1,246 @@
+"""
+INT8 Quantization for Railway Track Inspection
+Buat model ONNX INT8 (static / dynamic) dan laporan akurasi vs latency terhadap FP32
+
+Usage (dari folder backend):
+    python -m utils.quantize --weights models/best.pt --data ../datasets/data.yaml --root ../datasets
+    INFERENCE_BACKEND=onnx MODEL_QUANTIZED=1 uvicorn main:app
+"""
+
+import argparse
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from utils.backends import create_backend, resolve_weights
+from utils.datasets import load_data_config
+from utils.evaluate import evaluate
+from utils.labelstore import load_label_store
+
+# Kelas yang paling kritis untuk keputusan deploy (severity HIGH)
+CRITICAL_CLASSES = ['track_crack', 'fishplate_boltmissing', 'track_boltmissing']
+
+
+def _letterbox_input(image_path: str, imgsz: int) -> np.ndarray:
+    from yolov5.utils.augmentations import letterbox
+
+    image = cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2RGB)
+    x = letterbox(image, (imgsz, imgsz), auto=False)[0]
+    return np.ascontiguousarray(x.transpose((2, 0, 1))[None], dtype=np.float32) / 255
+
+
+def _make_calibration_reader(image_paths: List[str], input_name: str, imgsz: int):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class YoloCalibrationReader(CalibrationDataReader):
+        """Umpan gambar kalibrasi (letterbox imgsz x imgsz) satu per satu"""
+
+        def __init__(self):
+            self.paths = iter(image_paths)
+
+        def get_next(self):
+            for path in self.paths:
+                if cv2.haveImageReader(path):
+                    return {input_name: _letterbox_input(path, imgsz)}
+            return None
+
+    return YoloCalibrationReader()
+
+
+def _detect_head_nodes(onnx_path: str) -> List[str]:
+    """Node non-Conv di layer Detect terakhir (decode grid/anchor) yang sensitif terhadap INT8"""
+    import onnx
+
+    graph = onnx.load(onnx_path).graph
+    index = [int(m.group(1)) for m in (re.match(r'^/model\.(\d+)/', n.name) for n in graph.node) if m]
+    if not index:
+        return []
+    prefix = f'/model.{max(index)}/'
+    return [n.name for n in graph.node if n.name.startswith(prefix) and n.op_type != 'Conv']
+
+
+def quantize_model(fp32_path: str, int8_path: str, mode: str = 'static',
+                   calibration_images: List[str] = None, imgsz: int = 640,
+                   per_channel: bool = True) -> str:
+    """
+    Quantize model ONNX FP32 menjadi INT8 dengan ONNX Runtime
+
+    Args:
+        fp32_path: Model ONNX FP32 (hasil utils.export)
+        int8_path: Path output model INT8
+        mode: 'static' (kalibrasi aktivasi, QDQ) atau 'dynamic' (weight-only + aktivasi runtime)
+        calibration_images: Path gambar kalibrasi (wajib untuk static)
+        imgsz: Ukuran input kalibrasi
+        per_channel: Quantize weight per channel (lebih akurat untuk Conv)
+    """
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    source = fp32_path
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+
+        source = str(Path(int8_path).with_suffix('.prep.onnx'))
+        quant_pre_process(fp32_path, source)
+    except Exception as e:
+        print(f"[!] quant_pre_process dilewati: {e}")
+        source = fp32_path
+
+    exclude = _detect_head_nodes(source)
+    if mode == 'dynamic':
+        quantize_dynamic(source, int8_path, weight_type=QuantType.QUInt8,
+                         per_channel=per_channel, nodes_to_exclude=exclude)
+    else:
+        if not calibration_images:
+            raise ValueError("Static quantization butuh gambar kalibrasi")
+        import onnxruntime
+
+        input_name = onnxruntime.InferenceSession(
+            source, providers=['CPUExecutionProvider']).get_inputs()[0].name
+        reader = _make_calibration_reader(calibration_images, input_name, imgsz)
+        quantize_static(source, int8_path, reader, quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        per_channel=per_channel, nodes_to_exclude=exclude)
+
+    # Metadata stride / names ikut disalin supaya OnnxBackend bisa membacanya
+    import onnx
+
+    fp32 = onnx.load(fp32_path)
+    int8 = onnx.load(int8_path)
+    existing = {p.key for p in int8.metadata_props}
+    for prop in fp32.metadata_props:
+        if prop.key not in existing:
+            meta = int8.metadata_props.add()
+            meta.key, meta.value = prop.key, prop.value
+    onnx.save(int8, int8_path)
+
+    if source != fp32_path and os.path.exists(source):
+        os.remove(source)
+    print(f"[+] INT8 model ({mode}) saved: {int8_path}")
+    return int8_path
+
+
+def build_report(fp32: Dict, int8: Dict, fp32_path: str, int8_path: str, mode: str) -> Dict:
+    """Gabungkan hasil evaluasi FP32 & INT8 menjadi laporan per kelas"""
+    classes = {}
+    for name, base in fp32['per_class'].items():
+        quant = int8['per_class'][name]
+        delta = None
+        if base['ap50'] is not None and quant['ap50'] is not None:
+            delta = round(quant['ap50'] - base['ap50'], 4)
+        classes[name] = {
+            'labels': base['labels'],
+            'fp32_ap50': base['ap50'],
+            'int8_ap50': quant['ap50'],
+            'delta_ap50': delta,
+            'fp32_ap50_95': base['ap50_95'],
+            'int8_ap50_95': quant['ap50_95'],
+            'critical': name in CRITICAL_CLASSES
+        }
+
+    return {
+        'mode': mode,
+        'images': fp32['images'],
+        'models': {
+            'fp32': {'path': fp32_path, 'size_mb': round(os.path.getsize(fp32_path) / 1e6, 2)},
+            'int8': {'path': int8_path, 'size_mb': round(os.path.getsize(int8_path) / 1e6, 2)}
+        },
+        'map50': {'fp32': fp32['map50'], 'int8': int8['map50']},
+        'map50_95': {'fp32': fp32['map50_95'], 'int8': int8['map50_95']},
+        'latency_ms': {'fp32': fp32['latency_ms'], 'int8': int8['latency_ms']},
+        'speedup': round(fp32['latency_ms']['mean'] / max(int8['latency_ms']['mean'], 1e-9), 2),
+        'per_class': classes
+    }
+
+
+def format_report(report: Dict) -> str:
+    """Render laporan sebagai tabel markdown"""
+    fmt = lambda v: '-' if v is None else f"{v:.3f}"
+    lines = [
+        f"# INT8 Quantization Report ({report['mode']})",
+        '',
+        f"Images: {report['images']}",
+        '',
+        '| Model | Size (MB) | mAP@0.5 | mAP@0.5:0.95 | Latency mean (ms) | Latency p95 (ms) |',
+        '|-------|-----------|---------|--------------|-------------------|------------------|'
+    ]
+    for key in ('fp32', 'int8'):
+        lines.append(
+            f"| {key.upper()} | {report['models'][key]['size_mb']} | {fmt(report['map50'][key])} | "
+            f"{fmt(report['map50_95'][key])} | {report['latency_ms'][key]['mean']} | "
+            f"{report['latency_ms'][key]['p95']} |")
+    lines += [
+        '',
+        f"Speedup INT8 vs FP32: **{report['speedup']}x**",
+        '',
+        '| Class | Labels | FP32 AP@0.5 | INT8 AP@0.5 | Δ AP@0.5 |',
+        '|-------|--------|-------------|-------------|----------|'
+    ]
+    for name, row in report['per_class'].items():
+        label = f"**{name}** ⚠️" if row['critical'] else name
+        lines.append(f"| {label} | {row['labels']} | {fmt(row['fp32_ap50'])} | "
+                     f"{fmt(row['int8_ap50'])} | {fmt(row['delta_ap50'])} |")
+    return '\n'.join(lines) + '\n'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Buat model INT8 + laporan akurasi vs latency')
+    parser.add_argument('--weights', default='models/best.pt', help='Checkpoint .pt / model .onnx FP32')
+    parser.add_argument('--data', default='../datasets/data.yaml', help='Path data.yaml')
+    parser.add_argument('--root', default=None, help='Override root dataset (default: folder data.yaml)')
+    parser.add_argument('--mode', default='static', choices=['static', 'dynamic'])
+    parser.add_argument('--calib-split', default='train', help='Split untuk kalibrasi')
+    parser.add_argument('--calib-images', type=int, default=200, help='Jumlah gambar kalibrasi')
+    parser.add_argument('--eval-split', default='val', help='Split untuk laporan mAP')
+    parser.add_argument('--eval-images', type=int, default=0, help='Batasi jumlah gambar evaluasi (0 = semua)')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--no-per-channel', action='store_true')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = load_data_config(args.data, args.root)
+    class_names = list(config['names'])
+    store = load_label_store(config)
+
+    fp32_path = resolve_weights(args.weights, 'onnx')
+    if not os.path.isfile(fp32_path):
+        from utils.export import export_onnx
+        fp32_path = export_onnx(args.weights, imgsz=args.imgsz, dynamic=True)
+    int8_path = resolve_weights(args.weights, 'onnx', quantized=True)
+
+    calibration = []
+    if args.mode == 'static':
+        images = [p for p in store.image_paths(args.calib_split) if os.path.isfile(p)]
+        if not images:
+            raise SystemExit(f"Tidak ada gambar kalibrasi di {config['paths'][args.calib_split]}")
+        step = max(1, len(images) // args.calib_images)
+        calibration = images[::step][:args.calib_images]
+        print(f"[*] Calibrating with {len(calibration)} images from split '{args.calib_split}'")
+
+    quantize_model(fp32_path, int8_path, mode=args.mode, calibration_images=calibration,
+                   imgsz=args.imgsz, per_channel=not args.no_per_channel)
+
+    samples = store.samples(args.eval_split, limit=args.eval_images)
+    print(f"[*] Evaluating FP32 vs INT8 on {len(samples)} images from split '{args.eval_split}'")
+    results = {}
+    for key, quantized in (('fp32', False), ('int8', True)):
+        backend = create_backend('onnx', args.weights, quantized=quantized, imgsz=args.imgsz)
+        backend.warmup()
+        results[key] = evaluate(backend, samples, class_names, size=args.imgsz)
+
+    report = build_report(results['fp32'], results['int8'], fp32_path, int8_path, args.mode)
+    report_base = Path(int8_path).with_name('quantization_report')
+    report_base.with_suffix('.json').write_text(json.dumps(report, indent=2))
+    report_base.with_suffix('.md').write_text(format_report(report), encoding='utf-8')
+    print(format_report(report))
+    print(f"[+] Report saved: {report_base.with_suffix('.json')}, {report_base.with_suffix('.md')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""
+Model Registry for Railway Track Inspection
+Beberapa versi weights dimuat berdampingan; ganti versi aktif & canary tanpa restart
+
+Versi baru (nama -> file weights) di-load + warm-up di background sementara
+versi aktif tetap melayani traffic, lalu traffic dipindah dengan menukar
+pointer versi aktif di bawah lock. Request memegang versi yang dipilih saat
+routing (ModelRegistry.acquire) sampai selesai, jadi request in-flight tetap
+selesai di versi lama; versi yang di-unload baru di-stop setelah tidak
+dipakai lagi (drain). Versi dengan isi weights identik (hash sama) berbagi
+satu instance model, termasuk batch di scheduler.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.cache import file_digest
+
+VERSION_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$')
+
+
+class ModelVersion:
+    """Satu versi model: state load, instance model & jumlah request yang sedang memakainya"""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.state = 'loading'  # loading | ready | failed | draining
+        self.model: Any = None
+        self.key: Optional[str] = None  # backend + hash weights, bagian dari key result cache
+        self.shared_with: Optional[str] = None
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.loaded_at: Optional[float] = None
+        self.in_flight = 0
+        self.requests = 0
+        self._idle = threading.Condition()
+
+    def hold(self):
+        with self._idle:
+            self.in_flight += 1
+            self.requests += 1
+
+    def release(self):
+        with self._idle:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.notify_all()
+
+    @contextmanager
+    def use(self):
+        """
+        Tandai versi sedang dipakai selama blok berjalan (untuk drain saat unload)
+
+        Hanya aman di dalam ModelRegistry.acquire / hold: versi yang belum dipegang
+        bisa di-unload sebelum hitungan in-flight naik.
+        """
+        self.hold()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def wait_idle(self, timeout: float) -> bool:
+        with self._idle:
+            return self._idle.wait_for(lambda: self.in_flight == 0, timeout)
+
+    def describe(self) -> Dict:
+        return {
+            'name': self.name,
+            'path': self.path,
+            'state': self.state,
+            'key': self.key,
+            'shared_with': self.shared_with,
+            'error': self.error,
+            'load_seconds': round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            'loaded_at': self.loaded_at,
+            'in_flight': self.in_flight,
+            'requests': self.requests
+        }
+
+
+class Route:
+    """Versi model + threshold NMS yang dipakai satu request"""
+
+    __slots__ = ('version', 'conf', 'iou')
+
+    def __init__(self, version: ModelVersion, conf: float, iou: float):
+        self.version = version
+        self.conf = conf
+        self.iou = iou
+
+    @property
+    def params(self) -> tuple:
+        """Params scheduler: hanya request dengan model & threshold sama yang di-batch bersama"""
+        return (self.version.model, self.conf, self.iou)
+
+    @property
+    def cache_key(self) -> tuple:
+        return (self.version.key, self.conf, self.iou)
+
+
+class ModelRegistry:
+    """
+    Daftar versi model, versi aktif dan canary
+
+    Loader (blocking) membuat model siap pakai dari path (termasuk warm-up);
+    registry hanya mengatur state, routing dan siklus hidup versi.
+    """
+
+    def __init__(self, loader: Callable[[str], Any], backend: str = 'torch',
+                 resolve: Callable[[str], str] = lambda path: path, model_dir: str = 'models'):
+        """
+        Args:
+            loader: path weights -> model (backend / WorkerPool) yang sudah di-warm-up
+            backend: Nama backend, bagian dari key versi
+            resolve: path -> file weights yang benar-benar dimuat (mis. .onnx hasil export), untuk hash
+            model_dir: Folder yang boleh dipakai untuk load versi lewat API
+        """
+        self.loader = loader
+        self.backend = backend
+        self.resolve = resolve
+        self.model_dir = model_dir
+        self.versions: Dict[str, ModelVersion] = {}
+        self.active: Optional[str] = None
+        self.canary: Optional[str] = None
+        self.canary_percent = 0.0
+        self._lock = threading.Lock()
+
+    def resolve_path(self, path: str) -> str:
+        """Path relatif terhadap model_dir; path di luar model_dir ditolak"""
+        root = os.path.realpath(self.model_dir)
+        full = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, full]) != root:
+            raise ValueError(f"Path model harus di dalam {self.model_dir}: {path}")
+        return full
+
+    def register(self, name: str, path: str) -> ModelVersion:
+        """Daftarkan versi baru (state loading); nama yang sama hanya boleh dipakai ulang jika gagal"""
+        if not VERSION_NAME.match(name):
+            raise ValueError(f"Nama versi tidak valid: {name} (huruf, angka, . _ -)")
+        with self._lock:
+            existing = self.versions.get(name)
+            if existing is not None and existing.state != 'failed':
+                raise ValueError(f"Versi {name} sudah ada ({existing.state})")
+            version = ModelVersion(name, path)
+            self.versions[name] = version
+        return version
+
+    def load(self, version: ModelVersion, activate: bool = False) -> ModelVersion:
+        """
+        Load + warm-up versi (blocking, jalankan di thread)
+
+        Versi dengan hash weights sama dengan versi lain yang sudah ready
+        memakai instance model yang sama tanpa load ulang.
+        """
+        start = time.perf_counter()
+        try:
+            key = f"{self.backend}:{file_digest(self.resolve(version.path))}"
+            with self._lock:
+                twin = next((v for v in self.versions.values()
+                             if v is not version and v.key == key and v.state == 'ready'), None)
+            if twin is not None:
+                model, version.shared_with = twin.model, twin.name
+            else:
+                model = self.loader(version.path)
+            version.model, version.key = model, key
+            version.load_seconds = time.perf_counter() - start
+            version.loaded_at = time.time()
+            with self._lock:
+                version.state = 'ready'
+                if activate or self.active is None:
+                    self.active = version.name
+                    if self.canary == version.name:
+                        self.canary, self.canary_percent = None, 0.0
+        except Exception as e:
+            version.state = 'failed'
+            version.error = str(e)
+            raise
+        return version
+
+    def add(self, name: str, model: Any, key: str, activate: bool = True) -> ModelVersion:
+        """Daftarkan model yang sudah dimuat (mis. dari kode lain) sebagai versi ready"""
+        version = self.register(name, '')
+        version.model, version.key, version.state = model, key, 'ready'
+        version.loaded_at = time.time()
+        with self._lock:
+            if activate or self.active is None:
+                self.active = name
+        return version
+
+    def _ready(self, name: str) -> ModelVersion:
+        version = self.versions.get(name)
+        if version is None:
+            raise KeyError(f"Versi model tidak ditemukan: {name}")
+        if version.state != 'ready':
+            raise ValueError(f"Versi {name} belum siap ({version.state})")
+        return version
+
+    def activate(self, name: str) -> Optional[str]:
+        """Pindahkan traffic default ke versi `name` (atomic); return versi aktif sebelumnya"""
+        with self._lock:
+            self._ready(name)
+            previous, self.active = self.active, name
+            if self.canary == name:
+                self.canary, self.canary_percent = None, 0.0
+        return previous
+
+    def set_canary(self, name: Optional[str], percent: float):
+        """Arahkan `percent` % request tanpa versi eksplisit ke versi `name` (percent 0 = nonaktif)"""
+        with self._lock:
+            if name is None or percent <= 0:
+                self.canary, self.canary_percent = None, 0.0
+                return
+            self._ready(name)
+            if name == self.active:
+                raise ValueError(f"Versi {name} sudah aktif")
+            self.canary, self.canary_percent = name, min(100.0, float(percent))
+
+    def _route(self, name: Optional[str] = None) -> ModelVersion:
+        if name:
+            return self._ready(name)
+        if self.active is None:
+            raise ValueError("Belum ada versi model aktif")
+        if self.canary is not None and random.random() * 100 < self.canary_percent:
+            return self.versions[self.canary]
+        return self.versions[self.active]
+
+    def hold(self, name: Optional[str] = None) -> ModelVersion:
+        """
+        Pilih versi untuk satu request dan tandai sedang dipakai (lepas dengan release())
+
+        Versi eksplisit, canary (acak sesuai persentase), atau versi aktif.
+        Hitungan in-flight dinaikkan di bawah lock yang sama dengan unload,
+        jadi versi yang sudah terpilih tidak bisa di-stop sebelum dipakai.
+        """
+        with self._lock:
+            version = self._route(name)
+            version.hold()
+        return version
+
+    @contextmanager
+    def acquire(self, name: Optional[str] = None):
+        """hold() + release() otomatis di akhir blok"""
+        version = self.hold(name)
+        try:
+            yield version
+        finally:
+            version.release()
+
+    def unload(self, name: str, timeout: float = 60) -> bool:
+        """
+        Keluarkan versi dari routing, tunggu request yang memakainya selesai, lalu stop model
+
+        Returns:
+            True jika semua request selesai sebelum timeout
+        """
+        with self._lock:
+            version = self.versions.get(name)
+            if version is None:
+                raise KeyError(f"Versi model tidak ditemukan: {name}")
+            if name == self.active:
+                raise ValueError(f"Versi {name} sedang aktif, aktifkan versi lain terlebih dahulu")
+            if version.state == 'loading':
+                raise ValueError(f"Versi {name} masih loading")
+            if self.canary == name:
+                self.canary, self.canary_percent = None, 0.0
+            version.state = 'draining'
+
+        drained = version.wait_idle(timeout)
+        with self._lock:
+            self.versions.pop(name, None)
+            shared = any(v.model is version.model for v in self.versions.values())
+        if version.model is not None and not shared and hasattr(version.model, 'stop'):
+            version.model.stop()
+        version.model = None
+        return drained
+
+    def stop_all(self):
+        """Stop semua model (shutdown)"""
+        with self._lock:
+            models = {id(v.model): v.model for v in self.versions.values() if v.model is not None}
+        for model in models.values():
+            if hasattr(model, 'stop'):
+                model.stop()
+
+    def state(self):
+        """(state, error) untuk health check: ready jika ada versi aktif"""
+        with self._lock:
+            if self.active is not None:
+                return 'ready', None
+            versions = list(self.versions.values())
+        if any(v.state == 'loading' for v in versions) or not versions:
+            return 'loading', None
+        return 'failed', next((v.error for v in versions if v.error), None)
+
+    def active_version(self) -> Optional[ModelVersion]:
+        with self._lock:
+            return self.versions.get(self.active) if self.active is not None else None
+
+    def list(self) -> List[ModelVersion]:
+        with self._lock:
+            return list(self.versions.values())
+
+    def describe(self) -> Dict:
+        with self._lock:
+            versions = [v.describe() for v in self.versions.values()]
+            return {
+                'active': self.active,
+                'canary': {'version': self.canary, 'percent': self.canary_percent} if self.canary else None,
+                'versions': versions
+            }
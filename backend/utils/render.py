@@ -0,0 +1,200 @@
+"""
+Annotation Renderer for Railway Track Inspection
+Gambar box & label deteksi langsung di buffer gambar dengan sprite label pre-render
+
+Label kelas (7 kelas x 3 severity) dan teks confidence 0.00-1.00 (per
+severity) di-render sekali dengan cv2.putText saat init; per gambar label
+hanya di-copy (slice numpy) dan panel ringkasan di-cache per kombinasi
+jumlah. Garis box tetap cv2.rectangle (lebih cepat dari fancy-index numpy
+untuk jumlah box per gambar yang umum). Semua warna dalam urutan RGB (sama
+dengan array hasil decode_image).
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from utils.postprocess import SEVERITY_COLORS
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+WHITE = (255, 255, 255)
+
+
+def hex_to_rgb(color: str) -> Tuple[int, int, int]:
+    color = color.lstrip('#')
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def encode_jpeg(image: np.ndarray, quality: int = 80) -> bytes:
+    """Encode array RGB menjadi bytes JPEG"""
+    ok, data = cv2.imencode('.jpg', cv2.cvtColor(image, cv2.COLOR_RGB2BGR),
+                            [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("Gagal encode JPEG")
+    return data.tobytes()
+
+
+class AnnotationRenderer:
+    """Renderer box, label & panel ringkasan; aman dipakai beberapa thread"""
+
+    PANEL_ORIGIN = (10, 10)
+    PANEL_SIZE = (241, 91)  # (width, height), sama dengan panel annotate_image lama
+    PANEL_CACHE_SIZE = 256
+
+    def __init__(self, class_names: Sequence[str], class_severity: Dict[str, str],
+                 severity_colors: Dict[str, str] = SEVERITY_COLORS, line_width: int = 2,
+                 font_scale: float = 0.5, font_thickness: int = 1):
+        """
+        Args:
+            class_names: Nama kelas (urutan class id)
+            class_severity: Nama kelas -> severity ('HIGH' | 'MEDIUM' | 'LOW')
+            severity_colors: Severity -> warna hex
+            line_width: Tebal garis box (px)
+            font_scale: Skala font label
+            font_thickness: Tebal font label
+        """
+        self.class_names = list(class_names)
+        self.severities = list(severity_colors)
+        self.severity_index = {s: i for i, s in enumerate(self.severities)}
+        self.colors = np.array([hex_to_rgb(severity_colors[s]) for s in self.severities], dtype=np.uint8)
+        self._color_tuples = [tuple(int(v) for v in color) for color in self.colors]
+        self.class_severity = np.array([self.severity_index[class_severity[name]] for name in self.class_names])
+        self.line_width = max(1, line_width)
+        self.font_scale = font_scale
+        self.font_thickness = font_thickness
+
+        # Tinggi seragam untuk semua sprite supaya label kelas + confidence bisa disambung
+        (_, text_h), baseline = cv2.getTextSize('Ag', FONT, font_scale, font_thickness)
+        self.label_height = text_h + baseline + 6
+        self._baseline_y = 3 + text_h
+
+        # class_sprites[class][severity], conf_sprites[severity][0..100]
+        self.class_sprites = [[self._text_sprite(f'{name} ', color) for color in self.colors]
+                              for name in self.class_names]
+        self.conf_sprites = [[self._text_sprite(f'{i / 100:.2f}', color) for i in range(101)]
+                             for color in self.colors]
+
+        self._panels: 'OrderedDict[tuple, np.ndarray]' = OrderedDict()
+        self._panel_lock = threading.Lock()
+
+    def _text_sprite(self, text: str, background) -> np.ndarray:
+        (text_w, _), _ = cv2.getTextSize(text, FONT, self.font_scale, self.font_thickness)
+        sprite = np.empty((self.label_height, text_w + 4, 3), dtype=np.uint8)
+        sprite[:] = background
+        cv2.putText(sprite, text, (2, self._baseline_y), FONT, self.font_scale, WHITE,
+                    self.font_thickness, cv2.LINE_AA)
+        return sprite
+
+    # ------------------------------------------------------------------ boxes
+
+    def draw_boxes(self, image: np.ndarray, boxes: np.ndarray, severity_ids: np.ndarray):
+        """Gambar garis box (in-place); koordinat dibulatkan sekali untuk semua box"""
+        corners = np.round(boxes).astype(np.int64).tolist()
+        for (x1, y1, x2, y2), s in zip(corners, severity_ids.tolist()):
+            cv2.rectangle(image, (x1, y1), (x2, y2), self._color_tuples[s], self.line_width)
+
+    # ----------------------------------------------------------------- labels
+
+    @staticmethod
+    def _blit(image: np.ndarray, sprite: np.ndarray, x: int, y: int) -> int:
+        """Copy sprite ke image (dipotong di tepi gambar); return x setelah sprite"""
+        h, w = image.shape[:2]
+        sh, sw = sprite.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + sw, w), min(y + sh, h)
+        if x1 > x0 and y1 > y0:
+            image[y0:y1, x0:x1] = sprite[y0 - y:y1 - y, x0 - x:x1 - x]
+        return x + sw
+
+    def draw_labels(self, image: np.ndarray, boxes: np.ndarray, class_ids: np.ndarray,
+                    severity_ids: np.ndarray, confidences: Optional[np.ndarray] = None):
+        """Label di atas box (di dalam box jika terpotong tepi atas gambar)"""
+        if not len(boxes):
+            return
+        xs = np.round(boxes[:, 0]).astype(np.int64)
+        ys = np.round(boxes[:, 1]).astype(np.int64) - self.label_height
+        ys = np.where(ys < 0, ys + self.label_height, ys)
+        conf_ids = None if confidences is None else np.clip(np.round(confidences * 100), 0, 100).astype(np.int64)
+        for i, (x, y, c, s) in enumerate(zip(xs.tolist(), ys.tolist(), class_ids.tolist(), severity_ids.tolist())):
+            x = self._blit(image, self.class_sprites[c][s], x, y)
+            if conf_ids is not None:
+                self._blit(image, self.conf_sprites[s][conf_ids[i]], x, y)
+
+    # ------------------------------------------------------------------ panel
+
+    def _panel(self, total: int, counts: Tuple[int, ...]) -> np.ndarray:
+        key = (total, counts)
+        with self._panel_lock:
+            panel = self._panels.get(key)
+            if panel is not None:
+                self._panels.move_to_end(key)
+                return panel
+
+        width, height = self.PANEL_SIZE
+        panel = np.zeros((height, width, 3), dtype=np.uint8)
+        cv2.rectangle(panel, (0, 0), (width - 1, height - 1), WHITE, 2)
+        cv2.putText(panel, f"Total: {total}", (10, 25), FONT, 0.6, WHITE, 2)
+        for row, (severity, count) in enumerate(zip(self.severities, counts)):
+            cv2.putText(panel, f"{severity}: {count}", (10, 50 + row * 20), FONT, 0.5, self._color_tuples[row], 2)
+
+        with self._panel_lock:
+            self._panels[key] = panel
+            while len(self._panels) > self.PANEL_CACHE_SIZE:
+                self._panels.popitem(last=False)
+        return panel
+
+    def draw_panel(self, image: np.ndarray, severity_ids: np.ndarray):
+        counts = np.bincount(severity_ids, minlength=len(self.severities))[:len(self.severities)]
+        self._blit(image, self._panel(len(severity_ids), tuple(counts.tolist())), *self.PANEL_ORIGIN)
+
+    # ----------------------------------------------------------------- render
+
+    def arrays_from_detections(self, detections: List[Dict]):
+        """(boxes, class_ids, severity_ids, confidences) dari list deteksi (format response)"""
+        if not detections:
+            return (np.zeros((0, 4), np.float32), np.zeros(0, np.int64), np.zeros(0, np.int64),
+                    np.zeros(0, np.float32))
+        boxes = np.array([d['bbox'] for d in detections], dtype=np.float32)
+        class_ids = np.array([d['class_id'] for d in detections], dtype=np.int64)
+        severity_ids = np.array([self.severity_index[d['severity']] if 'severity' in d
+                                 else self.class_severity[d['class_id']] for d in detections], dtype=np.int64)
+        confidences = np.array([d['confidence'] for d in detections], dtype=np.float32)
+        return boxes, class_ids, severity_ids, confidences
+
+    def render(self, image: np.ndarray, detections: List[Dict], inplace: bool = False,
+               out: Optional[np.ndarray] = None, panel: bool = True, show_confidence: bool = True,
+               scale: Tuple[float, float] = (1.0, 1.0)) -> np.ndarray:
+        """
+        Gambar deteksi pada image
+
+        Args:
+            image: Array RGB (H, W, 3) uint8
+            detections: List deteksi (bbox, class_id, severity, confidence)
+            inplace: Gambar langsung di `image` (tanpa copy)
+            out: Buffer tujuan yang dipakai ulang (shape sama dengan image), dipakai jika diberikan
+            panel: Tambah panel ringkasan di pojok kiri atas
+            show_confidence: Tampilkan confidence di label
+            scale: (sx, sy) pengali koordinat bbox, mis. box resolusi asli -> gambar preview
+
+        Returns:
+            Array yang digambari (image, out, atau copy baru)
+        """
+        if out is not None:
+            np.copyto(out, image)
+            target = out
+        elif inplace:
+            target = image
+        else:
+            target = image.copy()
+
+        boxes, class_ids, severity_ids, confidences = self.arrays_from_detections(detections)
+        if scale != (1.0, 1.0) and len(boxes):
+            boxes = boxes * np.array([scale[0], scale[1], scale[0], scale[1]], dtype=np.float32)
+        self.draw_boxes(target, boxes, severity_ids)
+        self.draw_labels(target, boxes, class_ids, severity_ids, confidences if show_confidence else None)
+        if panel:
+            self.draw_panel(target, severity_ids)
+        return target
@@ -0,0 +1,225 @@
+"""
+Inference Scheduler for Railway Track Inspection
+Dynamic micro-batching: request /detect dikumpulkan lalu diproses dalam satu batch
+"""
+
+import asyncio
+import bisect
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class Histogram:
+    """Histogram sederhana dengan bucket kumulatif (gaya Prometheus)"""
+    
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def to_dict(self) -> Dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + [float('inf')], self.counts):
+            cumulative += count
+            buckets['+Inf' if bound == float('inf') else str(bound)] = cumulative
+        return {'buckets': buckets, 'count': self.count, 'sum': round(self.sum, 3)}
+
+
+class _Request:
+    __slots__ = ('image', 'future', 'enqueued_at', 'background', 'params')
+    
+    def __init__(self, image: np.ndarray, future: asyncio.Future, background: bool = False,
+                 params: Tuple = ()):
+        self.image = image
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+        self.background = background
+        self.params = params
+
+
+class InferenceScheduler:
+    """
+    Kumpulkan request inferensi dan jalankan sebagai batch di luar event loop
+    
+    Worker mengambil request dari queue sampai `max_batch_size` gambar atau
+    `max_wait_ms` milidetik sejak request pertama, lalu menjalankan
+    `infer_fn(images, *params)` di thread executor dan mengisi future tiap
+    request. Satu batch hanya berisi request dengan params yang sama (mis.
+    versi model + conf + iou); request lain tetap di queue untuk batch
+    berikutnya. Request background (job queue) berprioritas lebih rendah:
+    batch selalu diisi request interaktif lebih dulu, sisa kapasitas baru
+    diisi background.
+    """
+    
+    BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+    LATENCY_BUCKETS_MS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+    
+    def __init__(self, infer_fn: Callable[..., List], 
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0,
+                 concurrency: int = 1):
+        """
+        Args:
+            infer_fn: Fungsi blocking (list gambar, *params) -> list hasil (urutan sama)
+            max_batch_size: Jumlah gambar maksimum per batch
+            max_wait_ms: Waktu tunggu maksimum untuk mengisi batch
+            concurrency: Jumlah batch yang boleh berjalan bersamaan
+        """
+        self.infer_fn = infer_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.concurrency = max(1, concurrency)
+        
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                            thread_name_prefix='inference')
+        
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.total_requests = 0
+        self.background_requests = 0
+        self.total_batches = 0
+        self.batch_size_hist = Histogram(self.BATCH_SIZE_BUCKETS)
+        self.queue_wait_hist = Histogram(self.LATENCY_BUCKETS_MS)
+        self.inference_hist = Histogram(self.LATENCY_BUCKETS_MS)
+    
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+    
+    def start(self):
+        """Start worker pada event loop yang sedang berjalan"""
+        if self._worker is not None and not self._worker.done():
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """Stop worker dan batalkan request yang masih di queue"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._queue is not None and not self._queue.empty():
+            _, _, request = self._queue.get_nowait()
+            if not request.future.done():
+                request.future.cancel()
+    
+    async def submit(self, image: np.ndarray, background: bool = False, params: Tuple = ()):
+        """Masukkan satu gambar ke queue dan tunggu hasil inferensinya"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((int(background), next(self._seq), _Request(image, future, background, params)))
+        self.total_requests += 1
+        self.background_requests += int(background)
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+    
+    async def run_batch(self, images: List[np.ndarray], params: Tuple = ()) -> List:
+        """Jalankan batch yang sudah tersusun, berbagi slot inferensi dengan queue"""
+        self.start()
+        async with self._slots:
+            return await self._execute(images, params)
+    
+    async def _execute(self, images: List[np.ndarray], params: Tuple = ()) -> List:
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, self.infer_fn, images, *params)
+        finally:
+            self.in_flight -= 1
+            self.total_batches += 1
+            self.batch_size_hist.observe(len(images))
+            self.inference_hist.observe((time.perf_counter() - start) * 1000)
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Batch baru disusun setelah slot tersedia: item pertama dikembalikan ke
+            # queue supaya request interaktif yang masuk selama menunggu slot
+            # tidak tertahan di belakang request background
+            item = await self._queue.get()
+            await self._slots.acquire()
+            self._queue.put_nowait(item)
+            batch = [self._queue.get_nowait()[2]]
+            params = batch[0].params
+            deferred = []  # params berbeda: dikembalikan ke queue dengan prioritas & urutan asli
+            deadline = loop.time() + self.max_wait_ms / 1000
+            
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout <= 0:
+                        item = self._queue.get_nowait()
+                    else:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item[2].params == params:
+                    batch.append(item[2])
+                else:
+                    deferred.append(item)
+            for item in deferred:
+                self._queue.put_nowait(item)
+            
+            # Request yang sudah dibatalkan client tidak perlu diproses
+            batch = [r for r in batch if not r.future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            
+            loop.create_task(self._process(batch))
+    
+    async def _process(self, batch: List[_Request]):
+        now = time.perf_counter()
+        for request in batch:
+            self.queue_wait_hist.observe((now - request.enqueued_at) * 1000)
+        try:
+            results = await self._execute([r.image for r in batch], batch[0].params)
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        else:
+            for request, result in zip(batch, results):
+                if not request.future.done():
+                    request.future.set_result(result)
+        finally:
+            self._slots.release()
+    
+    def stats(self) -> Dict:
+        """Statistik queue & batch untuk tuning max_wait_ms / max_batch_size"""
+        return {
+            'config': {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'concurrency': self.concurrency
+            },
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'in_flight_batches': self.in_flight,
+            'total_requests': self.total_requests,
+            'background_requests': self.background_requests,
+            'total_batches': self.total_batches,
+            'batch_size': self.batch_size_hist.to_dict(),
+            'queue_wait_ms': self.queue_wait_hist.to_dict(),
+            'inference_ms': self.inference_hist.to_dict()
+        }
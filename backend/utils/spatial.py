@@ -0,0 +1,396 @@
+"""
+Spatial Defect Index for Railway Track Inspection
+Gabungkan deteksi yang sama dari banyak foto (overlap) menjadi satu defect per lokasi
+
+Setiap gambar membawa lokasi: chainage (km, atau km-post "12+345") dan/atau
+GPS (lat, lon dari form maupun EXIF). Defect disimpan di SQLite dengan index
+R*Tree (chainage 1D dalam meter, GPS 2D dalam meter proyeksi lokal), jadi
+pencarian kandidat merge saat ingest maupun query rentang ("semua defect
+HIGH antara km 12.3 dan 14.0") tetap O(log n) pada jutaan deteksi. R*Tree
+menyimpan batas float32 (dibulatkan keluar); posisi persis ada di tabel
+defects dan dipakai untuk hitung jarak.
+
+Usage (dari folder backend):
+    python -m utils.spatial --db uploads/defects.db stats
+    python -m utils.spatial --db uploads/defects.db query --km 12.3 14.0 --severity HIGH
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+METERS_PER_DEG_LAT = 110_574.0
+METERS_PER_DEG_LON = 111_320.0  # di ekuator, dikali cos(lat)
+GPS_IFD = 0x8825
+COUNTERS = ('defects', 'observations', 'images')
+
+
+def parse_chainage(value) -> Optional[float]:
+    """
+    Chainage dalam km dari angka / string
+
+    Menerima 12.345, "12.345", "12,345" atau format km-post "12+345" (km + meter).
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().lower().replace('km', '').strip()
+    if not text:
+        return None
+    try:
+        if '+' in text:
+            km, meters = text.split('+', 1)
+            return float(km) + float(meters) / 1000
+        return float(text.replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"Format chainage tidak valid: {value} (contoh: 12.345 atau 12+345)")
+
+
+def _dms_to_degrees(dms, ref: str) -> float:
+    degrees = float(dms[0]) + float(dms[1]) / 60 + float(dms[2]) / 3600
+    return -degrees if ref in ('S', 'W') else degrees
+
+
+def exif_location(contents: bytes) -> Optional[Tuple[float, float]]:
+    """(lat, lon) dari tag GPS EXIF gambar; None jika tidak ada / rusak"""
+    try:
+        gps = Image.open(io.BytesIO(contents)).getexif().get_ifd(GPS_IFD)
+        if not gps or 2 not in gps or 4 not in gps:
+            return None
+        return _dms_to_degrees(gps[2], gps.get(1, 'N')), _dms_to_degrees(gps[4], gps.get(3, 'E'))
+    except Exception:
+        return None
+
+
+def project(lat: float, lon: float) -> Tuple[float, float]:
+    """Proyeksi equirectangular ke meter (akurat untuk jarak pendek seperti radius merge)"""
+    return lon * METERS_PER_DEG_LON * math.cos(math.radians(lat)), lat * METERS_PER_DEG_LAT
+
+
+class DefectIndex:
+    """
+    Index defect persisten dengan merge duplikat antar gambar
+
+    Deteksi baru digabung ke defect kelas & jalur (line) yang sama dalam
+    radius merge; satu defect hanya bisa menerima satu deteksi per gambar,
+    jadi beberapa defect sejenis di satu foto tetap terpisah. Gambar yang
+    sama (hash isi) tidak di-ingest dua kali.
+    """
+
+    def __init__(self, path: str, merge_radius_m: float = 5.0):
+        """
+        Args:
+            path: Path file SQLite
+            merge_radius_m: Jarak maksimum (meter) deteksi dianggap defect yang sama
+        """
+        self.path = path
+        self.merge_radius_m = merge_radius_m
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS defects (
+                id INTEGER PRIMARY KEY, line TEXT NOT NULL, class_id INTEGER NOT NULL, class TEXT NOT NULL,
+                severity TEXT NOT NULL, km REAL, lat REAL, lon REAL, x REAL, y REAL,
+                sightings INTEGER NOT NULL, max_confidence REAL NOT NULL,
+                first_seen REAL NOT NULL, last_seen REAL NOT NULL, last_image TEXT);
+            CREATE INDEX IF NOT EXISTS idx_defects_severity ON defects (severity);
+            CREATE VIRTUAL TABLE IF NOT EXISTS defect_km USING rtree(id, m_min, m_max);
+            CREATE VIRTUAL TABLE IF NOT EXISTS defect_geo USING rtree(id, x_min, x_max, y_min, y_max);
+            CREATE TABLE IF NOT EXISTS observations (
+                id INTEGER PRIMARY KEY, defect_id INTEGER NOT NULL, image TEXT NOT NULL, filename TEXT,
+                confidence REAL NOT NULL, bbox TEXT NOT NULL, seen_at REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_observations_defect ON observations (defect_id);
+            CREATE INDEX IF NOT EXISTS idx_observations_image ON observations (image);
+            CREATE TABLE IF NOT EXISTS images (
+                key TEXT PRIMARY KEY, filename TEXT, line TEXT, km REAL, lat REAL, lon REAL,
+                detections INTEGER NOT NULL, ingested_at REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        ''')
+        # Ringkasan jumlah baris untuk /metrics; diisi sekali dari tabel jika database lama
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            if self._db.execute('SELECT COUNT(*) FROM counters').fetchone()[0] == 0:
+                for name in COUNTERS:
+                    self._db.execute(f'INSERT INTO counters (name, value) SELECT ?, COUNT(*) FROM {name}', (name,))
+            self._db.execute('COMMIT')
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+
+    # ----------------------------------------------------------------- ingest
+
+    def _candidates(self, location: Dict, class_id: int) -> List[sqlite3.Row]:
+        """Defect kelas & line yang sama di sekitar lokasi (lewat R*Tree)"""
+        r = self.merge_radius_m
+        if location.get('km') is not None:
+            m = location['km'] * 1000
+            return self._db.execute(
+                'SELECT d.* FROM defect_km k JOIN defects d ON d.id = k.id '
+                'WHERE k.m_min <= ? AND k.m_max >= ? AND d.line = ? AND d.class_id = ?',
+                (m + r, m - r, location['line'], class_id)).fetchall()
+        x, y = location['x'], location['y']
+        return self._db.execute(
+            'SELECT d.* FROM defect_geo g JOIN defects d ON d.id = g.id '
+            'WHERE g.x_min <= ? AND g.x_max >= ? AND g.y_min <= ? AND g.y_max >= ? '
+            'AND d.line = ? AND d.class_id = ?',
+            (x + r, x - r, y + r, y - r, location['line'], class_id)).fetchall()
+
+    @staticmethod
+    def _distance(row: sqlite3.Row, location: Dict) -> float:
+        if location.get('km') is not None and row['km'] is not None:
+            return abs(row['km'] - location['km']) * 1000
+        if row['x'] is None:
+            return math.inf
+        return math.hypot(row['x'] - location['x'], row['y'] - location['y'])
+
+    def _write_position(self, defect_id: int, km, lat, lon, x, y):
+        self._db.execute('UPDATE defects SET km = ?, lat = ?, lon = ?, x = ?, y = ? WHERE id = ?',
+                         (km, lat, lon, x, y, defect_id))
+        if km is not None:
+            self._db.execute('INSERT OR REPLACE INTO defect_km (id, m_min, m_max) VALUES (?, ?, ?)',
+                             (defect_id, km * 1000, km * 1000))
+        if x is not None:
+            self._db.execute('INSERT OR REPLACE INTO defect_geo (id, x_min, x_max, y_min, y_max) '
+                             'VALUES (?, ?, ?, ?, ?)', (defect_id, x, x, y, y))
+
+    def ingest(self, detections: List[Dict], km: Optional[float] = None, lat: Optional[float] = None,
+               lon: Optional[float] = None, line: str = 'default', image: str = '',
+               filename: Optional[str] = None, seen_at: Optional[float] = None) -> List[Dict]:
+        """
+        Masukkan deteksi satu gambar ke index
+
+        Args:
+            detections: List deteksi format response (class, class_id, severity, confidence, bbox)
+            km: Chainage gambar (km)
+            lat, lon: Koordinat GPS gambar
+            line: Id jalur / track (merge hanya dalam jalur yang sama)
+            image: Key unik gambar (hash isi); ingest ulang gambar yang sama tidak menambah sightings
+            filename: Nama file asli (informasi saja)
+            seen_at: Waktu pengambilan gambar (epoch, default sekarang)
+
+        Returns:
+            Per deteksi (urutan sama): {'defect_id', 'merged', 'sightings'}
+        """
+        if km is None and (lat is None or lon is None):
+            raise ValueError("Lokasi wajib: km (chainage) atau lat + lon")
+        seen_at = seen_at or time.time()
+        location = {'km': km, 'lat': lat, 'lon': lon, 'line': line}
+        location['x'], location['y'] = project(lat, lon) if lat is not None and lon is not None else (None, None)
+
+        with self._lock:
+            if image:
+                existing = self._db.execute(
+                    'SELECT o.defect_id, d.sightings FROM observations o JOIN defects d ON d.id = o.defect_id '
+                    'WHERE o.image = ? ORDER BY o.id', (image,)).fetchall()
+                if existing or self._db.execute('SELECT 1 FROM images WHERE key = ?', (image,)).fetchone():
+                    return [{'defect_id': row[0], 'merged': True, 'sightings': row[1], 'duplicate_image': True}
+                            for row in existing]
+
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                results = self._ingest(detections, location, image, filename, seen_at)
+                self._db.execute(
+                    'INSERT OR REPLACE INTO images (key, filename, line, km, lat, lon, detections, ingested_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (image or f'anon-{time.time_ns()}', filename, line, km, lat, lon, len(detections), time.time()))
+                added = {'defects': sum(1 for r in results if not r['merged']),
+                         'observations': len(results), 'images': 1}
+                self._db.executemany('UPDATE counters SET value = value + ? WHERE name = ?',
+                                     [(added[name], name) for name in COUNTERS])
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        return results
+
+    def _ingest(self, detections: List[Dict], location: Dict, image: str, filename: Optional[str],
+                seen_at: float) -> List[Dict]:
+        results: List[Optional[Dict]] = [None] * len(detections)
+        used = set()  # satu defect maksimal satu deteksi per gambar
+        candidates_by_class = {}
+        order = sorted(range(len(detections)), key=lambda i: -detections[i]['confidence'])
+
+        for i in order:
+            det = detections[i]
+            class_id = det['class_id']
+            if class_id not in candidates_by_class:
+                candidates_by_class[class_id] = self._candidates(location, class_id)
+            best, best_distance = None, self.merge_radius_m
+            for row in candidates_by_class[class_id]:
+                if row['id'] in used:
+                    continue
+                distance = self._distance(row, location)
+                if distance <= best_distance:
+                    best, best_distance = row, distance
+
+            if best is None:
+                cursor = self._db.execute(
+                    'INSERT INTO defects (line, class_id, class, severity, sightings, max_confidence, '
+                    'first_seen, last_seen, last_image) VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)',
+                    (location['line'], class_id, det['class'], det['severity'], det['confidence'],
+                     seen_at, seen_at, filename))
+                defect_id, sightings = cursor.lastrowid, 1
+                self._write_position(defect_id, location['km'], location['lat'], location['lon'],
+                                     location['x'], location['y'])
+                merged = False
+            else:
+                # Posisi defect = rata-rata posisi semua sighting
+                defect_id, n = best['id'], best['sightings']
+                sightings = n + 1
+                position = {}
+                for key in ('km', 'lat', 'lon', 'x', 'y'):
+                    old, new = best[key], location[key]
+                    position[key] = new if old is None else old if new is None else (old * n + new) / sightings
+                self._write_position(defect_id, **position)
+                self._db.execute(
+                    'UPDATE defects SET sightings = ?, max_confidence = MAX(max_confidence, ?), '
+                    'last_seen = MAX(last_seen, ?), last_image = ? WHERE id = ?',
+                    (sightings, det['confidence'], seen_at, filename, defect_id))
+                merged = True
+
+            used.add(defect_id)
+            self._db.execute(
+                'INSERT INTO observations (defect_id, image, filename, confidence, bbox, seen_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (defect_id, image, filename, det['confidence'], json.dumps(det['bbox']), seen_at))
+            results[i] = {'defect_id': defect_id, 'merged': merged, 'sightings': sightings}
+        return results
+
+    # ------------------------------------------------------------------ query
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> Dict:
+        defect = dict(row)
+        for key in ('x', 'y'):
+            defect.pop(key, None)
+        if defect['km'] is not None:
+            defect['km'] = round(defect['km'], 4)
+        return defect
+
+    def query(self, km_from: Optional[float] = None, km_to: Optional[float] = None,
+              bbox: Optional[Sequence[float]] = None, line: Optional[str] = None,
+              severity: Optional[str] = None, class_name: Optional[str] = None,
+              min_sightings: int = 1, limit: int = 1000, offset: int = 0) -> List[Dict]:
+        """
+        Defect dalam rentang chainage dan/atau kotak GPS
+
+        Args:
+            km_from, km_to: Rentang chainage (km, inklusif)
+            bbox: (lat_min, lon_min, lat_max, lon_max)
+            line, severity, class_name: Filter tambahan
+            min_sightings: Hanya defect yang terlihat minimal di n gambar
+            limit, offset: Paginasi (urut chainage / id)
+        """
+        # R*Tree selalu di depan (CROSS JOIN memaksa urutan join); tanpa itu planner
+        # bisa memilih scan idx_defects_severity lalu lookup R*Tree per baris
+        sources, where, args = [], ['d.sightings >= ?'], [min_sightings]
+        if km_from is not None or km_to is not None:
+            low = (km_from if km_from is not None else -1e9) * 1000
+            high = (km_to if km_to is not None else 1e9) * 1000
+            sources.append('defect_km k')
+            where.append('k.id = d.id')
+            where.append('k.m_max >= ? AND k.m_min <= ? AND d.km BETWEEN ? AND ?')
+            args += [low, high, low / 1000, high / 1000]
+        if bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = bbox
+            # Kotak meter yang mencakup bbox derajat (cos(lat) terkecil = lebar terbesar)
+            xs = [project(lat, lon)[0] for lat in (lat_min, lat_max) for lon in (lon_min, lon_max)]
+            sources.append('defect_geo g')
+            where.append('g.id = d.id')
+            where.append('g.x_max >= ? AND g.x_min <= ? AND g.y_max >= ? AND g.y_min <= ? '
+                         'AND d.lat BETWEEN ? AND ? AND d.lon BETWEEN ? AND ?')
+            args += [min(xs), max(xs), lat_min * METERS_PER_DEG_LAT, lat_max * METERS_PER_DEG_LAT,
+                     lat_min, lat_max, lon_min, lon_max]
+        for column, value in (('line', line), ('severity', severity), ('class', class_name)):
+            if value is not None:
+                where.append(f'd.{column} = ?')
+                args.append(value)
+        query = (f"SELECT d.* FROM {' CROSS JOIN '.join(sources + ['defects d'])} WHERE {' AND '.join(where)} "
+                 f"ORDER BY d.km IS NULL, d.km, d.id LIMIT ? OFFSET ?")
+        with self._lock:
+            rows = self._db.execute(query, (*args, limit, offset)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def get(self, defect_id: int, observations: int = 100) -> Optional[Dict]:
+        """Satu defect beserta sighting terbarunya"""
+        with self._lock:
+            row = self._db.execute('SELECT * FROM defects WHERE id = ?', (defect_id,)).fetchone()
+            if row is None:
+                return None
+            seen = self._db.execute(
+                'SELECT image, filename, confidence, bbox, seen_at FROM observations '
+                'WHERE defect_id = ? ORDER BY seen_at DESC LIMIT ?', (defect_id, observations)).fetchall()
+        defect = self._row(row)
+        defect['observations'] = [{**dict(o), 'bbox': json.loads(o['bbox'])} for o in seen]
+        return defect
+
+    def counts(self) -> Dict[str, int]:
+        """Jumlah defect, observation & gambar dari tabel ringkasan (murah, untuk /metrics)"""
+        with self._lock:
+            return dict(self._db.execute('SELECT name, value FROM counters').fetchall())
+
+    def stats(self) -> Dict:
+        """Statistik lengkap (scan tabel defects) untuk CLI dan /defects/stats"""
+        with self._lock:
+            by_severity = dict(self._db.execute('SELECT severity, COUNT(*) FROM defects GROUP BY severity').fetchall())
+            by_class = dict(self._db.execute('SELECT class, COUNT(*) FROM defects GROUP BY class').fetchall())
+            observations = self._db.execute('SELECT COUNT(*) FROM observations').fetchone()[0]
+            images = self._db.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+            km_range = self._db.execute('SELECT MIN(km), MAX(km) FROM defects').fetchone()
+        return {
+            'defects': sum(by_severity.values()),
+            'observations': observations,
+            'images': images,
+            'merge_radius_m': self.merge_radius_m,
+            'by_severity': by_severity,
+            'by_class': by_class,
+            'km_range': list(km_range)
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Query index defect per lokasi')
+    parser.add_argument('--db', default='uploads/defects.db', help='Path database index defect')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats')
+    query = sub.add_parser('query')
+    query.add_argument('--km', nargs=2, default=None, metavar=('FROM', 'TO'), help='Rentang chainage (12.3 atau 12+300)')
+    query.add_argument('--bbox', nargs=4, type=float, default=None,
+                       metavar=('LAT_MIN', 'LON_MIN', 'LAT_MAX', 'LON_MAX'))
+    query.add_argument('--line', default=None)
+    query.add_argument('--severity', default=None, choices=['HIGH', 'MEDIUM', 'LOW'])
+    query.add_argument('--class', dest='class_name', default=None)
+    query.add_argument('--min-sightings', type=int, default=1)
+    query.add_argument('--limit', type=int, default=1000)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    index = DefectIndex(args.db)
+    if args.command == 'stats':
+        print(json.dumps(index.stats(), indent=2))
+        return
+    km_from, km_to = (parse_chainage(v) for v in args.km) if args.km else (None, None)
+    defects = index.query(km_from, km_to, args.bbox, args.line, args.severity, args.class_name,
+                          args.min_sightings, args.limit)
+    for defect in defects:
+        print(json.dumps(defect, ensure_ascii=False))
+    print(f"[+] {len(defects)} defects")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""
+Telemetry for Railway Track Inspection
+Metric counter / gauge / histogram berlabel, format teks Prometheus, timing per stage & profiler request lambat
+
+Semua metric terdaftar di REGISTRY (satu per proses) dan dirender oleh
+endpoint /metrics. METRICS_ENABLED=0 membuat semua timer menjadi no-op.
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter as TallyCounter, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Bucket detik: 0.5 ms sampai 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """Basis metric berlabel; nilai per kombinasi label disimpan di dict, dilindungi lock"""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                                for key, value in items]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+
+class Histogram(Metric):
+    """Histogram kumulatif; per label disimpan [counts per bucket, sum, count]"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = sorted(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Ukur durasi blok `with` (detik); no-op jika METRICS_ENABLED=0"""
+        if not METRICS_ENABLED:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + [float('inf')], counts):
+                cumulative += n
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Kumpulan metric + collector (callback yang membaca statistik komponen lain saat scrape)"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Text exposition format Prometheus (version 0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                lines.append(f'# collector error: {e}')
+        return '\n'.join(lines) + '\n'
+
+
+def histogram_lines(name: str, documentation: str, buckets: Dict[str, int], total: float,
+                    count: int) -> List[str]:
+    """Render histogram yang sudah kumulatif (mis. Histogram scheduler.to_dict())"""
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} histogram']
+    for bound, cumulative in buckets.items():
+        lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum {_format_value(total)}')
+    lines.append(f'{name}_count {count}')
+    return lines
+
+
+def gauge_lines(name: str, documentation: str, value: float, metric_type: str = 'gauge') -> List[str]:
+    return [f'# HELP {name} {documentation}', f'# TYPE {name} {metric_type}', f'{name} {_format_value(value)}']
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'railway_stage_duration_seconds', 'Durasi per stage pemrosesan', ('component', 'stage'))
+
+
+@contextmanager
+def stage(name: str, component: str = 'api'):
+    """`with stage('decode'):` mencatat durasi blok ke railway_stage_duration_seconds"""
+    with STAGE_SECONDS.time(component=component, stage=name):
+        yield
+
+
+def observe_stage(name: str, seconds: float, component: str = 'api'):
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, component=component, stage=name)
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler untuk request lambat
+
+    Selama ada request aktif, thread sampler membaca stack semua thread
+    (sys._current_frames) setiap `interval_ms`. Request yang selesai lebih
+    lama dari `threshold_ms` menulis sampel di rentang waktunya sebagai
+    folded stack (format flamegraph.pl / speedscope) ke `output_dir`.
+    """
+
+    def __init__(self, threshold_ms: float, interval_ms: float = 5.0, output_dir: str = 'profiles',
+                 max_samples: int = 20000, max_files: int = 100):
+        self.threshold = threshold_ms / 1000
+        self.interval = max(0.001, interval_ms / 1000)
+        self.output_dir = Path(output_dir)
+        self.max_files = max_files
+        self.samples = deque(maxlen=max_samples)
+        self.active = 0
+        self.dumped = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            self._wake.wait()
+            now = time.perf_counter()
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(names)))
+            self.samples.append((now, stacks))
+            time.sleep(self.interval)
+
+    def begin(self) -> float:
+        with self._lock:
+            self.active += 1
+            self._ensure_thread()
+            self._wake.set()
+        return time.perf_counter()
+
+    def end(self, started: float, label: str) -> Optional[str]:
+        """Tutup request; return path file profil jika request lambat"""
+        finished = time.perf_counter()
+        with self._lock:
+            self.active -= 1
+            if not self.active:
+                self._wake.clear()
+        if finished - started < self.threshold or self.dumped >= self.max_files:
+            return None
+
+        folded = TallyCounter()
+        for timestamp, stacks in list(self.samples):
+            if started <= timestamp <= finished:
+                folded.update(stacks)
+        if not folded:
+            return None
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() else '_' for c in label).strip('_')
+        path = self.output_dir / f"slow-{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}-{int((finished - started) * 1000)}ms.folded"
+        path.write_text(''.join(f'{stack} {count}\n' for stack, count in folded.most_common()))
+        self.dumped += 1
+        print(f"[!] Slow request {label}: {(finished - started) * 1000:.0f} ms, profile saved: {path}")
+        return str(path)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: jumlah request, durasi & request in-flight per route
+
+    Pure ASGI (tidak membungkus receive) sehingga aman untuk streaming
+    upload seperti /detect-video. Label path adalah template route yang
+    cocok (/jobs/{job_id}); path di luar route aplikasi dilabeli 'other'
+    supaya kardinalitas label tetap kecil.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry = REGISTRY,
+                 profiler: Optional[SlowRequestProfiler] = None, skip_paths: Sequence[str] = ('/metrics',)):
+        self.app = app
+        self.profiler = profiler
+        self.skip_paths = set(skip_paths)
+        self._routes = None
+        self.requests = registry.counter('railway_http_requests_total', 'Jumlah request HTTP',
+                                         ('method', 'path', 'status'))
+        self.duration = registry.histogram('railway_http_request_duration_seconds',
+                                           'Durasi request HTTP sampai response selesai', ('method', 'path'))
+        self.in_flight = registry.gauge('railway_http_requests_in_flight', 'Request HTTP yang sedang diproses',
+                                        ('path',))
+
+    def _route(self, scope) -> str:
+        """Template route yang cocok (mis. /jobs/{job_id}), bukan path mentah"""
+        if self._routes is None:
+            app = scope.get('app')
+            self._routes = [r for r in getattr(app, 'routes', []) if hasattr(r, 'matches')]
+        partial = None
+        for route in self._routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path  # path cocok, method tidak (405)
+        return partial or 'other'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not METRICS_ENABLED or scope.get('path') in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        path = self._route(scope)
+        method = scope.get('method', '')
+        status = {'code': 500}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        token = self.profiler.begin() if self.profiler else None
+        self.in_flight.inc(path=path)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec(path=path)
+            self.duration.observe(time.perf_counter() - started, method=method, path=path)
+            self.requests.inc(method=method, path=path, status=status['code'])
+            if token is not None:
+                # Kumpulkan sampel & tulis file profil di luar event loop
+                await run_in_threadpool(self.profiler.end, token, f'{method} {path}')
@@ -0,0 +1,221 @@
+"""
+Tiled Inference for Railway Track Inspection
+Pecah gambar resolusi tinggi menjadi tile overlap supaya defect kecil tidak hilang saat downscale
+
+Usage (dari folder backend), laporan recall vs biaya pada split val:
+    python -m utils.tiling --weights models/best.pt --data ../datasets/data.yaml --root ../datasets
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.backends import create_backend
+from utils.boxes import nms
+from utils.datasets import load_data_config
+from utils.evaluate import evaluate
+from utils.labelstore import load_label_store
+
+
+def _starts(length: int, tile: int, step: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, step))
+    return starts + [length - tile]
+
+
+def tile_windows(height: int, width: int, tile_size: int = 640,
+                 overlap: float = 0.2) -> List[Tuple[int, int, int, int]]:
+    """
+    Window (x1, y1, x2, y2) tile yang menutupi seluruh gambar
+
+    Tile terakhir di setiap sumbu digeser ke tepi gambar sehingga semua
+    tile berukuran sama (kecuali gambar lebih kecil dari tile).
+    """
+    step = max(1, int(tile_size * (1 - overlap)))
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in _starts(height, tile_size, step)
+            for x in _starts(width, tile_size, step)]
+
+
+def make_tiles(image: np.ndarray, tile_size: int = 640, overlap: float = 0.2,
+               include_full: bool = True) -> Tuple[List[np.ndarray], List[Tuple[int, int, int, int]]]:
+    """
+    Potong gambar menjadi tile (view, tanpa copy)
+
+    Args:
+        image: Gambar RGB (H, W, 3)
+        tile_size: Sisi tile dalam piksel gambar asli
+        overlap: Fraksi overlap antar tile (0-1)
+        include_full: Tambahkan gambar utuh (downscale) untuk objek besar
+
+    Returns:
+        (list gambar, list window (x1, y1, x2, y2) tiap gambar di koordinat asli)
+    """
+    h, w = image.shape[:2]
+    windows = tile_windows(h, w, tile_size, overlap)
+    if len(windows) == 1:
+        return [image], [(0, 0, w, h)]
+    crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+    if include_full:
+        crops.append(image)
+        windows.append((0, 0, w, h))
+    return crops, windows
+
+
+def merge_tile_predictions(predictions: Sequence[np.ndarray],
+                           windows: Sequence[Tuple[int, int, int, int]],
+                           iou_threshold: float = 0.45, metric: str = 'ios',
+                           max_det: int = 1000, edge_margin: int = 2) -> np.ndarray:
+    """
+    Gabungkan prediksi per tile ke koordinat gambar penuh dengan NMS lintas tile
+
+    Box yang menempel di tepi dalam tile (bukan tepi gambar) kemungkinan
+    terpotong; box tersebut diberi prioritas lebih rendah sehingga NMS
+    mempertahankan versi utuhnya dari tile tetangga / gambar penuh.
+
+    Args:
+        predictions: Array (n, 6) x1, y1, x2, y2, conf, cls per tile
+        windows: Window (x1, y1, x2, y2) tiap tile, hasil make_tiles
+        iou_threshold: Threshold overlap NMS gabungan
+        metric: 'ios' (default, menangani box terpotong di tepi tile) atau 'iou'
+        edge_margin: Jarak (piksel) ke tepi tile yang dianggap terpotong
+
+    Returns:
+        Array float32 (n, 6) urut confidence menurun
+    """
+    width = max(w[2] for w in windows)
+    height = max(w[3] for w in windows)
+    shifted, truncated = [], []
+    for pred, (x1, y1, x2, y2) in zip(predictions, windows):
+        if not len(pred):
+            continue
+        pred = np.array(pred, dtype=np.float32)
+        pred[:, [0, 2]] += x1
+        pred[:, [1, 3]] += y1
+        cut = np.zeros(len(pred), dtype=bool)
+        if x1 > 0:
+            cut |= pred[:, 0] <= x1 + edge_margin
+        if y1 > 0:
+            cut |= pred[:, 1] <= y1 + edge_margin
+        if x2 < width:
+            cut |= pred[:, 2] >= x2 - edge_margin
+        if y2 < height:
+            cut |= pred[:, 3] >= y2 - edge_margin
+        shifted.append(pred)
+        truncated.append(cut)
+    if not shifted:
+        return np.zeros((0, 6), dtype=np.float32)
+
+    merged = np.concatenate(shifted)
+    priority = merged[:, 4] + np.where(np.concatenate(truncated), 0.0, 1.0)
+    # Offset per kelas supaya NMS gabungan tetap class-aware; harus lebih besar
+    # dari sisi gambar (tiled mode menerima gambar resolusi penuh > 7680 px)
+    offset = max(width, height) + 1
+    boxes = merged[:, :4] + merged[:, 5:6] * offset
+    keep = nms(boxes, priority, iou_threshold, metric=metric)
+    keep = keep[np.argsort(-merged[keep, 4], kind='stable')][:max_det]
+    return merged[keep]
+
+
+class TiledPredictor:
+    """
+    Bungkus backend sehingga `predict()` menjalankan inferensi ber-tile
+
+    Semua tile (dan gambar utuh) satu gambar dikirim dalam satu panggilan
+    backend (satu batch). Interface sama dengan InferenceBackend.predict
+    sehingga bisa dipakai langsung oleh utils.evaluate.
+    """
+
+    def __init__(self, backend, tile_size: int = 640, overlap: float = 0.2,
+                 include_full: bool = True, merge_metric: str = 'ios'):
+        self.backend = backend
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.include_full = include_full
+        self.merge_metric = merge_metric
+        self.tiles_run = 0
+
+    def predict(self, images: List[np.ndarray], size: Optional[int] = None,
+                conf: Optional[float] = None, iou: Optional[float] = None) -> List[np.ndarray]:
+        iou = getattr(self.backend, 'iou_threshold', 0.45) if iou is None else iou
+        results = []
+        for image in images:
+            crops, windows = make_tiles(image, self.tile_size, self.overlap, self.include_full)
+            self.tiles_run += len(crops)
+            preds = self.backend.predict(crops, size=size or self.tile_size, conf=conf, iou=iou)
+            results.append(merge_tile_predictions(preds, windows, iou, self.merge_metric))
+        return results
+
+
+def build_report(baseline: dict, tiled: dict, tiles_per_image: float, tile_size: int,
+                 overlap: float) -> dict:
+    """Bandingkan recall / AP per kelas dan biaya latency tiled vs full-frame"""
+    classes = {}
+    for name, base in baseline['per_class'].items():
+        tile = tiled['per_class'][name]
+        gain = None
+        if base['recall'] is not None and tile['recall'] is not None:
+            gain = round(tile['recall'] - base['recall'], 4)
+        classes[name] = {
+            'labels': base['labels'],
+            'recall': base['recall'],
+            'recall_tiled': tile['recall'],
+            'recall_gain': gain,
+            'ap50': base['ap50'],
+            'ap50_tiled': tile['ap50']
+        }
+    return {
+        'images': baseline['images'],
+        'tile_size': tile_size,
+        'overlap': overlap,
+        'tiles_per_image': round(tiles_per_image, 2),
+        'map50': {'full': baseline['map50'], 'tiled': tiled['map50']},
+        'map50_95': {'full': baseline['map50_95'], 'tiled': tiled['map50_95']},
+        'latency_ms': {'full': baseline['latency_ms'], 'tiled': tiled['latency_ms']},
+        'cost': round(tiled['latency_ms']['mean'] / max(baseline['latency_ms']['mean'], 1e-9), 2),
+        'per_class': classes
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Laporan recall tiled vs full-frame inference')
+    parser.add_argument('--weights', default='models/best.pt')
+    parser.add_argument('--backend', default='torch', choices=['torch', 'torchscript', 'onnx'])
+    parser.add_argument('--data', default='../datasets/data.yaml', help='Path data.yaml')
+    parser.add_argument('--root', default=None, help='Override root dataset (default: folder data.yaml)')
+    parser.add_argument('--split', default='val')
+    parser.add_argument('--images', type=int, default=0, help='Batasi jumlah gambar (0 = semua)')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--tile-size', type=int, default=640)
+    parser.add_argument('--overlap', type=float, default=0.2)
+    parser.add_argument('--no-full', action='store_true', help='Jangan sertakan gambar utuh')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = load_data_config(args.data, args.root)
+    class_names = list(config['names'])
+    samples = load_label_store(config).samples(args.split, limit=args.images)
+    print(f"[*] Evaluating full-frame vs tiled on {len(samples)} images from split '{args.split}'")
+
+    backend = create_backend(args.backend, args.weights, imgsz=args.imgsz)
+    backend.warmup()
+    baseline = evaluate(backend, samples, class_names, size=args.imgsz)
+    tiled_predictor = TiledPredictor(backend, args.tile_size, args.overlap, include_full=not args.no_full)
+    tiled = evaluate(tiled_predictor, samples, class_names)
+
+    report = build_report(baseline, tiled, tiled_predictor.tiles_run / max(1, tiled['images']),
+                          args.tile_size, args.overlap)
+    path = Path(args.weights).with_name('tiling_report.json')
+    path.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+    print(f"[+] Report saved: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Frame Sampling & Tracking for Railway Track Inspection
+Pilih keyframe berdasarkan skor gerak dan bawa deteksi antar keyframe dengan tracker IoU
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from utils.boxes import box_iou
+
+
+class MotionGate:
+    """
+    Tentukan kapan detector penuh perlu dijalankan
+
+    Setiap frame diperkecil ke grayscale lebar `width`. Pergeseran global
+    kamera antar frame diestimasi dengan phase correlation; keyframe
+    terakhir digeser sebesar akumulasi pergeseran itu lalu dibandingkan
+    (absdiff rata-rata) dengan frame sekarang. Skor tinggi berarti ada
+    konten baru yang belum pernah dilihat detector.
+    """
+
+    def __init__(self, threshold: float = 0.08, min_interval: int = 1,
+                 max_interval: int = 30, width: int = 160, min_response: float = 0.1):
+        """
+        Args:
+            threshold: Skor gerak (0-1) minimal untuk memicu keyframe
+            min_interval: Jarak minimal antar keyframe (frame)
+            max_interval: Jarak maksimal antar keyframe (paksa deteksi ulang)
+            width: Lebar frame kecil untuk perhitungan skor
+            min_response: Puncak phase correlation minimal agar pergeseran dipakai
+        """
+        self.threshold = threshold
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(1, max_interval)
+        self.width = width
+        self.min_response = min_response
+        self.scale = 1.0
+        self.key_gray: Optional[np.ndarray] = None
+        self.prev_gray: Optional[np.ndarray] = None
+        self.key_offset = np.zeros(2, dtype=np.float64)  # pergeseran sejak keyframe (px kecil)
+        self.since_key = 0
+        self.score = 0.0
+
+    def _small_gray(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        self.scale = self.width / w
+        small = cv2.resize(frame, (self.width, max(1, round(h * self.scale))),
+                           interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        return small.astype(np.float32)
+
+    def update(self, frame: np.ndarray) -> Tuple[bool, Tuple[float, float]]:
+        """
+        Proses satu frame (RGB / BGR, hasil sama untuk grayscale)
+
+        Returns:
+            (is_keyframe, (dx, dy)) dengan dx, dy pergeseran dari frame
+            sebelumnya dalam piksel resolusi asli
+        """
+        gray = self._small_gray(frame)
+        shift = (0.0, 0.0)
+        if self.prev_gray is not None and self.prev_gray.shape == gray.shape:
+            (dx, dy), response = cv2.phaseCorrelate(self.prev_gray, gray)
+            # Response rendah (frame polos / blur) berarti estimasi tidak bisa dipercaya
+            if response >= self.min_response:
+                shift = (dx, dy)
+        self.prev_gray = gray
+        self.since_key += 1
+
+        if self.key_gray is None or self.key_gray.shape != gray.shape:
+            return self._set_key(gray), (0.0, 0.0)
+
+        self.key_offset += shift
+        warp = np.float32([[1, 0, self.key_offset[0]], [0, 1, self.key_offset[1]]])
+        aligned = cv2.warpAffine(self.key_gray, warp, (gray.shape[1], gray.shape[0]),
+                                 borderMode=cv2.BORDER_REPLICATE)
+        self.score = float(cv2.absdiff(aligned, gray).mean()) / 255
+
+        full_shift = (shift[0] / self.scale, shift[1] / self.scale)
+        if self.since_key >= self.max_interval or \
+                (self.since_key >= self.min_interval and self.score > self.threshold):
+            return self._set_key(gray), full_shift
+        return False, full_shift
+
+    def _set_key(self, gray: np.ndarray) -> bool:
+        self.key_gray = gray
+        self.key_offset[:] = 0
+        self.since_key = 0
+        return True
+
+
+class IoUTracker:
+    """
+    Tracker ringan berbasis IoU untuk deteksi (dict dari RailwayDetector)
+
+    Deteksi keyframe dicocokkan greedy (IoU tertinggi, kelas sama) ke track
+    yang ada; di antara keyframe box track digeser mengikuti pergeseran
+    global kamera. Setiap track mewakili satu objek fisik sehingga kerusakan
+    cukup dilaporkan sekali per track.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 2):
+        """
+        Args:
+            iou_threshold: IoU minimal agar deteksi dianggap objek yang sama
+            max_missed: Jumlah keyframe berturut-turut tanpa match sebelum track dihapus
+        """
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks: List[Dict] = []
+        self.objects: Dict[int, Dict] = {}  # ringkasan per objek unik (track_id)
+        self._next_id = 1
+
+    def shift(self, dx: float, dy: float):
+        """Geser semua track sesuai pergeseran kamera (frame non-keyframe)"""
+        if dx == 0 and dy == 0:
+            return
+        for track in self.tracks:
+            x1, y1, x2, y2 = track['bbox']
+            track['bbox'] = [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+
+    def update(self, detections: List[Dict], frame_index: int) -> List[Dict]:
+        """Cocokkan deteksi keyframe ke track, buat track baru untuk sisanya"""
+        matched_tracks, matched_dets = set(), set()
+        if self.tracks and detections:
+            iou = box_iou([t['bbox'] for t in self.tracks], [d['bbox'] for d in detections])
+            same_class = np.array([t['class_id'] for t in self.tracks])[:, None] == \
+                np.array([d['class_id'] for d in detections])[None, :]
+            iou = np.where(same_class, iou, 0)
+            for flat in np.argsort(-iou, axis=None):
+                t, d = np.unravel_index(flat, iou.shape)
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_dets:
+                    continue
+                matched_tracks.add(t)
+                matched_dets.add(d)
+                self._assign(self.tracks[t], detections[d], frame_index)
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track['missed'] += 1
+                if track['missed'] > self.max_missed:
+                    continue
+            survivors.append(track)
+        self.tracks = survivors
+
+        for d, det in enumerate(detections):
+            if d not in matched_dets:
+                track = {'track_id': self._next_id, 'missed': 0}
+                self._next_id += 1
+                self._assign(track, det, frame_index)
+                self.tracks.append(track)
+        return self.active()
+
+    def _assign(self, track: Dict, det: Dict, frame_index: int):
+        track.update({k: v for k, v in det.items() if k != 'bbox'})
+        track['bbox'] = list(det['bbox'])
+        track['missed'] = 0
+        summary = self.objects.get(track['track_id'])
+        if summary is None:
+            self.objects[track['track_id']] = {
+                'track_id': track['track_id'],
+                'class': det['class'],
+                'class_id': det['class_id'],
+                'severity': det['severity'],
+                'confidence': det['confidence'],
+                'bbox': list(det['bbox']),
+                'first_frame': frame_index,
+                'last_frame': frame_index,
+                'detections': 1
+            }
+        else:
+            summary['last_frame'] = frame_index
+            summary['detections'] += 1
+            if det['confidence'] > summary['confidence']:
+                summary['confidence'] = det['confidence']
+                summary['bbox'] = list(det['bbox'])
+
+    def active(self) -> List[Dict]:
+        """Deteksi yang sedang di-track (format sama dengan RailwayDetector.detect)"""
+        return [{k: v for k, v in track.items() if k != 'missed'} for track in self.tracks]
+
+    def unique_defects(self) -> List[Dict]:
+        """Satu entry per objek fisik, urut berdasarkan frame pertama terlihat"""
+        return sorted(self.objects.values(), key=lambda o: (o['first_frame'], o['track_id']))
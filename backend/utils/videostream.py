@@ -0,0 +1,226 @@
+"""
+Video Stream Utilities for Railway Track Inspection
+Decode frame video dari upload yang masih berjalan (chunked) dengan memori konstan
+"""
+
+import os
+import tempfile
+from typing import AsyncIterator, List, Optional
+
+import cv2
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+
+# Content-Type yang berisi JPEG berurutan (bisa di-decode per frame tanpa container)
+MJPEG_TYPES = ('video/x-motion-jpeg', 'video/mjpeg', 'video/x-mjpeg',
+               'multipart/x-mixed-replace', 'image/jpeg')
+
+
+class MJPEGParser:
+    """
+    Pisahkan stream MJPEG menjadi bytes JPEG per frame secara incremental
+
+    Di dalam frame, segmen JPEG dilewati berdasarkan field panjangnya
+    sehingga SOI / EOI milik thumbnail EXIF (APP1) tidak dianggap batas
+    frame; EOI baru dicari di data entropy setelah SOS. Hanya sisa data yang
+    belum membentuk frame utuh yang disimpan di buffer, sehingga memori
+    tidak bertambah seiring panjang video. Boundary multipart (jika ada)
+    terlewati karena frame berikutnya dicari dari marker SOI. Frame dengan
+    struktur segmen rusak tetap dikembalikan (gagal di-decode) supaya bisa
+    dihitung pemanggil.
+    """
+
+    def __init__(self, max_frame_bytes: int = 16 * 1024 * 1024):
+        self.max_frame_bytes = max_frame_bytes
+        self._buffer = bytearray()
+        self._in_frame = False
+        self._entropy = False  # posisi di data entropy (setelah header SOS)
+        self._pos = 0  # posisi parse di dalam frame (buffer selalu mulai dari SOI)
+
+    def _start_frame(self) -> bool:
+        start = self._buffer.find(SOI)
+        if start < 0:
+            # Simpan byte terakhir, mungkin awal marker SOI yang terpotong
+            del self._buffer[:max(0, len(self._buffer) - 1)]
+            return False
+        del self._buffer[:start]
+        self._in_frame, self._entropy, self._pos = True, False, 2
+        return True
+
+    def _cut(self, end: int) -> bytes:
+        frame = bytes(self._buffer[:end])
+        del self._buffer[:end]
+        self._in_frame = False
+        return frame
+
+    def _scan_entropy(self) -> bool:
+        """Cari marker berikutnya di data entropy; False jika butuh data lagi"""
+        buffer, i = self._buffer, self._buffer.find(b'\xff', self._pos)
+        while i >= 0:
+            if i + 1 >= len(buffer):
+                self._pos = i
+                return False
+            marker = buffer[i + 1]
+            # 0xFF00 = byte stuffing, RST0-7 & fill byte 0xFF bukan akhir scan
+            if marker == 0x00 or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                i = buffer.find(b'\xff', i + 1 if marker == 0xFF else i + 2)
+                continue
+            self._pos, self._entropy = i, False
+            return True
+        self._pos = len(buffer)
+        return False
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Tambahkan chunk dan kembalikan semua frame JPEG yang sudah lengkap"""
+        self._buffer += chunk
+        frames = []
+        buffer = self._buffer
+        while True:
+            if not self._in_frame and not self._start_frame():
+                break
+            if self._entropy and not self._scan_entropy():
+                break
+            pos = self._pos
+            if pos + 2 > len(buffer):
+                break
+            if buffer[pos] != 0xFF:
+                # Struktur segmen rusak: kembalikan apa adanya, cari SOI berikutnya
+                frames.append(self._cut(pos))
+                continue
+            marker = buffer[pos + 1]
+            if marker == 0xFF:  # fill byte sebelum marker
+                self._pos += 1
+                continue
+            if marker == 0xD9:  # EOI
+                frames.append(self._cut(pos + 2))
+                continue
+            if marker == 0xD8:  # SOI baru sebelum EOI: frame sebelumnya terpotong
+                frames.append(self._cut(pos))
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # marker tanpa payload
+                self._pos += 2
+                continue
+            if pos + 4 > len(buffer):
+                break
+            length = int.from_bytes(buffer[pos + 2:pos + 4], 'big')
+            if length < 2:
+                frames.append(self._cut(pos))
+                continue
+            self._pos = pos + 2 + length
+            self._entropy = marker == 0xDA  # SOS: data entropy mulai setelah header
+        if self._in_frame and len(self._buffer) > self.max_frame_bytes:
+            raise ValueError(f"Frame MJPEG melebihi {self.max_frame_bytes} bytes")
+        return frames
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse yang boleh mengirim hasil selagi body request masih dibaca
+
+    StreamingResponse bawaan (ASGI spec < 2.4) menjalankan task
+    listen_for_disconnect yang ikut memanggil receive() dan akan menelan
+    chunk upload. Di sini receive() hanya dipakai oleh request.stream();
+    disconnect tetap terdeteksi dari sisi baca (ClientDisconnect) maupun
+    tulis (OSError saat send).
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+def decode_jpeg(data: bytes) -> Optional[np.ndarray]:
+    """Decode satu frame JPEG menjadi array RGB (None jika rusak)"""
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def _read_frame(cap) -> Optional[np.ndarray]:
+    ret, frame = cap.read()
+    if not ret:
+        return None
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+async def iter_mjpeg_frames(chunks: AsyncIterator[bytes],
+                            max_frame_bytes: int = 16 * 1024 * 1024) -> AsyncIterator[Optional[np.ndarray]]:
+    """
+    Frame RGB di-yield segera setelah bytes JPEG-nya lengkap diterima
+
+    Frame yang gagal di-decode di-yield sebagai None (bukan dilewati) supaya
+    pemanggil bisa melaporkannya ke client.
+    """
+    parser = MJPEGParser(max_frame_bytes)
+    async for chunk in chunks:
+        for data in parser.feed(chunk):
+            yield await run_in_threadpool(decode_jpeg, data)
+
+
+async def iter_container_frames(chunks: AsyncIterator[bytes], suffix: str = '.mp4',
+                                max_bytes: int = 0) -> AsyncIterator[np.ndarray]:
+    """
+    Frame RGB dari container video (mp4, avi, mkv, ...)
+
+    Container umumnya butuh seek (index / moov atom bisa di akhir file),
+    jadi upload di-spool ke file sementara di disk lalu di-decode per frame;
+    memori tetap konstan, hanya disk yang sebanding dengan ukuran video.
+    """
+    fd, path = tempfile.mkstemp(prefix='railway-video-', suffix=suffix)
+    try:
+        received = 0
+        with os.fdopen(fd, 'wb') as spool:
+            async for chunk in chunks:
+                received += len(chunk)
+                if max_bytes and received > max_bytes:
+                    raise ValueError(f"Video melebihi batas {max_bytes} bytes")
+                spool.write(chunk)
+
+        async for frame in iter_video_file(path):
+            yield frame
+    finally:
+        os.remove(path)
+
+
+async def iter_video_file(path: str) -> AsyncIterator[np.ndarray]:
+    """Frame RGB dari file video di disk (decode per frame di threadpool)"""
+    cap = await run_in_threadpool(cv2.VideoCapture, path)
+    try:
+        if not cap.isOpened():
+            raise ValueError("Format video tidak didukung")
+        while True:
+            frame = await run_in_threadpool(_read_frame, cap)
+            if frame is None:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def video_frame_count(path: str) -> int:
+    """Jumlah frame menurut header container (0 jika tidak diketahui, mis. MJPEG)"""
+    cap = cv2.VideoCapture(path)
+    try:
+        return max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))) if cap.isOpened() else 0
+    finally:
+        cap.release()
+
+
+async def iter_file_chunks(path: str, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    """Baca file per chunk (mis. MJPEG tersimpan untuk diparse iter_mjpeg_frames)"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = await run_in_threadpool(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
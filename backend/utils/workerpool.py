@@ -0,0 +1,291 @@
+"""
+Inference Worker Pool for Railway Track Inspection
+K proses inferensi (masing-masing memegang model) dengan hand-off gambar lewat shared memory
+"""
+
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ALIGNMENT = 64
+
+
+def _worker_main(index: int, config: Dict, tasks, results):
+    """Entry point proses worker: load backend lalu layani task dari queue"""
+    threads = config['threads']
+    # Batasi thread runtime SEBELUM torch / onnxruntime di-import
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    if config.get('cpus') and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, config['cpus'])
+
+    try:
+        import torch
+        from utils.backends import create_backend
+
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+        backend = create_backend(config['backend'], config['model_path'], device=config['device'],
+                                 quantized=config['quantized'], imgsz=config['imgsz'],
+                                 threads=threads, conf_threshold=config['conf_threshold'],
+                                 iou_threshold=config['iou_threshold'])
+        backend.warmup(runs=config['warmup_runs'])
+    except Exception as e:
+        results.put(('failed', index, f"{e}\n{traceback.format_exc()}"))
+        return
+
+    results.put(('ready', index, {
+        'pid': os.getpid(),
+        'stride': backend.stride,
+        'dynamic_shape': backend.dynamic_shape,
+        'fixed_shape': backend.fixed_shape,
+        'weights': backend.weights
+    }))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job_id, shm_name, specs, kwargs = task
+        shm, images = None, None
+        try:
+            # Worker spawn berbagi resource tracker dengan proses API, jadi
+            # segmen tetap di-unlink sekali oleh pemiliknya (WorkerPool._finish)
+            shm = shared_memory.SharedMemory(name=shm_name)
+            images = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                      for offset, shape in specs]
+            predictions = backend.predict(images, **kwargs)
+            results.put(('result', index, (job_id, predictions)))
+        except Exception as e:
+            results.put(('error', index, (job_id, str(e))))
+        finally:
+            # View ke shared memory harus dilepas sebelum close()
+            images = None
+            if shm is not None:
+                shm.close()
+
+
+class WorkerPool:
+    """
+    Pool proses inferensi dengan distribusi least-loaded
+
+    Proses API menyalin gambar yang sudah di-decode ke satu segmen shared
+    memory per job; worker membaca array langsung dari segmen tersebut
+    (tanpa pickle) dan hanya mengirim balik hasil deteksi yang kecil.
+    Interface `predict()` / `stride` / `dynamic_shape` sama dengan
+    InferenceBackend sehingga bisa dipakai sebagai pengganti model global.
+    """
+
+    def __init__(self, workers: int, backend: str, model_path: str, device: str = 'cpu',
+                 quantized: bool = False, imgsz: int = 640, threads: int = 0,
+                 conf_threshold: float = 0.25, iou_threshold: float = 0.45,
+                 warmup_runs: int = 1, pin_cpus: bool = True):
+        """
+        Args:
+            workers: Jumlah proses inferensi (K)
+            backend: Nama backend ('torch', 'torchscript', 'onnx')
+            model_path: Path weights
+            threads: Intra-op thread per worker (0 = cpu_count // workers)
+            pin_cpus: Pin setiap worker ke core-nya sendiri (Linux)
+        """
+        self.workers = max(1, workers)
+        if hasattr(os, 'sched_getaffinity'):
+            self.cpus = sorted(os.sched_getaffinity(0))
+        else:
+            self.cpus = list(range(os.cpu_count() or 1))
+        self.threads = threads or max(1, len(self.cpus) // self.workers)
+        self.config = {
+            'backend': backend,
+            'model_path': model_path,
+            'device': device,
+            'quantized': quantized,
+            'imgsz': imgsz,
+            'threads': self.threads,
+            'conf_threshold': conf_threshold,
+            'iou_threshold': iou_threshold,
+            'warmup_runs': warmup_runs
+        }
+        self.pin_cpus = pin_cpus and hasattr(os, 'sched_setaffinity') \
+            and self.workers * self.threads <= len(self.cpus)
+
+        self._ctx = mp.get_context('spawn')
+        self._results = self._ctx.Queue()
+        self._tasks = []
+        self._processes = []
+        self._load = [0] * self.workers
+        self._pending: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._listener: Optional[threading.Thread] = None
+        self._closed = False
+
+        self.info: List[Dict] = [{} for _ in range(self.workers)]
+        self.completed = [0] * self.workers
+        self.stride = 32
+        self.dynamic_shape = True
+        self.fixed_shape = (imgsz, imgsz)
+        self.weights = model_path
+
+    def start(self, timeout: float = 600):
+        """Spawn semua worker dan tunggu sampai model masing-masing siap"""
+        for i in range(self.workers):
+            config = dict(self.config)
+            if self.pin_cpus:
+                config['cpus'] = self.cpus[i * self.threads:(i + 1) * self.threads]
+            tasks = self._ctx.Queue()
+            process = self._ctx.Process(target=_worker_main, args=(i, config, tasks, self._results),
+                                        name=f'inference-worker-{i}', daemon=True)
+            process.start()
+            self._tasks.append(tasks)
+            self._processes.append(process)
+
+        deadline = time.monotonic() + timeout
+        ready = set()
+        while len(ready) < self.workers:
+            try:
+                kind, index, payload = self._results.get(timeout=1.0)
+            except queue.Empty:
+                crashed = [i for i, p in enumerate(self._processes) if i not in ready and not p.is_alive()]
+                if crashed or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"Worker {crashed or 'pool'} tidak siap (crash / timeout)")
+                continue
+            if kind == 'failed':
+                self.stop()
+                raise RuntimeError(f"Worker {index} gagal load model: {payload}")
+            ready.add(index)
+            self.info[index] = payload
+            print(f"[+] Inference worker {index} ready (pid={payload['pid']}, threads={self.threads})")
+
+        first = self.info[0]
+        self.stride = first['stride']
+        self.dynamic_shape = first['dynamic_shape']
+        self.fixed_shape = tuple(first['fixed_shape'])
+        self.weights = first['weights']
+
+        self._listener = threading.Thread(target=self._listen, name='worker-pool-results', daemon=True)
+        self._listener.start()
+        return self
+
+    def submit(self, images: List[np.ndarray], **kwargs) -> Future:
+        """
+        Kirim satu batch ke worker dengan beban paling kecil
+
+        Returns:
+            Future berisi list prediksi (n, 6) per gambar
+        """
+        if self._closed:
+            raise RuntimeError("Worker pool sudah dihentikan")
+
+        specs, offset = [], 0
+        for img in images:
+            specs.append((offset, img.shape))
+            offset += -(-img.nbytes // ALIGNMENT) * ALIGNMENT
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for img, (start, shape) in zip(images, specs):
+            view = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=start)
+            view[...] = img
+            del view
+
+        future = Future()
+        with self._lock:
+            # Worker yang mati dilewati: load-nya kembali 0 setelah job-nya digagalkan
+            alive = [i for i, p in enumerate(self._processes) if p.is_alive()]
+            if not alive:
+                shm.close()
+                shm.unlink()
+                raise RuntimeError("Tidak ada inference worker yang hidup")
+            worker = min(alive, key=lambda i: (self._load[i], i))
+            job_id = next(self._ids)
+            self._load[worker] += len(images)
+            self._pending[job_id] = (future, shm, worker, len(images))
+        self._tasks[worker].put((job_id, shm.name, specs, kwargs))
+        return future
+
+    def predict(self, images: List[np.ndarray], timeout: Optional[float] = None,
+                **kwargs) -> List[np.ndarray]:
+        """Versi blocking dari submit(), kompatibel dengan InferenceBackend.predict"""
+        return self.submit(images, **kwargs).result(timeout=timeout)
+
+    def _finish(self, job_id: int):
+        with self._lock:
+            entry = self._pending.pop(job_id, None)
+            if entry is None:
+                return None
+            future, shm, worker, count = entry
+            self._load[worker] -= count
+            self.completed[worker] += 1
+        shm.close()
+        shm.unlink()
+        return future
+
+    def _listen(self):
+        while not self._closed:
+            # Cek liveness setiap iterasi: selama worker lain terus mengirim
+            # hasil, get() tidak pernah timeout
+            self._check_workers()
+            try:
+                kind, index, payload = self._results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            if kind in ('result', 'error'):
+                job_id, data = payload
+                future = self._finish(job_id)
+                if future is None or future.done():
+                    continue
+                if kind == 'result':
+                    future.set_result(data)
+                else:
+                    future.set_exception(RuntimeError(data))
+
+    def _check_workers(self):
+        """Gagalkan job milik worker yang mati supaya request tidak menggantung"""
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                continue
+            with self._lock:
+                dead = [job_id for job_id, entry in self._pending.items() if entry[2] == index]
+            for job_id in dead:
+                future = self._finish(job_id)
+                if future is not None and not future.done():
+                    future.set_exception(RuntimeError(f"Inference worker {index} berhenti"))
+
+    def stop(self):
+        """Hentikan semua worker dan bebaskan shared memory yang tersisa"""
+        self._closed = True
+        for tasks in self._tasks:
+            try:
+                tasks.put(None)
+            except Exception:
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for job_id in list(self._pending):
+            future = self._finish(job_id)
+            if future is not None and not future.done():
+                future.set_exception(RuntimeError("Worker pool dihentikan"))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'threads_per_worker': self.threads,
+                'pinned': self.pin_cpus,
+                'in_flight_images': list(self._load),
+                'completed_jobs': list(self.completed),
+                'alive': [p.is_alive() for p in self._processes]
+            }
@@ -8,6 +8,132 @@ const API_URL = 'https://deteksi-kerusakan-backend.up.railway.app';
 
 console.log('API URL:', API_URL);
 
+// Format biner ringkas dari backend (lihat backend/utils/packed.py); JSON tetap fallback
+const PACKED_MEDIA_TYPE = 'application/x-railway-detections';
+const PACKED_NO_STATUS = 255;
+
+/**
+ * Decode response packed menjadi struktur yang sama dengan response JSON
+ * (/detect: satu hasil, /detect-batch: { results: [...] }).
+ */
+function decodePackedDetections(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'RDET') {
+        throw new Error('Bukan response packed');
+    }
+    const version = view.getUint16(4, true);
+    if (version !== 1) {
+        throw new Error(`Versi packed tidak didukung: ${version}`);
+    }
+    const nImages = view.getUint16(6, true);
+    const metaLength = view.getUint32(8, true);
+    const meta = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 12, metaLength)));
+
+    // Semua array numerik little endian; salin supaya aman di platform big endian
+    let offset = 12 + metaLength;
+    const take = (bytesPer, count, read) => {
+        const out = new Array(count);
+        for (let i = 0; i < count; i++) {
+            out[i] = read(offset + i * bytesPer);
+        }
+        offset += bytesPer * count;
+        return out;
+    };
+    const counts = take(4, nImages, (o) => view.getUint32(o, true));
+    const widths = take(4, nImages, (o) => view.getUint32(o, true));
+    const heights = take(4, nImages, (o) => view.getUint32(o, true));
+    const total = counts.reduce((a, b) => a + b, 0);
+    const boxes = take(4, total * 4, (o) => view.getFloat32(o, true));
+    const confidences = take(4, total, (o) => view.getFloat32(o, true));
+    const classIds = take(1, total, (o) => view.getUint8(o));
+    const statuses = take(1, nImages, (o) => view.getUint8(o));
+
+    const results = [];
+    let start = 0;
+    for (let i = 0; i < nImages; i++) {
+        const end = start + counts[i];
+        if (statuses[i] === PACKED_NO_STATUS) {
+            results.push(null);
+            start = end;
+            continue;
+        }
+        const classCounts = Object.fromEntries(meta.classes.map((name) => [name, 0]));
+        const severityCounts = Object.fromEntries(meta.severities.map((name) => [name, 0]));
+        const detections = [];
+        for (let d = start; d < end; d++) {
+            const classId = classIds[d];
+            const severityIndex = meta.class_severity[classId];
+            const severity = meta.severities[severityIndex];
+            classCounts[meta.classes[classId]] += 1;
+            severityCounts[severity] += 1;
+            detections.push({
+                class: meta.classes[classId],
+                class_id: classId,
+                confidence: Math.round(confidences[d] * 1000) / 1000,
+                bbox: boxes.slice(d * 4, d * 4 + 4),
+                severity: severity,
+                color: meta.colors[severityIndex]
+            });
+        }
+        const high = severityCounts.HIGH || 0;
+        results.push({
+            success: true,
+            total_detections: detections.length,
+            detections: detections,
+            class_counts: classCounts,
+            statistics: {
+                high_risk: high,
+                medium_risk: severityCounts.MEDIUM || 0,
+                low_risk: severityCounts.LOW || 0,
+                critical_percentage: detections.length ? Math.round(high / detections.length * 1000) / 10 : 0
+            },
+            inspection_status: meta.statuses[statuses[i]],
+            image_size: { width: widths[i], height: heights[i] }
+        });
+        start = end;
+    }
+
+    if (!meta.batch) {
+        return results[0];
+    }
+    return {
+        results: meta.images.map((image, i) => {
+            const entry = { filename: image.filename };
+            if (results[i]) {
+                entry.result = results[i];
+            } else if (image.error !== null && image.error !== undefined) {
+                entry.error = image.error;
+            }
+            return entry;
+        })
+    };
+}
+
+async function readDetectionResponse(response) {
+    const contentType = response.headers.get('Content-Type') || '';
+    if (contentType.startsWith(PACKED_MEDIA_TYPE)) {
+        return decodePackedDetections(await response.arrayBuffer());
+    }
+    return response.json();
+}
+
+// Response backend: class + bbox [x1, y1, x2, y2]; tampilan memakai class_name + x, y, width, height
+function toDisplayDetection(detection) {
+    if (!detection.bbox) {
+        return detection;
+    }
+    const [x1, y1, x2, y2] = detection.bbox;
+    return {
+        ...detection,
+        class_name: detection.class_name || detection.class,
+        x: x1,
+        y: y1,
+        width: x2 - x1,
+        height: y2 - y1
+    };
+}
+
 // DOM Elements
 const uploadSection = document.getElementById('uploadSection');
 const fileInput = document.getElementById('fileInput');
@@ -77,7 +203,7 @@ async function handleFile(file) {
                     method: 'POST',
                     body: formData,
                     headers: {
-                        'Accept': 'application/json'
+                        'Accept': `${PACKED_MEDIA_TYPE}, application/json;q=0.9`
                     }
                 });
 
@@ -86,7 +212,7 @@ async function handleFile(file) {
                     throw new Error(errorData.detail || `Server error: ${response.status}`);
                 }
 
-                const data = await response.json();
+                const data = await readDetectionResponse(response);
                 console.log('Response:', data);
                 
                 // Display results
@@ -113,8 +239,10 @@ function displayResults(data) {
         return;
     }
 
+    const detections = data.detections.map(toDisplayDetection);
+
     // Display detections
-    data.detections.forEach((detection, index) => {
+    detections.forEach((detection, index) => {
         const item = document.createElement('div');
         item.className = `detection-item severity-${detection.severity.toLowerCase()}`;
         item.innerHTML = `
@@ -132,7 +260,7 @@ function displayResults(data) {
     });
 
     // Draw on canvas
-    drawOnCanvas(data.detections);
+    drawOnCanvas(detections);
 }
 
 function drawOnCanvas(detections) {